@@ -1,9 +1,11 @@
 """能力判定API（テスト用）"""
 from typing import Optional
 
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status
 from pydantic import BaseModel, Field
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.database import get_db
 from app.services.ability_analyzer_service import ability_analyzer_service, ABILITIES
 
 
@@ -14,6 +16,7 @@ class AnalyzeRequest(BaseModel):
     """能力判定リクエスト"""
     problem: Optional[str] = Field(None, description="課題・問い")
     content: str = Field(..., min_length=1, description="やってみたこと")
+    force_refresh: bool = Field(False, description="キャッシュを使わずに判定し直す")
 
 
 class MatchedAbility(BaseModel):
@@ -53,12 +56,13 @@ async def get_abilities():
 
 
 @router.post("/analyze", response_model=AnalyzeResponse)
-async def analyze_abilities(request: AnalyzeRequest):
+async def analyze_abilities(request: AnalyzeRequest, db: AsyncSession = Depends(get_db)):
     """
     投稿内容から該当する非認知能力をAIで判定する
 
     - **problem**: 課題・問い（任意）
     - **content**: やってみたこと（必須）
+    - **force_refresh**: 同じ内容の判定結果があっても判定し直す（任意）
 
     AIが投稿内容を分析し、7つの非認知能力のうち該当するものを返します。
     """
@@ -70,7 +74,9 @@ async def analyze_abilities(request: AnalyzeRequest):
 
     result = await ability_analyzer_service.analyze_abilities(
         content=request.content,
-        problem=request.problem
+        problem=request.problem,
+        db=db,
+        use_cache=not request.force_refresh,
     )
 
     return AnalyzeResponse(
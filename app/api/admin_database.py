@@ -1,4 +1,5 @@
 """管理者用データベース閲覧API"""
+from datetime import datetime
 from typing import Any, Dict, List
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy import text
@@ -7,6 +8,10 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.api.deps import get_admin_user
 from app.core.database import get_db
 from app.models.user import User
+from app.repositories import period_snapshot_repository, post_analysis_job_repository
+from app.services import analysis_cache_service, dashboard_service, intervention_scanner_service
+from app.services.post_analysis_service import post_analysis_worker
+from app.services.ability_registry_service import ability_registry
 
 router = APIRouter()
 
@@ -124,3 +129,84 @@ async def get_table_count(
         "table_name": table_name,
         "count": total,
     }
+
+
+@router.post("/ability-registry/refresh")
+async def refresh_ability_registry(
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_admin_user),
+) -> Dict[str, Any]:
+    """非認知能力マスター（能力・ルーブリック・スコア帯）をDBから再読み込み"""
+    snapshot = await ability_registry.load(db)
+    return {
+        "version": snapshot.version,
+        "loaded_at": snapshot.loaded_at,
+        "ability_count": len(snapshot.abilities),
+    }
+
+
+@router.post("/period-snapshots/{period_id}")
+async def create_period_snapshot(
+    period_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_admin_user),
+) -> Dict[str, Any]:
+    """評価期間の能力スナップショットを作成（作成済みの場合は作り直す）"""
+    period = await period_snapshot_repository.get_period(db, period_id)
+    if period is None:
+        raise HTTPException(status_code=404, detail="Evaluation period not found")
+
+    row_count = await period_snapshot_repository.create_period_snapshot(db, period)
+    await db.commit()
+    dashboard_service.invalidate_activity_cache()
+    return {"period_id": period.id, "row_count": row_count}
+
+
+@router.post("/intervention-flags/scan")
+async def scan_intervention_flags(
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_admin_user),
+) -> Dict[str, Any]:
+    """介入フラグを今すぐ再計算（通常は定期スキャンで更新される）"""
+    return await intervention_scanner_service.scan(db)
+
+
+@router.get("/ability-analysis-cache/stats")
+async def get_ability_analysis_cache_stats(
+    current_user: User = Depends(get_admin_user),
+) -> Dict[str, Any]:
+    """能力判定結果のキャッシュのヒット率と内訳（ワーカープロセス単位）"""
+    return analysis_cache_service.analysis_cache.stats()
+
+
+@router.post("/ability-analysis-cache/purge")
+async def purge_ability_analysis_cache(
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_admin_user),
+) -> Dict[str, Any]:
+    """期限切れの能力判定結果をテーブルから削除"""
+    return {"deleted": await analysis_cache_service.purge_expired(db)}
+
+
+@router.get("/post-analysis-jobs/stats")
+async def get_post_analysis_job_stats(
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_admin_user),
+) -> Dict[str, Any]:
+    """投稿のAI判定ジョブの状態ごとの件数と、このプロセスで実行中の件数"""
+    return {
+        "jobs": await post_analysis_job_repository.count_jobs_by_status(db),
+        "running_in_process": post_analysis_worker.running_count,
+    }
+
+
+@router.post("/post-analysis-jobs/retry-failed")
+async def retry_failed_post_analysis_jobs(
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_admin_user),
+) -> Dict[str, Any]:
+    """失敗で終了した投稿のAI判定ジョブを再実行する"""
+    retried = await post_analysis_job_repository.retry_failed_jobs(db, now=datetime.utcnow())
+    await db.commit()
+    post_analysis_worker.notify()
+    return {"retried": retried}
@@ -13,7 +13,7 @@ from app.schemas.admin_user import (
     UserListResponse,
     UserUpdateRequest,
 )
-from app.services import admin_user_service
+from app.services import admin_user_service, dashboard_service
 
 
 router = APIRouter(prefix="/admin", tags=["admin"])
@@ -51,6 +51,7 @@ async def create_user(
     admin_user=Depends(deps.get_admin_user),  # noqa: B008
 ):
     user = await admin_user_service.create_user(db, payload)
+    dashboard_service.invalidate_roster_cache()
     return UserListResponse(items=[user], total=1, page=1, page_size=1)
 
 
@@ -61,6 +62,7 @@ async def create_local_user(
     admin_user=Depends(deps.get_admin_user),  # noqa: B008
 ):
     user = await admin_user_service.create_local_user(db, payload)
+    dashboard_service.invalidate_roster_cache()
     return UserListResponse(items=[user], total=1, page=1, page_size=1)
 
 
@@ -72,6 +74,7 @@ async def update_user(
     admin_user=Depends(deps.get_admin_user),  # noqa: B008
 ):
     user = await admin_user_service.update_user(db, user_id, payload)
+    dashboard_service.invalidate_roster_cache()
     return UserListResponse(items=[user], total=1, page=1, page_size=1)
 
 
@@ -83,6 +86,8 @@ async def delete_user(
 ):
     # 物理削除（DBから完全に削除）
     await admin_user_service.hard_delete_user(db, user_id)
+    dashboard_service.invalidate_roster_cache()
+    dashboard_service.invalidate_activity_cache()
     return UserDeleteResponse(detail="deleted")
 
 
@@ -93,7 +98,10 @@ async def bulk_import_users(
     db: AsyncSession = Depends(get_db),
     admin_user=Depends(deps.get_admin_user),  # noqa: B008
 ):
-    return await admin_user_service.bulk_import_users(db, file=file, dry_run=dry_run)
+    result = await admin_user_service.bulk_import_users(db, file=file, dry_run=dry_run)
+    if not dry_run:
+        dashboard_service.invalidate_roster_cache()
+    return result
 
 
 @router.post("/users/bulk_delete", response_model=BulkResult)
@@ -103,7 +111,10 @@ async def bulk_delete_users(
     db: AsyncSession = Depends(get_db),
     admin_user=Depends(deps.get_admin_user),  # noqa: B008
 ):
-    return await admin_user_service.bulk_delete_users(db, file=file, dry_run=dry_run)
+    result = await admin_user_service.bulk_delete_users(db, file=file, dry_run=dry_run)
+    if not dry_run:
+        dashboard_service.invalidate_roster_cache()
+    return result
 
 
 @router.get("/users/export")
@@ -1,242 +1,229 @@
 """ダッシュボードAPI（管理者・教師用）"""
-from datetime import datetime, timedelta
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import func, select, and_
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.api.deps import get_current_user
+from app.api.deps import get_admin_user, get_current_user
+from app.core.cache import response_cache
 from app.core.database import get_db
-from app.models.post import Post, QuestionStateChangeType
-from app.models.post_ability_point import PostAbilityPoint
-from app.models.thanks_letter import ThanksLetter
-from app.models.thanks_letter_ability_point import ThanksLetterAbilityPoint
-from app.models.non_cog_ability import NonCogAbility
 from app.models.user import User, RoleEnum
+from app.services import dashboard_service
+
+router = APIRouter()
 
-# 介入フラグの閾値（投稿がない日数）
-INTERVENTION_DAYS_THRESHOLD = 14
-
-# フェーズラベルの変換マッピング（英語→日本語）
-PHASE_LABEL_MAP = {
-    # 旧英語フェーズ名
-    "theme_setting": "テーマ設定",
-    "problem_setting": "課題設定",
-    "information_gathering": "情報収集",
-    "analysis": "整理・分析",
-    "summary": "まとめ・表現",
-    "presentation": "発表準備",
-    # 別の旧英語フェーズ名
-    "planning": "課題設定",
-    "execution": "情報収集",
-    "verification": "整理・分析",
-    # 日本語はそのまま返す
-    "テーマ設定": "テーマ設定",
-    "課題設定": "課題設定",
-    "情報収集": "情報収集",
-    "整理・分析": "整理・分析",
-    "まとめ・表現": "まとめ・表現",
-    "発表準備": "発表準備",
+# ?format= で指定できる出力形式（json以外はストリーミングでダウンロード）
+_EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
 }
 
-router = APIRouter()
+
+def _export_response(chunks, name: str, export_format: str) -> StreamingResponse:
+    return StreamingResponse(
+        chunks,
+        media_type=_EXPORT_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{name}.{export_format}"'},
+    )
+
+
+def _student_list_query(
+    grade: Optional[int] = Query(None, ge=1),
+    class_name: Optional[str] = Query(None, max_length=20),
+    intervention_flag: Optional[bool] = Query(None),
+    phase: Optional[str] = Query(None, max_length=50, description="フェーズのコード、または表示用のフェーズ名（未投稿を含む）"),
+    sort: str = Query("full_name", max_length=100),
+    order: str = Query("asc", regex="^(asc|desc)$"),
+    cursor: Optional[str] = Query(None, max_length=500, description="前ページの X-Next-Cursor"),
+    limit: Optional[int] = Query(None, ge=1, le=500),
+) -> dashboard_service.StudentListQuery:
+    return dashboard_service.StudentListQuery(
+        grade=grade,
+        class_name=class_name,
+        intervention_flag=intervention_flag,
+        phase=phase,
+        sort=sort,
+        descending=order == "desc",
+        cursor=cursor,
+        limit=limit,
+    )
 
 
 @router.get("/learning-progress")
 async def get_learning_progress(
+    response: Response,
+    query: dashboard_service.StudentListQuery = Depends(_student_list_query),
+    format: str = Query("json", regex="^(json|csv|ndjson)$"),  # noqa: A002
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    """探求学習の進捗状況を取得（生徒ごと）"""
+    """探求学習の進捗状況を取得（生徒ごと）
+
+    sort: full_name / last_posted_at / post_count / question_change_count
+    limit 指定時、続きがあれば X-Next-Cursor ヘッダーのカーソルを cursor に渡して次ページを取得する。
+    format=csv / ndjson の場合は、条件に合う全件（limit指定時はその件数）をストリーミングで返す。
+    """
     # 管理者と教師のみアクセス可能
     if current_user.role not in [RoleEnum.admin, RoleEnum.teacher]:
         raise HTTPException(status_code=403, detail="管理者または教師のみアクセス可能です")
 
-    # 生徒一覧を取得
-    students_stmt = select(User).where(
-        User.role == RoleEnum.student,
-        User.is_active == True,
-        User.is_deleted == False
-    ).order_by(User.full_name)
-
-    students_result = await db.execute(students_stmt)
-    students = students_result.scalars().all()
-
-    progress_data = []
-
-    # 介入判定用の閾値日時（現在から2週間前）
-    intervention_threshold = datetime.utcnow() - timedelta(days=INTERVENTION_DAYS_THRESHOLD)
-
-    for student in students:
-        # 投稿数と最終投稿日を取得
-        posts_stmt = select(
-            func.count(Post.id).label("post_count"),
-            func.max(Post.created_at).label("last_posted_at"),
-            Post.phase_label
-        ).where(
-            Post.user_id == student.id,
-            Post.deleted_at.is_(None)
-        ).group_by(Post.phase_label)
-
-        posts_result = await db.execute(posts_stmt)
-        posts_data = posts_result.all()
-
-        # 総投稿数
-        total_posts = sum(row.post_count for row in posts_data)
-
-        # 最終投稿日（全フェーズ）
-        last_posted_at = None
-        if posts_data:
-            last_posted_stmt = select(func.max(Post.created_at)).where(
-                Post.user_id == student.id,
-                Post.deleted_at.is_(None)
-            )
-            last_posted_result = await db.execute(last_posted_stmt)
-            last_posted_at = last_posted_result.scalar()
-
-        # 最新のフェーズ
-        latest_phase = None
-        if posts_data:
-            latest_post_stmt = select(Post.phase_label).where(
-                Post.user_id == student.id,
-                Post.deleted_at.is_(None)
-            ).order_by(Post.created_at.desc()).limit(1)
-            latest_post_result = await db.execute(latest_post_stmt)
-            latest_phase = latest_post_result.scalar()
-
-        # 問いの変更回数をカウント（question_state_change_type が none 以外）
-        question_change_stmt = select(func.count(Post.id)).where(
-            Post.user_id == student.id,
-            Post.deleted_at.is_(None),
-            Post.question_state_change_type != QuestionStateChangeType.none
-        )
-        question_change_result = await db.execute(question_change_stmt)
-        question_change_count = question_change_result.scalar() or 0
-
-        # 介入フラグの判定（2週間以上投稿がない場合にTRUE）
-        intervention_flag = False
-        if last_posted_at is None:
-            # 一度も投稿がない場合は介入が必要
-            intervention_flag = True
-        elif last_posted_at < intervention_threshold:
-            # 最終投稿が2週間以上前の場合
-            intervention_flag = True
-
-        # フェーズラベルを日本語に変換
-        display_phase = "未投稿"
-        if latest_phase:
-            display_phase = PHASE_LABEL_MAP.get(latest_phase, latest_phase)
-
-        progress_data.append({
-            "user_id": student.id,
-            "full_name": student.full_name,
-            "grade": student.grade,
-            "class_name": student.class_name,
-            "phase": display_phase,
-            "post_count": total_posts,
-            "question_change_count": question_change_count,
-            "last_posted_at": last_posted_at.isoformat() if last_posted_at else None,
-            "intervention_flag": intervention_flag,
-        })
-
-    return progress_data
+    if format != "json":
+        chunks = await dashboard_service.export_learning_progress(db, query, format)
+        return _export_response(chunks, "learning-progress", format)
+
+    rows, next_cursor = await dashboard_service.get_cached(
+        db, "learning-progress", current_user.role, dashboard_service.get_learning_progress, query=query
+    )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return rows
 
 
 @router.get("/non-cognitive-abilities")
 async def get_non_cognitive_abilities(
+    response: Response,
+    query: dashboard_service.StudentListQuery = Depends(_student_list_query),
+    format: str = Query("json", regex="^(json|csv|ndjson)$"),  # noqa: A002
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """非認知能力データを取得（生徒ごと）
+
+    sort: full_name / post_count / received_letters_count / sent_letters_count / ability:<能力コード>
+    limit 指定時、続きがあれば X-Next-Cursor ヘッダーのカーソルを cursor に渡して次ページを取得する。
+    format=csv / ndjson の場合は、条件に合う全件（limit指定時はその件数）をストリーミングで返す。
+    """
+    # 管理者と教師のみアクセス可能
+    if current_user.role not in [RoleEnum.admin, RoleEnum.teacher]:
+        raise HTTPException(status_code=403, detail="管理者または教師のみアクセス可能です")
+
+    if format != "json":
+        chunks = await dashboard_service.export_non_cognitive_abilities(db, query, format)
+        return _export_response(chunks, "non-cognitive-abilities", format)
+
+    rows, next_cursor = await dashboard_service.get_cached(
+        db, "non-cognitive-abilities", current_user.role, dashboard_service.get_non_cognitive_abilities, query=query
+    )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return rows
+
+
+@router.get("/overview")
+async def get_overview(
+    response: Response,
+    query: dashboard_service.StudentListQuery = Depends(_student_list_query),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """教師のホーム画面用に、進捗状況と非認知能力データをまとめて取得（生徒ごと）
+
+    learning_progress / non_cognitive_abilities はそれぞれ個別のエンドポイントと同じ形式で、同じ生徒が同じ順に並ぶ。
+    絞り込み・並び替え・ページングの指定も個別のエンドポイントと同じ。
+    """
+    # 管理者と教師のみアクセス可能
+    if current_user.role not in [RoleEnum.admin, RoleEnum.teacher]:
+        raise HTTPException(status_code=403, detail="管理者または教師のみアクセス可能です")
+
+    overview, next_cursor = await dashboard_service.get_cached(
+        db, "overview", current_user.role, dashboard_service.get_overview, query=query
+    )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return overview
+
+
+@router.get("/classes")
+async def get_classes(
+    grade: Optional[int] = Query(None, ge=1),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """学年・クラスごとの集計を取得
+
+    在籍生徒数・活動中の生徒の割合（直近7日に投稿）・介入対象数・最新フェーズの分布と、
+    能力ごとのスコアの平均・中央値・90パーセンタイル。
+    """
+    # 管理者と教師のみアクセス可能
+    if current_user.role not in [RoleEnum.admin, RoleEnum.teacher]:
+        raise HTTPException(status_code=403, detail="管理者または教師のみアクセス可能です")
+
+    return await dashboard_service.get_cached(
+        db, "classes", current_user.role, dashboard_service.get_class_stats, grade=grade
+    )
+
+
+@router.get("/intervention-flags")
+async def get_intervention_flags(
+    response: Response,
+    grade: Optional[int] = Query(None, ge=1),
+    class_name: Optional[str] = Query(None, max_length=20),
+    cursor: Optional[str] = Query(None, max_length=500, description="前ページの X-Next-Cursor"),
+    limit: Optional[int] = Query(None, ge=1, le=500),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    """非認知能力データを取得（生徒ごと）"""
+    """介入が必要な生徒のみを取得（定期スキャンの結果、フラグが付いた順）"""
     # 管理者と教師のみアクセス可能
     if current_user.role not in [RoleEnum.admin, RoleEnum.teacher]:
         raise HTTPException(status_code=403, detail="管理者または教師のみアクセス可能です")
 
-    # 生徒一覧を取得
-    students_stmt = select(User).where(
-        User.role == RoleEnum.student,
-        User.is_active == True,
-        User.is_deleted == False
-    ).order_by(User.full_name)
-
-    students_result = await db.execute(students_stmt)
-    students = students_result.scalars().all()
-
-    ability_data = []
-
-    # 全ての能力を取得
-    abilities_stmt = select(NonCogAbility).order_by(NonCogAbility.id)
-    abilities_result = await db.execute(abilities_stmt)
-    all_abilities = abilities_result.scalars().all()
-
-    ability_code_to_id = {ability.code: ability.id for ability in all_abilities}
-
-    for student in students:
-        # 投稿数を取得
-        posts_stmt = select(func.count(Post.id)).where(
-            Post.user_id == student.id,
-            Post.deleted_at.is_(None)
-        )
-        posts_result = await db.execute(posts_stmt)
-        post_count = posts_result.scalar() or 0
-
-        # 受け取った感謝の手紙数
-        received_letters_stmt = select(func.count(ThanksLetter.id)).where(
-            ThanksLetter.receiver_user_id == student.id
-        )
-        received_letters_result = await db.execute(received_letters_stmt)
-        received_letters_count = received_letters_result.scalar() or 0
-
-        # 送った感謝の手紙数（参考情報として）
-        sent_letters_stmt = select(func.count(ThanksLetter.id)).where(
-            ThanksLetter.sender_user_id == student.id
-        )
-        sent_letters_result = await db.execute(sent_letters_stmt)
-        sent_letters_count = sent_letters_result.scalar() or 0
-
-        # 実際のDBから能力スコアを集計
-        # 投稿から取得した能力ポイントを合計
-        post_ability_scores = {}
-        for ability in all_abilities:
-            sum_stmt = select(func.coalesce(func.sum(PostAbilityPoint.point), 0)).select_from(PostAbilityPoint).join(
-                Post, PostAbilityPoint.post_id == Post.id
-            ).where(
-                Post.user_id == student.id,
-                Post.deleted_at.is_(None),
-                PostAbilityPoint.ability_id == ability.id
-            )
-            sum_result = await db.execute(sum_stmt)
-            post_ability_scores[ability.code] = float(sum_result.scalar() or 0)
-
-        # 受信した感謝の手紙から取得した能力ポイントを合計（受信者の能力として記録）
-        letter_ability_scores = {}
-        for ability in all_abilities:
-            sum_stmt = select(func.coalesce(func.sum(ThanksLetterAbilityPoint.points), 0)).select_from(
-                ThanksLetterAbilityPoint
-            ).join(
-                ThanksLetter, ThanksLetterAbilityPoint.thanks_letter_id == ThanksLetter.id
-            ).where(
-                ThanksLetter.receiver_user_id == student.id,
-                ThanksLetterAbilityPoint.ability_id == ability.id
-            )
-            sum_result = await db.execute(sum_stmt)
-            letter_ability_scores[ability.code] = float(sum_result.scalar() or 0)
-
-        # スコア計算（投稿での能力ポイント + 受信した手紙での能力ポイント）
-        abilities_scores = {}
-        for ability in all_abilities:
-            total_score = post_ability_scores[ability.code] + letter_ability_scores[ability.code]
-            abilities_scores[ability.code] = round(total_score, 1)
-
-        ability_data.append({
-            "user_id": student.id,
-            "full_name": student.full_name,
-            "grade": student.grade,
-            "class_name": student.class_name,
-            "post_count": post_count,
-            "received_letters_count": received_letters_count,
-            "sent_letters_count": sent_letters_count,
-            "abilities": abilities_scores
-        })
-
-    return ability_data
+    query = dashboard_service.StudentListQuery(grade=grade, class_name=class_name, cursor=cursor, limit=limit)
+    rows, next_cursor = await dashboard_service.get_flagged_students(db, query)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return rows
+
+
+@router.get("/ability-growth")
+async def get_ability_growth(
+    response: Response,
+    from_period_id: int = Query(..., ge=1),
+    to_period_id: Optional[int] = Query(None, ge=1, description="未指定の場合は現在の累計"),
+    query: dashboard_service.StudentListQuery = Depends(_student_list_query),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """評価期間の間の成長（投稿数・能力ポイントの差分）を取得（生徒ごと）
+
+    sort: full_name / post_count
+    """
+    # 管理者と教師のみアクセス可能
+    if current_user.role not in [RoleEnum.admin, RoleEnum.teacher]:
+        raise HTTPException(status_code=403, detail="管理者または教師のみアクセス可能です")
+
+    growth, next_cursor = await dashboard_service.get_cached(
+        db,
+        "ability-growth",
+        current_user.role,
+        dashboard_service.get_ability_growth,
+        from_period_id=from_period_id,
+        to_period_id=to_period_id,
+        query=query,
+    )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return growth
+
+
+@router.get("/students/{user_id}")
+async def get_student_detail(
+    user_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """生徒の詳細（最近の投稿・受け取った手紙・フェーズの推移・能力ごとの累計）を取得"""
+    # 管理者と教師のみアクセス可能
+    if current_user.role not in [RoleEnum.admin, RoleEnum.teacher]:
+        raise HTTPException(status_code=403, detail="管理者または教師のみアクセス可能です")
+
+    return await dashboard_service.get_student_detail(db, user_id)
+
+
+@router.get("/cache-stats")
+async def get_cache_stats(
+    current_user: User = Depends(get_admin_user),
+):
+    """ダッシュボードキャッシュのヒット・ミス数（TTL調整用、管理者のみ）"""
+    return response_cache.stats()
@@ -1,100 +1,207 @@
 """投稿API"""
 from datetime import datetime
 from typing import Optional
-from fastapi import APIRouter, Depends, HTTPException, status, Header
-from sqlalchemy import select, func
+from fastapi import APIRouter, Depends, HTTPException, Query, status, Header
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import joinedload
 
 from app.api.deps import get_current_user, get_current_user_optional
+from app.core.config import settings
 from app.core.database import get_db
-from app.models.post import Post
-from app.models.post_ability_point import PostAbilityPoint
+from app.models.post import Post, QuestionStateChangeType
 from app.models.post_like import PostLike
-from app.models.non_cog_ability import NonCogAbility
 from app.models.user import User, RoleEnum
-from app.schemas.post import PostCreate, PostUpdate, PostResponse, PostListResponse
+from app.repositories import (
+    ability_point_repository,
+    post_analysis_job_repository,
+    post_repository,
+    student_summary_repository,
+)
+from app.schemas.post import PostCreate, PostUpdate, PostResponse, PostListResponse, PostBatchResponse
+from app.services import dashboard_service, phase_service
+from app.services.ability_registry_service import ability_registry
+from app.services.like_buffer_service import like_write_buffer
+from app.services.post_analysis_service import post_analysis_worker
 
 
 router = APIRouter(prefix="/posts", tags=["posts"])
 
+# 一括取得で指定できる投稿IDの上限
+BATCH_MAX_IDS = 200
+
+
+def _encode_cursor(post: Post) -> str:
+    """投稿の (created_at, id) からカーソル文字列を生成"""
+    return f"{post.created_at.isoformat()},{post.id}"
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """カーソル文字列 "<created_at>,<id>" を分解"""
+    try:
+        created_at_raw, post_id_raw = cursor.rsplit(",", 1)
+        return datetime.fromisoformat(created_at_raw), int(post_id_raw)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+
+def _post_row_responses(rows, viewer_id: int | None) -> list[PostResponse]:
+    """投稿一覧クエリの行（投稿・投稿者名・アバターURL・いいね有無）からレスポンスを生成
+
+    write-behindモードでまだ書き込まれていないいいねは、バッファ上の意図をいいね数・いいね有無に反映する。
+    """
+    like_deltas = like_write_buffer.pending_deltas([row.Post.id for row in rows])
+    responses = []
+    for row in rows:
+        post = row.Post
+        liked_by_me = bool(row.liked_by_me)
+        if viewer_id is not None:
+            liked_by_me = like_write_buffer.is_liked(post.id, viewer_id, liked_by_me)
+        responses.append(PostResponse(
+            id=post.id,
+            user_id=post.user_id,
+            problem=post.problem,
+            content_1=post.content_1,
+            content_2=post.content_2,
+            content_3=post.content_3,
+            question_state_change_type=post.question_state_change_type,
+            phase_label=post.phase_label,
+            phase_code=post.phase_code,
+            created_at=post.created_at,
+            updated_at=post.updated_at,
+            user_name=row.user_name,
+            user_avatar_url=row.user_avatar_url,
+            like_count=post.like_count + like_deltas.get(post.id, 0),
+            liked_by_me=liked_by_me,
+        ))
+    return responses
+
 
 @router.get("", response_model=PostListResponse)
 async def get_posts(
     skip: int = 0,
     limit: int = 20,
     user_id: int | None = None,
+    cursor: str | None = None,
     db: AsyncSession = Depends(get_db),
     current_user: User | None = Depends(get_current_user_optional),
 ):
-    """投稿一覧を取得（新しい順）。user_idを指定すると特定ユーザーの投稿のみ取得"""
-    # 投稿とユーザー情報を結合して取得
-    stmt = (
-        select(Post)
-        .options(joinedload(Post.user))
-        .where(Post.deleted_at.is_(None))
+    """投稿一覧を取得（新しい順）。user_idを指定すると特定ユーザーの投稿のみ取得
+
+    cursorを指定した場合はskipを無視し、(created_at, id) によるキーセットページングを行う。
+    次ページのカーソルはレスポンスの next_cursor で返す。
+    """
+    viewer_id = current_user.id if current_user else None
+    stmt = post_repository.build_feed_query(
+        viewer_id=viewer_id,
+        user_id=user_id,
+        cursor=_decode_cursor(cursor) if cursor is not None else None,
+        skip=skip,
+        limit=limit,
+    )
+    rows = (await db.execute(stmt)).all()
+
+    # 総数は各行に含まれる。ページが空の場合のみ別途数える
+    if rows:
+        total = rows[0].total
+    elif skip or cursor is not None:
+        total = await post_repository.count_feed_posts(db, user_id)
+    else:
+        total = 0
+
+    next_cursor = _encode_cursor(rows[-1].Post) if len(rows) == limit else None
+
+    return PostListResponse(
+        posts=_post_row_responses(rows, viewer_id),
+        total=total,
+        next_cursor=next_cursor,
     )
 
-    # user_idが指定されている場合はフィルタリング
-    if user_id is not None:
-        stmt = stmt.where(Post.user_id == user_id)
-
-    stmt = stmt.order_by(Post.created_at.desc()).offset(skip).limit(limit)
 
-    result = await db.execute(stmt)
-    posts = result.scalars().unique().all()
-
-    # 総数を取得
-    count_stmt = select(Post).where(Post.deleted_at.is_(None))
-    if user_id is not None:
-        count_stmt = count_stmt.where(Post.user_id == user_id)
-    count_result = await db.execute(count_stmt)
-    total = len(count_result.scalars().all())
-
-    # 各投稿のいいね数を取得
-    post_ids = [post.id for post in posts]
-    like_counts = {}
-    if post_ids:
-        like_count_stmt = (
-            select(PostLike.post_id, func.count(PostLike.id).label("count"))
-            .where(PostLike.post_id.in_(post_ids))
-            .group_by(PostLike.post_id)
+@router.get("/search", response_model=PostListResponse)
+async def search_posts(
+    q: str = Query(..., min_length=1, max_length=200),
+    skip: int = 0,
+    limit: int = 20,
+    db: AsyncSession = Depends(get_db),
+    current_user: User | None = Depends(get_current_user_optional),
+):
+    """投稿を全文検索（課題・やってみたこと）。関連度の高い順に返す"""
+    viewer_id = current_user.id if current_user else None
+    stmt = post_repository.build_search_query(db, q, viewer_id=viewer_id, skip=skip, limit=limit)
+    if stmt is None:
+        return PostListResponse(posts=[], total=0)
+
+    rows = (await db.execute(stmt)).all()
+
+    # 総数は各行に含まれる。ページが空の場合のみ先頭ページで数える
+    if rows:
+        total = rows[0].total
+    elif skip:
+        first_page = post_repository.build_search_query(db, q, viewer_id=viewer_id, limit=1)
+        first_row = (await db.execute(first_page)).first()
+        total = first_row.total if first_row else 0
+    else:
+        total = 0
+
+    return PostListResponse(posts=_post_row_responses(rows, viewer_id), total=total)
+
+
+def _parse_batch_ids(ids: str) -> list[int]:
+    """カンマ区切りの投稿IDを分解（重複は除去し、指定順を保つ）"""
+    try:
+        post_ids = [int(raw) for raw in ids.split(",") if raw.strip()]
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="ids must be comma-separated integers"
         )
-        like_count_result = await db.execute(like_count_stmt)
-        like_counts = {row.post_id: row.count for row in like_count_result}
-
-    # ログインユーザーがいいねした投稿を取得
-    user_likes = set()
-    if current_user and post_ids:
-        user_likes_stmt = select(PostLike.post_id).where(
-            PostLike.post_id.in_(post_ids),
-            PostLike.user_id == current_user.id
+
+    post_ids = list(dict.fromkeys(post_ids))
+    if len(post_ids) > BATCH_MAX_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Too many ids (max {BATCH_MAX_IDS})"
         )
-        user_likes_result = await db.execute(user_likes_stmt)
-        user_likes = {row.post_id for row in user_likes_result}
-
-    # レスポンス用にユーザー名とアバターURLを追加
-    post_responses = []
-    for post in posts:
-        post_dict = {
-            "id": post.id,
-            "user_id": post.user_id,
-            "problem": post.problem,
-            "content_1": post.content_1,
-            "content_2": post.content_2,
-            "content_3": post.content_3,
-            "question_state_change_type": post.question_state_change_type,
-            "phase_label": post.phase_label,
-            "created_at": post.created_at,
-            "updated_at": post.updated_at,
-            "user_name": post.user.full_name if post.user else None,
-            "user_avatar_url": post.user.avatar_url if post.user else None,
-            "like_count": like_counts.get(post.id, 0),
-            "liked_by_me": post.id in user_likes,
-        }
-        post_responses.append(PostResponse(**post_dict))
-
-    return PostListResponse(posts=post_responses, total=total)
+    return post_ids
+
+
+@router.get("/batch", response_model=PostBatchResponse)
+async def get_posts_batch(
+    ids: str = Query(..., description="カンマ区切りの投稿ID"),
+    db: AsyncSession = Depends(get_db),
+    current_user: User | None = Depends(get_current_user_optional),
+):
+    """複数の投稿をまとめて取得（指定順）。存在しない・削除済みのIDは missing_ids で返す
+
+    投稿（投稿者・いいね有無を含む）と能力をそれぞれIN 1文で取得する。
+    """
+    post_ids = _parse_batch_ids(ids)
+    viewer_id = current_user.id if current_user else None
+
+    rows = await post_repository.get_post_rows_by_ids(db, post_ids, viewer_id=viewer_id)
+    responses = {response.id: response for response in _post_row_responses(rows, viewer_id)}
+    ability_ids_by_post = await post_repository.get_ability_ids_by_post(db, list(responses))
+    id_to_code = (await ability_registry.get(db)).id_to_code if ability_ids_by_post else {}
+
+    posts = []
+    missing_ids = []
+    for post_id in post_ids:
+        response = responses.get(post_id)
+        if response is None:
+            missing_ids.append(post_id)
+            continue
+        response.ability_codes = [
+            id_to_code[ability_id]
+            for ability_id in ability_ids_by_post.get(post_id, [])
+            if ability_id in id_to_code
+        ]
+        posts.append(response)
+
+    return PostBatchResponse(posts=posts, missing_ids=missing_ids)
 
 
 @router.post("", response_model=PostResponse, status_code=status.HTTP_201_CREATED)
@@ -113,6 +220,9 @@ async def create_post(
             detail="Administrators cannot create posts"
         )
 
+    # ability_codesはレジストリから解決する（DB問い合わせなし）
+    ability_ids = await ability_registry.resolve_codes(db, post_data.ability_codes)
+
     # 投稿を作成
     now = datetime.utcnow()
     new_post = Post(
@@ -123,34 +233,34 @@ async def create_post(
         content_3=post_data.content_3,
         question_state_change_type=post_data.question_state_change_type,
         phase_label=post_data.phase_label,
+        phase_code=phase_service.to_phase_code(post_data.phase_label),
         created_at=now,
         updated_at=now,
     )
 
     db.add(new_post)
-    await db.commit()
-    await db.refresh(new_post)
+    # IDの採番のみ行い、能力ポイントと同じトランザクションでコミットする
+    await db.flush()
 
     # 非認知能力の関連を保存
-    if post_data.ability_codes:
-        # ability_codesからability_idを取得
-        abilities_stmt = select(NonCogAbility).where(NonCogAbility.code.in_(post_data.ability_codes))
-        abilities_result = await db.execute(abilities_stmt)
-        abilities = abilities_result.scalars().all()
-
-        # PostAbilityPointを作成
-        for ability in abilities:
-            post_ability_point = PostAbilityPoint(
-                post_id=new_post.id,
-                ability_id=ability.id
-            )
-            db.add(post_ability_point)
-
-        await db.commit()
+    await ability_point_repository.add_post_ability_points(db, new_post.id, ability_ids)
+    await student_summary_repository.record_post_created(
+        db,
+        user_id=new_post.user_id,
+        phase_label=phase_service.display_label(new_post.phase_label, new_post.phase_code),
+        phase_code=new_post.phase_code,
+        question_changed=new_post.question_state_change_type != QuestionStateChangeType.none,
+        created_at=new_post.created_at,
+        ability_ids=ability_ids,
+    )
+    # AI判定はジョブとして登録し、リクエストの外でワーカーが実行する
+    await post_analysis_job_repository.enqueue(db, [new_post.id], now=now)
 
-    # ユーザー情報を取得
-    await db.refresh(new_post, ["user"])
+    await db.commit()
+    dashboard_service.invalidate_activity_cache()
+    post_analysis_worker.notify()
 
+    # レスポンスはメモリ上の値から生成する（再読み込みしない）
     return PostResponse(
         id=new_post.id,
         user_id=new_post.user_id,
@@ -160,10 +270,11 @@ async def create_post(
         content_3=new_post.content_3,
         question_state_change_type=new_post.question_state_change_type,
         phase_label=new_post.phase_label,
+        phase_code=new_post.phase_code,
         created_at=new_post.created_at,
         updated_at=new_post.updated_at,
-        user_name=new_post.user.full_name if new_post.user else None,
-        user_avatar_url=new_post.user.avatar_url if new_post.user else None,
+        user_name=user.full_name,
+        user_avatar_url=user.avatar_url,
     )
 
 
@@ -171,6 +282,7 @@ async def create_post(
 async def get_post(
     post_id: int,
     db: AsyncSession = Depends(get_db),
+    current_user: User | None = Depends(get_current_user_optional),
 ):
     """投稿詳細を取得"""
     stmt = select(Post).options(joinedload(Post.user)).where(Post.id == post_id, Post.deleted_at.is_(None))
@@ -183,6 +295,17 @@ async def get_post(
             detail="Post not found"
         )
 
+    # ログインユーザーがいいねしているか
+    liked_by_me = False
+    if current_user:
+        liked_stmt = select(PostLike.id).where(
+            PostLike.post_id == post.id,
+            PostLike.user_id == current_user.id
+        )
+        liked_by_me = (await db.execute(liked_stmt)).first() is not None
+        # write-behindモードでまだ書き込まれていないいいねを反映する
+        liked_by_me = like_write_buffer.is_liked(post.id, current_user.id, liked_by_me)
+
     return PostResponse(
         id=post.id,
         user_id=post.user_id,
@@ -192,10 +315,13 @@ async def get_post(
         content_3=post.content_3,
         question_state_change_type=post.question_state_change_type,
         phase_label=post.phase_label,
+        phase_code=post.phase_code,
         created_at=post.created_at,
         updated_at=post.updated_at,
         user_name=post.user.full_name if post.user else None,
         user_avatar_url=post.user.avatar_url if post.user else None,
+        like_count=post.like_count + like_write_buffer.pending_delta(post.id),
+        liked_by_me=liked_by_me,
     )
 
 
@@ -225,6 +351,17 @@ async def update_post(
             detail="You can only edit your own posts"
         )
 
+    # サマリーに影響する項目（フェーズ・問いの変更）が変わるか
+    summary_changed = (
+        post.phase_label != post_data.phase_label
+        or post.question_state_change_type != post_data.question_state_change_type
+    )
+    # AI判定の対象（課題・本文）が変わるか
+    content_changed = (
+        (post.problem, post.content_1, post.content_2, post.content_3)
+        != (post_data.problem, post_data.content_1, post_data.content_2, post_data.content_3)
+    )
+
     # 投稿内容を更新
     post.problem = post_data.problem
     post.content_1 = post_data.content_1
@@ -232,47 +369,36 @@ async def update_post(
     post.content_3 = post_data.content_3
     post.question_state_change_type = post_data.question_state_change_type
     post.phase_label = post_data.phase_label
+    post.phase_code = phase_service.to_phase_code(post_data.phase_label)
     post.updated_at = datetime.utcnow()
 
-    # 既存の能力関連を削除
-    delete_stmt = select(PostAbilityPoint).where(PostAbilityPoint.post_id == post_id)
-    delete_result = await db.execute(delete_stmt)
-    existing_points = delete_result.scalars().all()
-    for point in existing_points:
-        await db.delete(point)
+    # 能力関連は差分のみ反映し、投稿の更新と同じトランザクションでコミットする
+    ability_ids = await ability_registry.resolve_codes(db, post_data.ability_codes)
+    current_ability_ids = (await post_repository.get_ability_ids_by_post(db, [post.id])).get(post.id, [])
+    if set(current_ability_ids) != set(ability_ids):
+        # AI判定の書き込みと同じ順序（投稿→生徒→能力ポイント）でロックする（能力が変わらない場合はロックしない）
+        await student_summary_repository.lock_students(db, [post.user_id])
+        await ability_point_repository.sync_post_ability_points(db, post.id, ability_ids)
+        summary_changed = True
+    if summary_changed:
+        await student_summary_repository.refresh_student_summaries(db, [post.user_id])
+    if content_changed:
+        await post_analysis_job_repository.enqueue(db, [post.id], now=post.updated_at)
 
     await db.commit()
-
-    # 新しい能力関連を保存
-    if post_data.ability_codes:
-        abilities_stmt = select(NonCogAbility).where(NonCogAbility.code.in_(post_data.ability_codes))
-        abilities_result = await db.execute(abilities_stmt)
-        abilities = abilities_result.scalars().all()
-
-        for ability in abilities:
-            post_ability_point = PostAbilityPoint(
-                post_id=post.id,
-                ability_id=ability.id
-            )
-            db.add(post_ability_point)
-
-    await db.commit()
-    await db.refresh(post, ["user"])
-
-    return PostResponse(
-        id=post.id,
-        user_id=post.user_id,
-        problem=post.problem,
-        content_1=post.content_1,
-        content_2=post.content_2,
-        content_3=post.content_3,
-        question_state_change_type=post.question_state_change_type,
-        phase_label=post.phase_label,
-        created_at=post.created_at,
-        updated_at=post.updated_at,
-        user_name=post.user.full_name if post.user else None,
-        user_avatar_url=post.user.avatar_url if post.user else None,
-    )
+    if summary_changed:
+        dashboard_service.invalidate_activity_cache()
+    if content_changed:
+        post_analysis_worker.notify()
+
+    # いいね数・いいね有無は他の取得APIと同じ列で読み直す
+    rows = await post_repository.get_post_rows_by_ids(db, [post.id], viewer_id=current_user.id)
+    if not rows:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Post not found"
+        )
+    return _post_row_responses(rows, current_user.id)[0]
 
 
 @router.delete("/{post_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -302,57 +428,53 @@ async def delete_post(
 
     # 論理削除
     post.deleted_at = datetime.utcnow()
+    await student_summary_repository.refresh_student_summaries(db, [post.user_id])
     await db.commit()
+    dashboard_service.invalidate_activity_cache()
 
     return None
 
 
+async def _record_buffered_like(db: AsyncSession, post_id: int, user_id: int, liked: bool) -> dict:
+    """write-behindモード: いいねの意図をバッファに記録し、楽観的ないいね数を返す"""
+    state = await post_repository.get_like_state(db, post_id, user_id)
+
+    if state is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Post not found"
+        )
+
+    like_count, db_liked = state
+    like_write_buffer.record(post_id, user_id, liked=liked, db_liked=db_liked)
+
+    return {
+        "post_id": post_id,
+        "like_count": like_count + like_write_buffer.pending_delta(post_id),
+        "liked_by_me": liked,
+    }
+
+
 @router.post("/{post_id}/like", status_code=status.HTTP_201_CREATED)
 async def like_post(
     post_id: int,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    """投稿にいいねする"""
-    # 投稿を取得
-    stmt = select(Post).where(Post.id == post_id, Post.deleted_at.is_(None))
-    result = await db.execute(stmt)
-    post = result.scalar_one_or_none()
+    """投稿にいいねする（いいね済みの場合は何もせず現在のいいね数を返す）"""
+    if settings.like_write_behind_enabled:
+        return await _record_buffered_like(db, post_id, current_user.id, liked=True)
 
-    if not post:
+    like_count = await post_repository.add_like(db, post_id, current_user.id)
+
+    if like_count is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Post not found"
         )
 
-    # 既にいいねしているか確認
-    existing_like_stmt = select(PostLike).where(
-        PostLike.post_id == post_id,
-        PostLike.user_id == current_user.id
-    )
-    existing_like_result = await db.execute(existing_like_stmt)
-    existing_like = existing_like_result.scalar_one_or_none()
-
-    if existing_like:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Already liked this post"
-        )
-
-    # いいねを作成
-    new_like = PostLike(
-        post_id=post_id,
-        user_id=current_user.id,
-        created_at=datetime.utcnow()
-    )
-    db.add(new_like)
     await db.commit()
 
-    # いいね数を取得
-    like_count_stmt = select(func.count(PostLike.id)).where(PostLike.post_id == post_id)
-    like_count_result = await db.execute(like_count_stmt)
-    like_count = like_count_result.scalar()
-
     return {"post_id": post_id, "like_count": like_count, "liked_by_me": True}
 
 
@@ -362,39 +484,18 @@ async def unlike_post(
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    """投稿のいいねを取り消す"""
-    # 投稿を取得
-    stmt = select(Post).where(Post.id == post_id, Post.deleted_at.is_(None))
-    result = await db.execute(stmt)
-    post = result.scalar_one_or_none()
+    """投稿のいいねを取り消す（いいねしていない場合は何もせず現在のいいね数を返す）"""
+    if settings.like_write_behind_enabled:
+        return await _record_buffered_like(db, post_id, current_user.id, liked=False)
 
-    if not post:
+    like_count = await post_repository.remove_like(db, post_id, current_user.id)
+
+    if like_count is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Post not found"
         )
 
-    # いいねを取得
-    like_stmt = select(PostLike).where(
-        PostLike.post_id == post_id,
-        PostLike.user_id == current_user.id
-    )
-    like_result = await db.execute(like_stmt)
-    like = like_result.scalar_one_or_none()
-
-    if not like:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="You haven't liked this post"
-        )
-
-    # いいねを削除
-    await db.delete(like)
     await db.commit()
 
-    # いいね数を取得
-    like_count_stmt = select(func.count(PostLike.id)).where(PostLike.post_id == post_id)
-    like_count_result = await db.execute(like_count_stmt)
-    like_count = like_count_result.scalar()
-
     return {"post_id": post_id, "like_count": like_count, "liked_by_me": False}
@@ -10,10 +10,11 @@ from sqlalchemy.orm import joinedload
 from app.api.deps import get_current_user
 from app.core.database import get_db
 from app.models.thanks_letter import ThanksLetter
-from app.models.thanks_letter_ability_point import ThanksLetterAbilityPoint
-from app.models.non_cog_ability import NonCogAbility
 from app.models.user import User, RoleEnum
+from app.repositories import ability_point_repository, student_summary_repository
 from app.schemas.thanks_letter import ThanksLetterCreate, ThanksLetterUpdate, ThanksLetterResponse
+from app.services import dashboard_service
+from app.services.ability_registry_service import ability_registry
 
 router = APIRouter()
 
@@ -34,6 +35,9 @@ async def create_thanks_letter(
     if receiver.role == RoleEnum.admin:
         raise HTTPException(status_code=400, detail="管理者には感謝の手紙を送ることはできません")
 
+    # ability_codesはレジストリから解決する（DB問い合わせなし）
+    ability_ids = await ability_registry.resolve_codes(db, letter_data.ability_codes)
+
     # 感謝の手紙を作成
     letter = ThanksLetter(
         sender_user_id=current_user.id,
@@ -44,24 +48,18 @@ async def create_thanks_letter(
     )
 
     db.add(letter)
-    await db.commit()
-    await db.refresh(letter)
-
-    # 非認知能力の関連を保存（受信者の能力として記録）
-    if letter_data.ability_codes:
-        abilities_stmt = select(NonCogAbility).where(NonCogAbility.code.in_(letter_data.ability_codes))
-        abilities_result = await db.execute(abilities_stmt)
-        abilities = abilities_result.scalars().all()
-
-        for ability in abilities:
-            letter_ability_point = ThanksLetterAbilityPoint(
-                thanks_letter_id=letter.id,
-                ability_id=ability.id,
-                points=1
-            )
-            db.add(letter_ability_point)
+    await db.flush()
 
-        await db.commit()
+    # 非認知能力の関連を保存（受信者の能力として記録）し、サマリーと同じトランザクションでコミットする
+    await ability_point_repository.add_thanks_letter_ability_points(db, letter.id, ability_ids)
+    await student_summary_repository.record_letter_created(
+        db,
+        sender_user_id=letter.sender_user_id,
+        receiver_user_id=letter.receiver_user_id,
+        ability_ids=ability_ids,
+    )
+    await db.commit()
+    dashboard_service.invalidate_activity_cache()
 
     # リレーションをロード
     await db.refresh(letter, ["sender", "receiver"])
@@ -247,30 +245,15 @@ async def update_thanks_letter(
     letter.content_1 = letter_data.content_1
     letter.content_2 = letter_data.content_2
 
-    # 既存の能力関連を削除
-    delete_stmt = select(ThanksLetterAbilityPoint).where(ThanksLetterAbilityPoint.thanks_letter_id == letter_id)
-    delete_result = await db.execute(delete_stmt)
-    existing_points = delete_result.scalars().all()
-    for point in existing_points:
-        await db.delete(point)
-
-    await db.commit()
-
-    # 新しい能力関連を保存
-    if letter_data.ability_codes:
-        abilities_stmt = select(NonCogAbility).where(NonCogAbility.code.in_(letter_data.ability_codes))
-        abilities_result = await db.execute(abilities_stmt)
-        abilities = abilities_result.scalars().all()
-
-        for ability in abilities:
-            letter_ability_point = ThanksLetterAbilityPoint(
-                thanks_letter_id=letter.id,
-                ability_id=ability.id,
-                points=1
-            )
-            db.add(letter_ability_point)
+    # 能力関連は差分のみ反映し、手紙の更新と同じトランザクションでコミットする
+    ability_ids = await ability_registry.resolve_codes(db, letter_data.ability_codes)
+    abilities_changed = await ability_point_repository.sync_thanks_letter_ability_points(db, letter.id, ability_ids)
+    if abilities_changed:
+        await student_summary_repository.refresh_student_summaries(db, [letter.receiver_user_id])
 
     await db.commit()
+    if abilities_changed:
+        dashboard_service.invalidate_activity_cache()
     await db.refresh(letter, ["sender", "receiver"])
 
     return ThanksLetterResponse(
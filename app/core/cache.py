@@ -0,0 +1,139 @@
+"""プロセス内のレスポンスキャッシュ（TTL・stale-while-revalidate・タグによる無効化）
+
+ダッシュボードのように、重い集計結果を短時間だけ使い回したい読み取りAPI向け。
+- TTL以内: キャッシュをそのまま返す
+- TTL超過〜猶予期間内: 古い値を返しつつ、バックグラウンドで1回だけ再計算する
+- 猶予期間超過・未キャッシュ: その場で計算する（同じキーの同時リクエストは1回の計算を待つ）
+書き込み側は invalidate_tags() でタグ単位に破棄する。
+
+キャッシュと無効化はワーカープロセスごとで、invalidate_tags() は書き込みを処理したプロセスにしか届かない。
+他のプロセスは最大で TTL + 猶予期間のあいだ書き込み前の値を返しうるため、
+複数プロセスで動かす場合は、その間の古さを許容できる長さに TTL・猶予期間を設定する。
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Iterable
+
+from app.core.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+Loader = Callable[[], Awaitable[Any]]
+
+
+@dataclass
+class _Entry:
+    value: Any
+    stored_at: float
+    tags: tuple[str, ...]
+
+
+class ResponseCache:
+    """タグ付きのTTLキャッシュ（ワーカープロセス単位）"""
+
+    def __init__(self, max_entries: int = 1000):
+        # 上限を超えた場合は最も長く使われていないエントリから破棄する（使用順のdictで管理）
+        self._max_entries = max_entries
+        self._entries: dict[str, _Entry] = {}
+        # 計算中のキー（同じキーの計算を1回にまとめる）
+        self._loading: dict[str, asyncio.Future] = {}
+        # タグごとの世代（無効化のたびに進める）
+        self._tag_generations: dict[str, int] = {}
+        self._stats = {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "invalidations": 0, "evictions": 0}
+
+    def stats(self) -> dict:
+        """ヒット・ミスなどの累計とエントリ数"""
+        return {**self._stats, "entries": len(self._entries)}
+
+    def clear(self) -> None:
+        """すべてのエントリと統計を破棄"""
+        self._entries.clear()
+        self._tag_generations.clear()
+        for key in self._stats:
+            self._stats[key] = 0
+
+    def invalidate_tags(self, *tags: str) -> None:
+        """指定タグを持つエントリを破棄する（計算中の結果も保存させない）"""
+        for tag in tags:
+            self._tag_generations[tag] = self._tag_generations.get(tag, 0) + 1
+        removed = [key for key, entry in self._entries.items() if set(entry.tags) & set(tags)]
+        for key in removed:
+            del self._entries[key]
+        self._stats["invalidations"] += 1
+
+    def put(self, key: str, value: Any, *, tags: Iterable[str] = ()) -> None:
+        """計算済みの値を保存する（強制的に再計算した結果で置き換える場合など）"""
+        self._store(key, _Entry(value=value, stored_at=time.monotonic(), tags=tuple(tags)))
+
+    async def get_or_load(
+        self,
+        key: str,
+        loader: Loader,
+        *,
+        tags: Iterable[str] = (),
+        ttl: float,
+        stale_ttl: float = 0,
+    ) -> Any:
+        """キャッシュから取得し、なければ loader() で計算して保存する
+
+        stale_ttl はTTL経過後も古い値を返してよい猶予（秒）。
+        バックグラウンドで再計算するため、loader はリクエストのセッションに依存しないこと。
+        """
+        tags = tuple(tags)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._touch(key)
+            age = time.monotonic() - entry.stored_at
+            if age < ttl:
+                self._stats["hits"] += 1
+                return entry.value
+            if age < ttl + stale_ttl:
+                self._stats["stale_hits"] += 1
+                if key not in self._loading:
+                    self._stats["refreshes"] += 1
+                    self._start_load(key, loader, tags).add_done_callback(_log_refresh_error)
+                return entry.value
+
+        self._stats["misses"] += 1
+        future = self._loading.get(key) or self._start_load(key, loader, tags)
+        return await asyncio.shield(future)
+
+    def _start_load(self, key: str, loader: Loader, tags: tuple[str, ...]) -> asyncio.Future:
+        generations = {tag: self._tag_generations.get(tag, 0) for tag in tags}
+
+        async def _load():
+            try:
+                value = await loader()
+                # 計算中に無効化された場合は、古いデータの可能性があるため保存しない
+                if all(self._tag_generations.get(tag, 0) == gen for tag, gen in generations.items()):
+                    self._store(key, _Entry(value=value, stored_at=time.monotonic(), tags=tags))
+                return value
+            finally:
+                self._loading.pop(key, None)
+
+        future = asyncio.ensure_future(_load())
+        self._loading[key] = future
+        return future
+
+    def _touch(self, key: str) -> None:
+        # 使用したキーは末尾（最も新しい位置）に移す
+        self._entries[key] = self._entries.pop(key)
+
+    def _store(self, key: str, entry: _Entry) -> None:
+        self._entries.pop(key, None)
+        self._entries[key] = entry
+        while len(self._entries) > self._max_entries:
+            del self._entries[next(iter(self._entries))]
+            self._stats["evictions"] += 1
+
+
+def _log_refresh_error(future: asyncio.Future) -> None:
+    if not future.cancelled() and future.exception() is not None:
+        logger.error("Background cache refresh failed", exc_info=future.exception())
+
+
+# グローバルインスタンス
+response_cache = ResponseCache(max_entries=settings.dashboard_cache_max_entries)
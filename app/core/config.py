@@ -55,6 +55,39 @@ class Settings:
     openai_api_key: str = os.getenv("OPENAI_API_KEY", "")
     openai_model: str = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
 
+    # 非認知能力マスターのレジストリ再読み込み間隔（秒、0以下で無期限）
+    ability_registry_ttl_seconds: int = int(os.getenv("ABILITY_REGISTRY_TTL_SECONDS", "3600"))
+
+    # ダッシュボードのレスポンスキャッシュ（秒）
+    # TTL経過後も猶予期間内は古い値を返し、裏で再計算する
+    # 書き込みによる破棄は他のワーカープロセスに届かないため、TTL + 猶予期間がプロセス間で古い値を返しうる上限になる
+    dashboard_cache_ttl_seconds: int = int(os.getenv("DASHBOARD_CACHE_TTL_SECONDS", "10"))
+    dashboard_cache_stale_seconds: int = int(os.getenv("DASHBOARD_CACHE_STALE_SECONDS", "20"))
+    # キャッシュするエントリ数の上限（生徒別の詳細など、キーが増え続けるものの上限）
+    dashboard_cache_max_entries: int = int(os.getenv("DASHBOARD_CACHE_MAX_ENTRIES", "1000"))
+
+    # 能力判定結果のキャッシュ（プロセス内LRU + DB）
+    analysis_cache_enabled: bool = _get_bool("ANALYSIS_CACHE_ENABLED", True)
+    analysis_cache_ttl_seconds: int = int(os.getenv("ANALYSIS_CACHE_TTL_SECONDS", "2592000"))
+    analysis_cache_max_entries: int = int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", "1000"))
+
+    # 投稿のAI判定ジョブ（投稿時に登録し、ワーカーがリクエストの外で判定する）
+    post_analysis_enabled: bool = _get_bool("POST_ANALYSIS_ENABLED", True)
+    post_analysis_concurrency: int = int(os.getenv("POST_ANALYSIS_CONCURRENCY", "4"))
+    post_analysis_max_attempts: int = int(os.getenv("POST_ANALYSIS_MAX_ATTEMPTS", "5"))
+    post_analysis_retry_base_seconds: int = int(os.getenv("POST_ANALYSIS_RETRY_BASE_SECONDS", "30"))
+    post_analysis_poll_interval_seconds: int = int(os.getenv("POST_ANALYSIS_POLL_INTERVAL_SECONDS", "5"))
+    post_analysis_lock_timeout_seconds: int = int(os.getenv("POST_ANALYSIS_LOCK_TIMEOUT_SECONDS", "600"))
+
+    # 介入フラグの定期スキャン
+    intervention_scan_enabled: bool = _get_bool("INTERVENTION_SCAN_ENABLED", True)
+    intervention_scan_interval_seconds: int = int(os.getenv("INTERVENTION_SCAN_INTERVAL_SECONDS", "600"))
+
+    # いいねの書き込み遅延（write-behind）設定
+    like_write_behind_enabled: bool = _get_bool("LIKE_WRITE_BEHIND_ENABLED", False)
+    like_flush_interval_ms: int = int(os.getenv("LIKE_FLUSH_INTERVAL_MS", "500"))
+    like_flush_max_batch: int = int(os.getenv("LIKE_FLUSH_MAX_BATCH", "200"))
+
     # 2FA関連設定
     temp_token_expiration_minutes: int = int(os.getenv("TEMP_TOKEN_EXPIRATION_MINUTES", "10"))
     rate_limit_enabled: bool = _get_bool("RATE_LIMIT_ENABLED", True)
@@ -1,4 +1,7 @@
-from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy import func, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 
 from app.core.config import settings
 
@@ -19,3 +22,53 @@ AsyncSessionLocal = async_sessionmaker(
 async def get_db():
     async with AsyncSessionLocal() as session:
         yield session
+
+
+def dialect_insert(db: AsyncSession, table):
+    """接続先の方言（MySQL/SQLite）に応じたINSERT構文を返す（upsert用）"""
+    if db.get_bind().dialect.name == "sqlite":
+        return sqlite_insert(table)
+    return mysql_insert(table)
+
+
+def insert_ignore(db: AsyncSession, table):
+    """一意制約の重複のみ無視するINSERT（MySQL: ON DUPLICATE KEY UPDATE / SQLite: ON CONFLICT DO NOTHING）
+
+    MySQLでは主キーを自身に代入する何もしない更新にする。INSERT IGNORE と異なり、
+    外部キー違反や値の切り捨てはエラーのまま返る。
+    MySQLのドライバはFOUND_ROWSを有効にするため、重複時もrowcountは1になる（挿入の有無の判定には使わない）。
+    """
+    stmt = dialect_insert(db, table)
+    if db.get_bind().dialect.name == "sqlite":
+        return stmt.on_conflict_do_nothing()
+    key = next(iter(getattr(table, "__table__", table).primary_key.columns))
+    return stmt.on_duplicate_key_update({key.name: key})
+
+
+async def update_returning(db: AsyncSession, table, *, where, column, value) -> int | None:
+    """1行を対象とするUPDATEを実行し、更新後の列の値を同じ往復で返す（対象の行がない場合はNone）
+
+    SQLiteは RETURNING で返す。MySQLは RETURNING がないため、値を LAST_INSERT_ID(式) で包み、
+    UPDATEの応答に含まれる lastrowid から読む（非負の整数の列のみ）。
+    """
+    stmt = update(table).where(*where).execution_options(synchronize_session=False)
+    if db.get_bind().dialect.name == "sqlite":
+        row = (await db.execute(stmt.values({column: value}).returning(column))).first()
+        return None if row is None else row[0]
+    # LAST_INSERT_ID(式) は式の値をそのまま列に書き込みつつ、接続の LAST_INSERT_ID にも設定する。
+    # MySQLはUPDATEでもOKパケットの insert_id にその値を載せて返し、ドライバはそれを lastrowid に入れるため、
+    # 追加のSELECTなしで更新後の値を読める（行が一致しない場合は設定されないため rowcount で判定する）
+    result = await db.execute(stmt.values({column: func.last_insert_id(value)}))
+    return result.lastrowid if result.rowcount else None
+
+
+def upsert(db: AsyncSession, table, values, *, key_columns: list[str], update):
+    """主キー/一意キーが重複する場合は更新するINSERT
+
+    update には新しい行の列（MySQL: VALUES(...) / SQLite: excluded）を受け取り、
+    更新する列の辞書を返す関数を渡す。
+    """
+    stmt = dialect_insert(db, table).values(values)
+    if db.get_bind().dialect.name == "sqlite":
+        return stmt.on_conflict_do_update(index_elements=key_columns, set_=update(stmt.excluded))
+    return stmt.on_duplicate_key_update(update(stmt.inserted))
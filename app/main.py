@@ -5,7 +5,13 @@ from sqlalchemy import text
 
 from app.api import admin_users, auth, users, two_fa, posts, admin_database, thanks_letters, dashboard, ability_analysis
 from app.core.config import settings
-from app.core.database import engine
+from app.core.database import AsyncSessionLocal, engine
+from app.repositories import student_summary_repository
+from app.services import phase_service
+from app.services.ability_registry_service import ability_registry
+from app.services.intervention_scanner_service import intervention_scanner
+from app.services.like_buffer_service import like_write_buffer
+from app.services.post_analysis_service import post_analysis_worker
 
 
 async def run_migration_on_startup():
@@ -52,11 +58,272 @@ async def run_migration_on_startup():
                 else:
                     print(f"⚠ Warning: Could not create temp_tokens table: {e}")
 
+            try:
+                await conn.execute(text("ALTER TABLE posts ADD COLUMN like_count INT NOT NULL DEFAULT 0"))
+                # 追加直後は既存のいいねをカウンタに反映する
+                await conn.execute(text(
+                    "UPDATE posts SET like_count = "
+                    "(SELECT COUNT(*) FROM post_likes WHERE post_likes.post_id = posts.id)"
+                ))
+                print("✓ Added like_count column")
+            except Exception as e:
+                if "Duplicate column name" in str(e) or "already exists" in str(e).lower():
+                    pass  # 既に存在する場合は無視
+                else:
+                    print(f"⚠ Warning: Could not add like_count column: {e}")
+
+            phase_code_added = False
+            try:
+                await conn.execute(text(
+                    "ALTER TABLE posts ADD COLUMN phase_code ENUM("
+                    "'theme_setting','problem_setting','information_gathering','analysis','summary','presentation'"
+                    ") NULL AFTER phase_label"
+                ))
+                phase_code_added = True
+                print("✓ Added phase_code column")
+            except Exception as e:
+                if "Duplicate column name" in str(e) or "already exists" in str(e).lower():
+                    pass  # 既に存在する場合は無視
+                else:
+                    print(f"⚠ Warning: Could not add phase_code column: {e}")
+
+            try:
+                await conn.execute(text(
+                    "CREATE INDEX idx_posts_deleted_at_created_at_id ON posts (deleted_at, created_at, id)"
+                ))
+                print("✓ Created idx_posts_deleted_at_created_at_id index")
+            except Exception as e:
+                if "Duplicate key name" in str(e) or "already exists" in str(e).lower():
+                    pass  # 既に存在する場合は無視
+                else:
+                    print(f"⚠ Warning: Could not create idx_posts_deleted_at_created_at_id index: {e}")
+
+            try:
+                await conn.execute(text(
+                    "CREATE INDEX idx_posts_user_id_deleted_at_created_at ON posts (user_id, deleted_at, created_at)"
+                ))
+                print("✓ Created idx_posts_user_id_deleted_at_created_at index")
+            except Exception as e:
+                if "Duplicate key name" in str(e) or "already exists" in str(e).lower():
+                    pass  # 既に存在する場合は無視
+                else:
+                    print(f"⚠ Warning: Could not create idx_posts_user_id_deleted_at_created_at index: {e}")
+
+            try:
+                await conn.execute(text(
+                    "CREATE INDEX idx_users_role_active_grade_class "
+                    "ON users (role, is_active, is_deleted, grade, class_name)"
+                ))
+                print("✓ Created idx_users_role_active_grade_class index")
+            except Exception as e:
+                if "Duplicate key name" in str(e) or "already exists" in str(e).lower():
+                    pass  # 既に存在する場合は無視
+                else:
+                    print(f"⚠ Warning: Could not create idx_users_role_active_grade_class index: {e}")
+
+            try:
+                # 投稿の全文検索用（日本語のためngramパーサーを使う）
+                await conn.execute(text(
+                    "ALTER TABLE posts ADD FULLTEXT INDEX ft_posts_text "
+                    "(problem, content_1, content_2, content_3) WITH PARSER ngram"
+                ))
+                print("✓ Created ft_posts_text fulltext index")
+            except Exception as e:
+                if "Duplicate key name" in str(e) or "already exists" in str(e).lower():
+                    pass  # 既に存在する場合は無視
+                else:
+                    print(f"⚠ Warning: Could not create ft_posts_text fulltext index: {e}")
+
+            summary_created = False
+            try:
+                await conn.execute(text("""
+                    CREATE TABLE student_activity_summary (
+                        user_id BIGINT NOT NULL PRIMARY KEY,
+                        post_count INT NOT NULL DEFAULT 0,
+                        last_posted_at TIMESTAMP NULL,
+                        latest_phase VARCHAR(50) NULL,
+                        latest_phase_code ENUM('theme_setting','problem_setting','information_gathering','analysis','summary','presentation') NULL,
+                        question_change_count INT NOT NULL DEFAULT 0,
+                        letters_sent_count INT NOT NULL DEFAULT 0,
+                        letters_received_count INT NOT NULL DEFAULT 0,
+                        updated_at TIMESTAMP NOT NULL,
+                        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+                    )
+                """))
+                await conn.execute(text("""
+                    CREATE TABLE student_ability_summary (
+                        user_id BIGINT NOT NULL,
+                        ability_id TINYINT NOT NULL,
+                        post_points DECIMAL(10,1) NOT NULL DEFAULT 0,
+                        letter_points DECIMAL(10,1) NOT NULL DEFAULT 0,
+                        PRIMARY KEY (user_id, ability_id),
+                        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+                        FOREIGN KEY (ability_id) REFERENCES non_cog_abilities(id) ON DELETE CASCADE
+                    )
+                """))
+                summary_created = True
+                print("✓ Created student_activity_summary / student_ability_summary tables")
+            except Exception as e:
+                if "already exists" in str(e).lower():
+                    pass  # 既に存在する場合は無視
+                else:
+                    print(f"⚠ Warning: Could not create student summary tables: {e}")
+
+            try:
+                await conn.execute(text(
+                    "ALTER TABLE student_activity_summary ADD COLUMN latest_phase_code ENUM("
+                    "'theme_setting','problem_setting','information_gathering','analysis','summary','presentation'"
+                    ") NULL AFTER latest_phase"
+                ))
+                # 追加直後は保存済みの表示名（正規化済み）からコードを埋める（生徒1人1行のため1文で済む）
+                phase_code = "CASE latest_phase " + " ".join(
+                    f"WHEN '{label}' THEN '{code.value}'" for code, label in phase_service.PHASE_LABELS.items()
+                ) + " END"
+                await conn.execute(text(f"UPDATE student_activity_summary SET latest_phase_code = {phase_code}"))
+                print("✓ Added latest_phase_code column")
+            except Exception as e:
+                if "Duplicate column name" in str(e) or "already exists" in str(e).lower():
+                    pass  # 既に存在する場合は無視
+                else:
+                    print(f"⚠ Warning: Could not add latest_phase_code column: {e}")
+
+            try:
+                await conn.execute(text("""
+                    CREATE TABLE period_ability_snapshots (
+                        period_id INT NOT NULL,
+                        user_id BIGINT NOT NULL,
+                        ability_id TINYINT NOT NULL,
+                        post_points DECIMAL(10,1) NOT NULL DEFAULT 0,
+                        letter_points DECIMAL(10,1) NOT NULL DEFAULT 0,
+                        post_count INT NOT NULL DEFAULT 0,
+                        created_at TIMESTAMP NOT NULL,
+                        PRIMARY KEY (period_id, user_id, ability_id),
+                        FOREIGN KEY (period_id) REFERENCES evaluation_periods(id) ON DELETE CASCADE,
+                        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+                        FOREIGN KEY (ability_id) REFERENCES non_cog_abilities(id) ON DELETE CASCADE
+                    )
+                """))
+                print("✓ Created period_ability_snapshots table")
+            except Exception as e:
+                if "already exists" in str(e).lower():
+                    pass  # 既に存在する場合は無視
+                else:
+                    print(f"⚠ Warning: Could not create period_ability_snapshots table: {e}")
+
+            try:
+                await conn.execute(text("""
+                    CREATE TABLE student_intervention_flags (
+                        user_id BIGINT NOT NULL PRIMARY KEY,
+                        flagged_since TIMESTAMP NOT NULL,
+                        last_posted_at TIMESTAMP NULL,
+                        scanned_at TIMESTAMP NOT NULL,
+                        INDEX idx_flagged_since (flagged_since, user_id),
+                        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+                    )
+                """))
+                print("✓ Created student_intervention_flags table")
+            except Exception as e:
+                if "already exists" in str(e).lower():
+                    pass  # 既に存在する場合は無視
+                else:
+                    print(f"⚠ Warning: Could not create student_intervention_flags table: {e}")
+
+            try:
+                await conn.execute(text("""
+                    CREATE TABLE ability_analysis_cache (
+                        cache_key CHAR(64) NOT NULL PRIMARY KEY,
+                        model VARCHAR(100) NOT NULL,
+                        prompt_version CHAR(64) NOT NULL,
+                        result JSON NOT NULL,
+                        created_at TIMESTAMP NOT NULL,
+                        expires_at TIMESTAMP NOT NULL,
+                        INDEX idx_ability_analysis_cache_expires_at (expires_at)
+                    )
+                """))
+                print("✓ Created ability_analysis_cache table")
+            except Exception as e:
+                if "already exists" in str(e).lower():
+                    pass  # 既に存在する場合は無視
+                else:
+                    print(f"⚠ Warning: Could not create ability_analysis_cache table: {e}")
+
+            try:
+                await conn.execute(text("""
+                    CREATE TABLE post_analysis_jobs (
+                        post_id BIGINT NOT NULL PRIMARY KEY,
+                        status ENUM('pending','running','done','failed') NOT NULL,
+                        version INT NOT NULL DEFAULT 1,
+                        attempts INT NOT NULL DEFAULT 0,
+                        run_after TIMESTAMP NOT NULL,
+                        locked_at TIMESTAMP NULL,
+                        claim_token CHAR(32) NULL,
+                        last_error TEXT NULL,
+                        created_at TIMESTAMP NOT NULL,
+                        updated_at TIMESTAMP NOT NULL,
+                        INDEX idx_post_analysis_jobs_status_run_after (status, run_after),
+                        FOREIGN KEY (post_id) REFERENCES posts(id) ON DELETE CASCADE
+                    )
+                """))
+                print("✓ Created post_analysis_jobs table")
+            except Exception as e:
+                if "already exists" in str(e).lower():
+                    pass  # 既に存在する場合は無視
+                else:
+                    print(f"⚠ Warning: Could not create post_analysis_jobs table: {e}")
+
+            try:
+                # 既存の行（シードデータの action_index 1〜3 を含む）は生徒が選んだ能力として既定値の selected になる
+                await conn.execute(text(
+                    "ALTER TABLE post_ability_points ADD COLUMN source ENUM('selected','analysis') "
+                    "NOT NULL DEFAULT 'selected' AFTER ability_id"
+                ))
+                print("✓ Added post_ability_points.source column")
+            except Exception as e:
+                if "Duplicate column name" in str(e) or "already exists" in str(e).lower():
+                    pass  # 既に存在する場合は無視
+                else:
+                    print(f"⚠ Warning: Could not add post_ability_points.source column: {e}")
+
+            try:
+                # 生徒が選んだ能力とAI判定の能力が同じ action_index・能力で共存できるよう、一意キーに source を含める
+                # （旧一意キーの削除は migrations/alter_post_ability_points_source.sql で一度だけ行う）
+                await conn.execute(text(
+                    "ALTER TABLE post_ability_points ADD UNIQUE KEY uq_post_ability_points_source "
+                    "(post_id, source, action_index, ability_id)"
+                ))
+                print("✓ Created uq_post_ability_points_source unique key")
+            except Exception as e:
+                if "Duplicate key name" in str(e) or "already exists" in str(e).lower():
+                    pass  # 既に存在する場合は無視
+                else:
+                    print(f"⚠ Warning: Could not create uq_post_ability_points_source unique key: {e}")
+
+        if phase_code_added:
+            # 既存の投稿の正規化は起動を止めず、テーブルを長くロックしないよう別途バッチで行う
+            # （未正規化の投稿も、サマリーの再計算時には phase_label から正規化される）
+            print("ℹ Run scripts/backfill_phase_codes.py to fill phase_code for existing posts")
+
+        if summary_created:
+            # 作成直後は既存の投稿・手紙からサマリーを構築する
+            async with AsyncSessionLocal() as db:
+                await student_summary_repository.rebuild_all_student_summaries(db)
+            print("✓ Built student summaries")
+
         print("✅ Database migration check completed")
     except Exception as e:
         print(f"⚠ Warning: Migration check failed (this is OK if tables already exist): {e}")
 
 
+async def load_ability_registry_on_startup():
+    """非認知能力マスターをレジストリに読み込む（失敗しても初回参照時に再試行される）"""
+    try:
+        async with AsyncSessionLocal() as db:
+            snapshot = await ability_registry.load(db)
+        print(f"✓ Loaded ability registry ({len(snapshot.abilities)} abilities, version {snapshot.version})")
+    except Exception as e:
+        print(f"⚠ Warning: Could not load ability registry: {e}")
+
+
 def create_app() -> FastAPI:
     app = FastAPI(title="School Auth")
 
@@ -64,6 +331,20 @@ def create_app() -> FastAPI:
     async def startup_event():
         """アプリケーション起動時のイベント"""
         await run_migration_on_startup()
+        await load_ability_registry_on_startup()
+        if settings.like_write_behind_enabled:
+            like_write_buffer.start(AsyncSessionLocal)
+        if settings.intervention_scan_enabled:
+            intervention_scanner.start(AsyncSessionLocal)
+        if settings.post_analysis_enabled:
+            post_analysis_worker.start(AsyncSessionLocal)
+
+    @app.on_event("shutdown")
+    async def shutdown_event():
+        """アプリケーション終了時のイベント（バッファ済みのいいねを書き込む）"""
+        await post_analysis_worker.stop()
+        await intervention_scanner.stop()
+        await like_write_buffer.stop()
 
     if settings.cors_origins:
         app.add_middleware(
@@ -72,6 +353,8 @@ def create_app() -> FastAPI:
             allow_credentials=True,
             allow_methods=["*"],
             allow_headers=["*"],
+            # ダッシュボードのページング用
+            expose_headers=["X-Next-Cursor"],
         )
 
     # 422エラーの詳細をログ出力するための例外ハンドラー
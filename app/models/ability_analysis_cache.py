@@ -0,0 +1,27 @@
+"""能力判定結果のキャッシュモデル"""
+from datetime import datetime
+
+from sqlalchemy import JSON, Index, String, TIMESTAMP
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.models.base import Base
+
+
+class AbilityAnalysisCache(Base):
+    """能力判定（OpenAI API）の結果
+
+    app/services/analysis_cache_service.py がプロセス内キャッシュの次に参照する。
+    cache_key は正規化した課題・本文、モデル名、プロンプトのバージョンのハッシュ。
+    """
+    __tablename__ = "ability_analysis_cache"
+    __table_args__ = (
+        # 期限切れの行の削除用
+        Index("idx_ability_analysis_cache_expires_at", "expires_at"),
+    )
+
+    cache_key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    model: Mapped[str] = mapped_column(String(100), nullable=False)
+    prompt_version: Mapped[str] = mapped_column(String(64), nullable=False)
+    result: Mapped[dict] = mapped_column(JSON, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(TIMESTAMP, nullable=False)
+    expires_at: Mapped[datetime] = mapped_column(TIMESTAMP, nullable=False)
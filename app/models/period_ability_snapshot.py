@@ -0,0 +1,31 @@
+"""評価期間ごとの能力スナップショットモデル"""
+from datetime import datetime
+
+from sqlalchemy import BigInteger, DECIMAL, ForeignKey, Integer, TIMESTAMP
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.models.base import Base
+
+
+# BigInteger for MySQL, Integer for SQLite
+PKType = BigInteger().with_variant(Integer, "sqlite")
+
+
+class PeriodAbilitySnapshot(Base):
+    """評価期間の終了時点での、生徒・能力ごとの累計（期間終了後は変更しない）
+
+    scripts/snapshot_evaluation_periods.py で終了した期間ごとに1回作成する。
+    在籍中の全生徒 × 全能力の行を持つ（ポイントのない能力は0）。
+    """
+    __tablename__ = "period_ability_snapshots"
+
+    period_id: Mapped[int] = mapped_column(Integer, ForeignKey("evaluation_periods.id", ondelete="CASCADE"), primary_key=True)
+    user_id: Mapped[int] = mapped_column(PKType, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    ability_id: Mapped[int] = mapped_column(PKType, ForeignKey("non_cog_abilities.id", ondelete="CASCADE"), primary_key=True)
+    # 投稿の能力ポイント累計
+    post_points: Mapped[float] = mapped_column(DECIMAL(10, 1), nullable=False, default=0, server_default="0")
+    # 受け取った感謝の手紙の能力ポイント累計
+    letter_points: Mapped[float] = mapped_column(DECIMAL(10, 1), nullable=False, default=0, server_default="0")
+    # 生徒の投稿数の累計（同じ生徒の行では同じ値）
+    post_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    created_at: Mapped[datetime] = mapped_column(TIMESTAMP, nullable=False)
@@ -4,17 +4,20 @@ from datetime import datetime
 from typing import Optional
 
 from sqlalchemy import (
+    DDL,
     JSON,
     BigInteger,
     DateTime,
     Enum,
     ForeignKey,
+    Index,
     Integer,
     String,
     Text,
     DECIMAL,
     TIMESTAMP,
     Date,
+    event,
 )
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -31,6 +34,16 @@ class QuestionStateChangeType(str, enum.Enum):
     changed = "changed"
 
 
+class PhaseCode(str, enum.Enum):
+    """探究のフェーズ（正規化したコード。表示名は app/services/phase_service.py）"""
+    theme_setting = "theme_setting"
+    problem_setting = "problem_setting"
+    information_gathering = "information_gathering"
+    analysis = "analysis"
+    summary = "summary"
+    presentation = "presentation"
+
+
 class SignalColor(str, enum.Enum):
     """信号色"""
     red = "red"
@@ -84,6 +97,12 @@ class AbilityScoreBand(Base):
 class Post(Base):
     """投稿（やってみた）"""
     __tablename__ = "posts"
+    __table_args__ = (
+        # フィード（新しい順）のキーセットページング用
+        Index("idx_posts_deleted_at_created_at_id", "deleted_at", "created_at", "id"),
+        # 生徒ごとの最終投稿日時（介入フラグのスキャン）用
+        Index("idx_posts_user_id_deleted_at_created_at", "user_id", "deleted_at", "created_at"),
+    )
 
     id: Mapped[int] = mapped_column(PKType, primary_key=True, autoincrement=True)
     user_id: Mapped[int] = mapped_column(PKType, ForeignKey("users.id"), nullable=False)
@@ -97,7 +116,11 @@ class Post(Base):
         default=QuestionStateChangeType.none
     )
     phase_label: Mapped[str] = mapped_column(String(50), nullable=False)
+    # phase_label を書き込み時に正規化したコード（該当するフェーズがない場合はNone）
+    phase_code: Mapped[Optional[PhaseCode]] = mapped_column(Enum(PhaseCode), nullable=True)
     ai_raw_label: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True)
+    # いいね数（post_likesの件数を非正規化して保持。いいね/取り消し時に同一トランザクションで更新）
+    like_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
     created_at: Mapped[datetime] = mapped_column(TIMESTAMP, nullable=False)
     updated_at: Mapped[datetime] = mapped_column(TIMESTAMP, nullable=False)
     deleted_at: Mapped[Optional[datetime]] = mapped_column(TIMESTAMP, nullable=True)
@@ -119,3 +142,40 @@ class UserPeriodPostsCache(Base):
     last_aggregated_at: Mapped[datetime] = mapped_column(TIMESTAMP, nullable=False)
     created_at: Mapped[datetime] = mapped_column(TIMESTAMP, nullable=False)
     updated_at: Mapped[datetime] = mapped_column(TIMESTAMP, nullable=False)
+
+
+# 投稿本文の全文検索インデックス
+# MySQL: ngramパーサーのFULLTEXTインデックス（日本語対応、INSERT/UPDATEで自動的に同期）
+# SQLite: trigramトークナイザーのFTS5外部コンテンツテーブル（トリガーで同期）
+_POSTS_SEARCH_DDL = {
+    "mysql": [
+        "ALTER TABLE posts ADD FULLTEXT INDEX ft_posts_text "
+        "(problem, content_1, content_2, content_3) WITH PARSER ngram",
+    ],
+    "sqlite": [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5("
+        "problem, content_1, content_2, content_3, "
+        "content='posts', content_rowid='id', tokenize='trigram')",
+        "CREATE TRIGGER IF NOT EXISTS posts_fts_ai AFTER INSERT ON posts BEGIN "
+        "INSERT INTO posts_fts(rowid, problem, content_1, content_2, content_3) "
+        "VALUES (new.id, new.problem, new.content_1, new.content_2, new.content_3); END",
+        "CREATE TRIGGER IF NOT EXISTS posts_fts_ad AFTER DELETE ON posts BEGIN "
+        "INSERT INTO posts_fts(posts_fts, rowid, problem, content_1, content_2, content_3) "
+        "VALUES ('delete', old.id, old.problem, old.content_1, old.content_2, old.content_3); END",
+        "CREATE TRIGGER IF NOT EXISTS posts_fts_au AFTER UPDATE OF problem, content_1, content_2, content_3 "
+        "ON posts BEGIN "
+        "INSERT INTO posts_fts(posts_fts, rowid, problem, content_1, content_2, content_3) "
+        "VALUES ('delete', old.id, old.problem, old.content_1, old.content_2, old.content_3); "
+        "INSERT INTO posts_fts(rowid, problem, content_1, content_2, content_3) "
+        "VALUES (new.id, new.problem, new.content_1, new.content_2, new.content_3); END",
+    ],
+}
+
+for _dialect, _statements in _POSTS_SEARCH_DDL.items():
+    for _statement in _statements:
+        event.listen(Post.__table__, "after_create", DDL(_statement).execute_if(dialect=_dialect))
+event.listen(
+    Post.__table__,
+    "before_drop",
+    DDL("DROP TABLE IF EXISTS posts_fts").execute_if(dialect="sqlite"),
+)
@@ -1,23 +1,40 @@
 """投稿と非認知能力の関連モデル"""
+import enum
 from datetime import datetime
-from sqlalchemy import BigInteger, Column, ForeignKey, Index, Integer, TIMESTAMP, DECIMAL
+from sqlalchemy import BigInteger, Column, Enum, ForeignKey, Index, Integer, TIMESTAMP, DECIMAL, UniqueConstraint
 from sqlalchemy.orm import relationship
 
 from app.models.base import Base
 
 
+PKType = BigInteger().with_variant(Integer, "sqlite")
+
+
+class PostAbilityPointSource(str, enum.Enum):
+    """能力ポイントの由来"""
+    selected = "selected"  # 生徒が選んだ能力（既存の行・シードデータを含む）
+    analysis = "analysis"  # 投稿のAI判定から導いた能力
+
+
 class PostAbilityPoint(Base):
     """投稿と非認知能力の関連テーブル"""
     __tablename__ = "post_ability_points"
     __table_args__ = (
+        UniqueConstraint("post_id", "source", "action_index", "ability_id", name="uq_post_ability_points_source"),
         Index("idx_post_ability_points_post_id", "post_id"),
         Index("idx_post_ability_points_ability_id", "ability_id"),
         {"extend_existing": True},
     )
 
-    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    id = Column(PKType, primary_key=True, autoincrement=True)
     post_id = Column(BigInteger, ForeignKey("posts.id", ondelete="CASCADE"), nullable=False)
     ability_id = Column(BigInteger, ForeignKey("non_cog_abilities.id", ondelete="CASCADE"), nullable=False)
+    source = Column(
+        Enum(PostAbilityPointSource),
+        nullable=False,
+        default=PostAbilityPointSource.selected,
+        server_default=PostAbilityPointSource.selected.name,
+    )
     action_index = Column(Integer, nullable=False, default=0)
     quality_level = Column(Integer, nullable=False, default=1)
     point = Column(DECIMAL(5, 1), nullable=False, default=1.0)
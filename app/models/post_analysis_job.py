@@ -0,0 +1,50 @@
+"""投稿のAI判定ジョブモデル"""
+import enum
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import BigInteger, CHAR, Enum, ForeignKey, Index, Integer, Text, TIMESTAMP
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.models.base import Base
+
+
+# BigInteger for MySQL, Integer for SQLite
+PKType = BigInteger().with_variant(Integer, "sqlite")
+
+
+class PostAnalysisJobStatus(str, enum.Enum):
+    """判定ジョブの状態"""
+    pending = "pending"
+    running = "running"
+    done = "done"
+    failed = "failed"
+
+
+class PostAnalysisJob(Base):
+    """投稿のAI判定ジョブ（投稿ごとに1行）
+
+    投稿の作成・本文の更新と同じトランザクションで登録し、
+    app/services/post_analysis_service.py のワーカーが取り出して判定する。
+    ワーカーが停止した場合も、locked_at から一定時間経過した実行中のジョブは再実行される。
+    """
+    __tablename__ = "post_analysis_jobs"
+    __table_args__ = (
+        # 実行待ちのジョブの取り出し用
+        Index("idx_post_analysis_jobs_status_run_after", "status", "run_after"),
+    )
+
+    post_id: Mapped[int] = mapped_column(PKType, ForeignKey("posts.id", ondelete="CASCADE"), primary_key=True)
+    status: Mapped[PostAnalysisJobStatus] = mapped_column(Enum(PostAnalysisJobStatus), nullable=False)
+    # 判定の依頼のたびに増やす（実行中に本文が更新された場合、完了後にもう一度判定する）
+    version: Mapped[int] = mapped_column(Integer, nullable=False, default=1, server_default="1")
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    # 次に実行できる日時（再試行の待ち時間）
+    run_after: Mapped[datetime] = mapped_column(TIMESTAMP, nullable=False)
+    locked_at: Mapped[Optional[datetime]] = mapped_column(TIMESTAMP, nullable=True)
+    # 取り出しごとに発行するトークン（結果を記録するワーカーが、まだジョブを確保しているかの確認用）
+    # TIMESTAMP は秒未満を保存しないため、locked_at では取り出しを区別できない
+    claim_token: Mapped[Optional[str]] = mapped_column(CHAR(32), nullable=True)
+    last_error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(TIMESTAMP, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(TIMESTAMP, nullable=False)
@@ -0,0 +1,46 @@
+"""生徒の活動サマリーモデル（ダッシュボード集計用）"""
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import BigInteger, DECIMAL, Enum, ForeignKey, Integer, String, TIMESTAMP
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.models.base import Base
+from app.models.post import PhaseCode
+
+
+# BigInteger for MySQL, Integer for SQLite
+PKType = BigInteger().with_variant(Integer, "sqlite")
+
+
+class StudentActivitySummary(Base):
+    """ユーザーごとの投稿・感謝の手紙の集計
+
+    投稿・感謝の手紙の書き込みと同じトランザクションで更新する。
+    scripts/rebuild_student_summaries.py で元データから再計算できる。
+    """
+    __tablename__ = "student_activity_summary"
+
+    user_id: Mapped[int] = mapped_column(PKType, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    post_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    last_posted_at: Mapped[Optional[datetime]] = mapped_column(TIMESTAMP, nullable=True)
+    # 最新の投稿の表示用フェーズ名（正規化済み）
+    latest_phase: Mapped[Optional[str]] = mapped_column(String(50), nullable=True)
+    # 最新の投稿のフェーズのコード（該当するフェーズがない場合はNone。集計・絞り込みはこちらで行う）
+    latest_phase_code: Mapped[Optional[PhaseCode]] = mapped_column(Enum(PhaseCode), nullable=True)
+    question_change_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    letters_sent_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    letters_received_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    updated_at: Mapped[datetime] = mapped_column(TIMESTAMP, nullable=False)
+
+
+class StudentAbilitySummary(Base):
+    """ユーザー・非認知能力ごとの能力ポイント合計"""
+    __tablename__ = "student_ability_summary"
+
+    user_id: Mapped[int] = mapped_column(PKType, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    ability_id: Mapped[int] = mapped_column(PKType, ForeignKey("non_cog_abilities.id", ondelete="CASCADE"), primary_key=True)
+    # 投稿の能力ポイント合計
+    post_points: Mapped[float] = mapped_column(DECIMAL(10, 1), nullable=False, default=0, server_default="0")
+    # 受け取った感謝の手紙の能力ポイント合計
+    letter_points: Mapped[float] = mapped_column(DECIMAL(10, 1), nullable=False, default=0, server_default="0")
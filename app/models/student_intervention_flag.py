@@ -0,0 +1,30 @@
+"""介入フラグモデル"""
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import BigInteger, ForeignKey, Index, Integer, TIMESTAMP
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.models.base import Base
+
+
+# BigInteger for MySQL, Integer for SQLite
+PKType = BigInteger().with_variant(Integer, "sqlite")
+
+
+class StudentInterventionFlag(Base):
+    """介入が必要な生徒（一定期間投稿がない生徒）
+
+    app/services/intervention_scanner_service.py が定期的に全生徒を走査して更新する。
+    フラグが外れた生徒の行は削除する。
+    """
+    __tablename__ = "student_intervention_flags"
+    __table_args__ = (
+        Index("idx_flagged_since", "flagged_since", "user_id"),
+    )
+
+    user_id: Mapped[int] = mapped_column(PKType, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    # 介入が必要になった日時（最終投稿、または投稿がない場合は登録から閾値の日数が経過した日時）
+    flagged_since: Mapped[datetime] = mapped_column(TIMESTAMP, nullable=False)
+    last_posted_at: Mapped[Optional[datetime]] = mapped_column(TIMESTAMP, nullable=True)
+    scanned_at: Mapped[datetime] = mapped_column(TIMESTAMP, nullable=False)
@@ -1,10 +1,13 @@
 """感謝の手紙と非認知能力の関連モデル"""
-from sqlalchemy import BigInteger, Column, ForeignKey, Index, DECIMAL
+from sqlalchemy import BigInteger, Column, ForeignKey, Index, Integer, DECIMAL
 from sqlalchemy.orm import relationship
 
 from app.models.base import Base
 
 
+PKType = BigInteger().with_variant(Integer, "sqlite")
+
+
 class ThanksLetterAbilityPoint(Base):
     """感謝の手紙と非認知能力の関連テーブル"""
     __tablename__ = "thanks_letter_ability_points"
@@ -14,7 +17,7 @@ class ThanksLetterAbilityPoint(Base):
         {"extend_existing": True},
     )
 
-    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    id = Column(PKType, primary_key=True, autoincrement=True)
     thanks_letter_id = Column(BigInteger, ForeignKey("thanks_letters.id", ondelete="CASCADE"), nullable=False)
     ability_id = Column(BigInteger, ForeignKey("non_cog_abilities.id", ondelete="CASCADE"), nullable=False)
     points = Column(DECIMAL(5, 1), nullable=False, default=1.5, server_default="1.5")
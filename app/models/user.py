@@ -10,6 +10,7 @@ from sqlalchemy import (
     DateTime,
     Enum,
     ForeignKey,
+    Index,
     Integer,
     String,
     Text,
@@ -43,6 +44,10 @@ class AuthTypeEnum(str, enum.Enum):
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        # ダッシュボードの生徒一覧（在籍中の生徒を学年・クラスで絞り込む）
+        Index("idx_users_role_active_grade_class", "role", "is_active", "is_deleted", "grade", "class_name"),
+    )
     id: Mapped[int] = mapped_column(PKType, primary_key=True, autoincrement=True)
     school_person_id: Mapped[str | None] = mapped_column(CHAR(6), unique=True)
     role: Mapped[RoleEnum] = mapped_column(Enum(RoleEnum), nullable=False)
@@ -0,0 +1,126 @@
+from datetime import datetime
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.post_ability_point import PostAbilityPoint, PostAbilityPointSource
+from app.models.thanks_letter_ability_point import ThanksLetterAbilityPoint
+
+
+async def add_post_ability_points(db: AsyncSession, post_id: int, ability_ids: list[int]) -> None:
+    """投稿の能力ポイントを複数行INSERT 1文で追加する（コミットは呼び出し側）"""
+    if not ability_ids:
+        return
+
+    now = datetime.utcnow()
+    rows = [
+        {
+            "post_id": post_id,
+            "ability_id": ability_id,
+            "action_index": 0,
+            "quality_level": 1,
+            "point": 1.0,
+            "created_at": now,
+        }
+        for ability_id in ability_ids
+    ]
+    await db.execute(insert(PostAbilityPoint).values(rows))
+
+
+async def sync_post_ability_points(db: AsyncSession, post_id: int, ability_ids: list[int]) -> bool:
+    """投稿の能力を指定のIDに揃える（コミットは呼び出し側）
+
+    現在の能力との差分のみ、外れた能力をDELETE 1文、増えた能力をINSERT 1文で反映する。
+    変更がない場合は書き込まず、Falseを返す。AI判定から導いた能力（source=analysis）は変更しない。
+    """
+    selected = PostAbilityPoint.source == PostAbilityPointSource.selected
+    result = await db.execute(
+        select(PostAbilityPoint.ability_id).where(PostAbilityPoint.post_id == post_id, selected)
+    )
+    current_ids = set(result.scalars().all())
+    removed_ids = current_ids - set(ability_ids)
+    added_ids = [ability_id for ability_id in dict.fromkeys(ability_ids) if ability_id not in current_ids]
+
+    if removed_ids:
+        await db.execute(
+            delete(PostAbilityPoint).where(
+                PostAbilityPoint.post_id == post_id,
+                PostAbilityPoint.ability_id.in_(removed_ids),
+                selected,
+            )
+        )
+    await add_post_ability_points(db, post_id, added_ids)
+    return bool(removed_ids or added_ids)
+
+
+async def replace_analysis_ability_points(
+    db: AsyncSession, post_id: int, abilities: list[tuple[int, int, float]]
+) -> dict[int, float]:
+    """AI判定から導いた投稿の能力ポイントを置き換える（コミットは呼び出し側）
+
+    abilities は (ability_id, レベル, ポイント) のリスト。以前の判定の行（source=analysis）をDELETE 1文で消し、
+    INSERT 1文で追加する。生徒が選んだ能力の行は action_index に関わらず変更しない。
+    能力ごとのポイントの増減（サマリーへの差分反映用）を返す。
+    """
+    analysis = (PostAbilityPoint.post_id == post_id, PostAbilityPoint.source == PostAbilityPointSource.analysis)
+    result = await db.execute(select(PostAbilityPoint.ability_id, PostAbilityPoint.point).where(*analysis))
+    changes: dict[int, float] = {}
+    for ability_id, point in result.all():
+        changes[ability_id] = changes.get(ability_id, 0.0) - float(point)
+    for ability_id, _, point in abilities:
+        changes[ability_id] = changes.get(ability_id, 0.0) + point
+
+    await db.execute(delete(PostAbilityPoint).where(*analysis))
+    if abilities:
+        now = datetime.utcnow()
+        rows = [
+            {
+                "post_id": post_id,
+                "ability_id": ability_id,
+                "source": PostAbilityPointSource.analysis,
+                "action_index": 0,
+                "quality_level": level,
+                "point": point,
+                "created_at": now,
+            }
+            for ability_id, level, point in abilities
+        ]
+        await db.execute(insert(PostAbilityPoint).values(rows))
+    return {ability_id: change for ability_id, change in changes.items() if change}
+
+
+async def add_thanks_letter_ability_points(db: AsyncSession, thanks_letter_id: int, ability_ids: list[int]) -> None:
+    """感謝の手紙の能力ポイントを複数行INSERT 1文で追加する（コミットは呼び出し側）"""
+    if not ability_ids:
+        return
+
+    rows = [
+        {"thanks_letter_id": thanks_letter_id, "ability_id": ability_id, "points": 1}
+        for ability_id in ability_ids
+    ]
+    await db.execute(insert(ThanksLetterAbilityPoint).values(rows))
+
+
+async def sync_thanks_letter_ability_points(db: AsyncSession, thanks_letter_id: int, ability_ids: list[int]) -> bool:
+    """感謝の手紙の能力を指定のIDに揃える（コミットは呼び出し側）
+
+    sync_post_ability_points と同様に差分のみ書き込み、変更がない場合はFalseを返す。
+    """
+    result = await db.execute(
+        select(ThanksLetterAbilityPoint.ability_id).where(
+            ThanksLetterAbilityPoint.thanks_letter_id == thanks_letter_id
+        )
+    )
+    current_ids = set(result.scalars().all())
+    removed_ids = current_ids - set(ability_ids)
+    added_ids = [ability_id for ability_id in dict.fromkeys(ability_ids) if ability_id not in current_ids]
+
+    if removed_ids:
+        await db.execute(
+            delete(ThanksLetterAbilityPoint).where(
+                ThanksLetterAbilityPoint.thanks_letter_id == thanks_letter_id,
+                ThanksLetterAbilityPoint.ability_id.in_(removed_ids),
+            )
+        )
+    await add_thanks_letter_ability_points(db, thanks_letter_id, added_ids)
+    return bool(removed_ids or added_ids)
@@ -0,0 +1,55 @@
+from datetime import datetime
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.database import upsert
+from app.models.ability_analysis_cache import AbilityAnalysisCache
+
+
+async def get_analysis(db: AsyncSession, cache_key: str, *, now: datetime) -> dict | None:
+    """期限内の判定結果を取得（ない場合はNone）"""
+    stmt = select(AbilityAnalysisCache.result).where(
+        AbilityAnalysisCache.cache_key == cache_key,
+        AbilityAnalysisCache.expires_at > now,
+    )
+    return (await db.execute(stmt)).scalar_one_or_none()
+
+
+async def save_analysis(
+    db: AsyncSession,
+    *,
+    cache_key: str,
+    model: str,
+    prompt_version: str,
+    result: dict,
+    now: datetime,
+    expires_at: datetime,
+) -> None:
+    """判定結果を保存する（同じキーがある場合は置き換える、コミットは呼び出し側）"""
+    await db.execute(upsert(
+        db,
+        AbilityAnalysisCache,
+        {
+            "cache_key": cache_key,
+            "model": model,
+            "prompt_version": prompt_version,
+            "result": result,
+            "created_at": now,
+            "expires_at": expires_at,
+        },
+        key_columns=["cache_key"],
+        update=lambda new: {
+            "result": new.result,
+            "created_at": new.created_at,
+            "expires_at": new.expires_at,
+        },
+    ))
+
+
+async def delete_expired_analyses(db: AsyncSession, *, now: datetime) -> int:
+    """期限切れの判定結果を削除し、削除した行数を返す（コミットは呼び出し側）"""
+    result = await db.execute(
+        delete(AbilityAnalysisCache).where(AbilityAnalysisCache.expires_at <= now)
+    )
+    return result.rowcount
@@ -0,0 +1,316 @@
+from datetime import datetime
+
+from sqlalchemy import Select, and_, case, func, literal, or_, select, true
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.post import PhaseCode, Post
+from app.models.student_activity_summary import StudentAbilitySummary, StudentActivitySummary
+from app.models.thanks_letter import ThanksLetter
+from app.models.thanks_letter_ability_point import ThanksLetterAbilityPoint
+from app.models.user import RoleEnum, User
+
+
+# 最終投稿日時で並べる際、未投稿の生徒を最も古い扱いにするための値
+_NEVER_POSTED = datetime(1970, 1, 1)
+
+def _sort_expression(sort: str, ability_summary=None):
+    # 活動のない生徒はサマリーの行がないため、外部結合のNULLを0（最終投稿日時は最も古い値）として並べる。
+    # 絞り込み（学年・クラス・在籍）は users 側の条件のため、並べ替えの前に対象の生徒を絞り込む
+    # idx_users_role_active_grade_class を使い、並べ替えは絞り込んだクラス・学年の行だけで行う
+    summary = StudentActivitySummary
+    if sort == "full_name":
+        return User.full_name
+    if sort == "last_posted_at":
+        return func.coalesce(summary.last_posted_at, literal(_NEVER_POSTED, summary.last_posted_at.type))
+    if sort == "ability":
+        return func.coalesce(ability_summary.post_points + ability_summary.letter_points, 0)
+    column = {
+        "post_count": summary.post_count,
+        "question_change_count": summary.question_change_count,
+        "received_letters_count": summary.letters_received_count,
+        "sent_letters_count": summary.letters_sent_count,
+    }[sort]
+    return func.coalesce(column, 0)
+
+
+def active_student_summaries_query(
+    *,
+    grade: int | None = None,
+    class_name: str | None = None,
+    phases: list[PhaseCode | str | None] | None = None,
+    intervention_threshold: datetime | None = None,
+    intervention_flag: bool | None = None,
+    sort: str = "full_name",
+    sort_ability_id: int | None = None,
+    descending: bool = False,
+    after: tuple | None = None,
+    limit: int | None = None,
+) -> Select:
+    """在籍中の生徒と活動サマリーを取得する文（活動のない生徒のサマリーはNone）
+
+    各行は (User, StudentActivitySummary, sort_value)。
+    - phases: 最新フェーズのコードで絞り込む。Noneを含めると未投稿の生徒も含む。
+      コードに正規化できないフェーズ名（str）は、コードのない生徒の表示名と比べる
+    - intervention_flag: 最終投稿が intervention_threshold より前（または未投稿）かで絞り込む
+    - sort / descending: 並び順（同値はユーザーIDで並べる）。sort="ability" の場合は sort_ability_id の能力スコア順
+    - after: 前ページ最後の (sort_value, user_id)。これより後の行を limit 件返す
+    """
+    summary = StudentActivitySummary
+    ability_summary = None
+
+    stmt = (
+        select(User, summary)
+        .outerjoin(summary, summary.user_id == User.id)
+        .where(
+            # idx_users_role_active_grade_class を使えるよう、条件は直接指定する
+            User.role == RoleEnum.student,
+            User.is_active == True,
+            User.is_deleted == False,
+        )
+    )
+    if grade is not None:
+        stmt = stmt.where(User.grade == grade)
+    if class_name is not None:
+        stmt = stmt.where(User.class_name == class_name)
+
+    if phases is not None:
+        codes = [phase for phase in phases if isinstance(phase, PhaseCode)]
+        labels = [phase for phase in phases if phase is not None and not isinstance(phase, PhaseCode)]
+        conditions = [summary.latest_phase_code.in_(codes)] if codes else []
+        if labels:
+            conditions.append(and_(summary.latest_phase_code.is_(None), summary.latest_phase.in_(labels)))
+        if None in phases:
+            conditions.append(summary.latest_phase.is_(None))
+        stmt = stmt.where(or_(*conditions) if conditions else False)
+
+    if intervention_flag is not None:
+        needs_intervention = or_(
+            summary.last_posted_at.is_(None),
+            summary.last_posted_at < intervention_threshold,
+        )
+        stmt = stmt.where(needs_intervention if intervention_flag else ~needs_intervention)
+
+    if sort == "ability":
+        ability_summary = StudentAbilitySummary
+        stmt = stmt.outerjoin(
+            ability_summary,
+            and_(ability_summary.user_id == User.id, ability_summary.ability_id == sort_ability_id),
+        )
+    sort_value = _sort_expression(sort, ability_summary)
+    stmt = stmt.add_columns(sort_value.label("sort_value"))
+
+    if after is not None:
+        after_value, after_id = after
+        if descending:
+            stmt = stmt.where(or_(sort_value < after_value, and_(sort_value == after_value, User.id < after_id)))
+        else:
+            stmt = stmt.where(or_(sort_value > after_value, and_(sort_value == after_value, User.id > after_id)))
+
+    if descending:
+        stmt = stmt.order_by(sort_value.desc(), User.id.desc())
+    else:
+        stmt = stmt.order_by(sort_value, User.id)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return stmt
+
+
+async def list_active_student_summaries(db: AsyncSession, **options) -> list:
+    """在籍中の生徒と活動サマリーを1文で取得（options は active_student_summaries_query と同じ）"""
+    return (await db.execute(active_student_summaries_query(**options))).all()
+
+
+async def get_ability_scores_by_student(db: AsyncSession, user_ids: list[int]) -> dict[int, dict[int, float]]:
+    """指定した生徒ごとの能力スコア（投稿 + 受け取った手紙の能力ポイント）"""
+    if not user_ids:
+        return {}
+    stmt = select(
+        StudentAbilitySummary.user_id,
+        StudentAbilitySummary.ability_id,
+        StudentAbilitySummary.post_points + StudentAbilitySummary.letter_points,
+    ).where(StudentAbilitySummary.user_id.in_(user_ids))
+
+    scores: dict[int, dict[int, float]] = {}
+    for user_id, ability_id, score in (await db.execute(stmt)).all():
+        scores.setdefault(user_id, {})[ability_id] = float(score or 0)
+    return scores
+
+
+async def get_active_student_ability_totals(db: AsyncSession, *, grade: int | None = None) -> list:
+    """在籍中の全生徒の (user_id, grade, class_name, ability_id, score) を1文で取得
+
+    能力サマリーのない生徒は ability_id / score がNoneの1行になる。
+    """
+    ability_summary = StudentAbilitySummary
+    stmt = (
+        select(
+            User.id.label("user_id"),
+            User.grade,
+            User.class_name,
+            ability_summary.ability_id,
+            (ability_summary.post_points + ability_summary.letter_points).label("score"),
+        )
+        .outerjoin(ability_summary, ability_summary.user_id == User.id)
+        .where(
+            User.role == RoleEnum.student,
+            User.is_active == True,
+            User.is_deleted == False,
+        )
+    )
+    if grade is not None:
+        stmt = stmt.where(User.grade == grade)
+    return (await db.execute(stmt)).all()
+
+
+async def get_class_activity_counts(
+    db: AsyncSession,
+    *,
+    active_since: datetime,
+    intervention_threshold: datetime,
+    grade: int | None = None,
+) -> list:
+    """学年・クラスごとの在籍生徒数・活動中の生徒数・介入対象の生徒数を1文で集計"""
+    summary = StudentActivitySummary
+    stmt = (
+        select(
+            User.grade,
+            User.class_name,
+            func.count(User.id).label("student_count"),
+            func.sum(case((summary.last_posted_at >= active_since, 1), else_=0)).label("active_count"),
+            func.sum(case(
+                (or_(summary.last_posted_at.is_(None), summary.last_posted_at < intervention_threshold), 1),
+                else_=0,
+            )).label("intervention_count"),
+        )
+        .outerjoin(summary, summary.user_id == User.id)
+        .where(
+            User.role == RoleEnum.student,
+            User.is_active == True,
+            User.is_deleted == False,
+        )
+        .group_by(User.grade, User.class_name)
+        .order_by(User.grade, User.class_name)
+    )
+    if grade is not None:
+        stmt = stmt.where(User.grade == grade)
+    return (await db.execute(stmt)).all()
+
+
+async def get_class_phase_counts(db: AsyncSession, *, grade: int | None = None) -> list:
+    """学年・クラス・最新フェーズごとの生徒数を1文で集計
+
+    各行は (grade, class_name, フェーズのコード, コードのないフェーズ名, 生徒数)。
+    未投稿の生徒はコード・フェーズ名ともにNone。
+    """
+    summary = StudentActivitySummary
+    uncoded_phase = case((summary.latest_phase_code.is_(None), summary.latest_phase))
+    stmt = (
+        select(User.grade, User.class_name, summary.latest_phase_code, uncoded_phase, func.count(User.id))
+        .outerjoin(summary, summary.user_id == User.id)
+        .where(
+            User.role == RoleEnum.student,
+            User.is_active == True,
+            User.is_deleted == False,
+        )
+        .group_by(User.grade, User.class_name, summary.latest_phase_code, uncoded_phase)
+    )
+    if grade is not None:
+        stmt = stmt.where(User.grade == grade)
+    return (await db.execute(stmt)).all()
+
+
+def _student_query(*columns) -> Select:
+    """削除されていない生徒1人と活動サマリー（ない場合はNone）の結合"""
+    summary = StudentActivitySummary
+    return (
+        select(*columns)
+        .outerjoin(summary, summary.user_id == User.id)
+        .where(User.role == RoleEnum.student, User.is_deleted == False)
+    )
+
+
+async def get_student_data_version(db: AsyncSession, user_id: int) -> tuple | None:
+    """生徒別キャッシュのキーに含めるデータのバージョンを1文で取得（生徒でない場合はNone）
+
+    活動サマリーの更新日時と、投稿の件数・最終更新日時・いいね数の合計を返す。
+    本文のみの編集やいいねは活動サマリーを更新しないため、投稿側の値も含める。
+    """
+    posts = (
+        select(
+            func.count().label("post_count"),
+            func.max(Post.updated_at).label("posts_updated_at"),
+            func.coalesce(func.sum(Post.like_count), 0).label("like_count"),
+        )
+        .where(Post.user_id == user_id, Post.deleted_at.is_(None))
+        .subquery()
+    )
+    stmt = (
+        _student_query(
+            User.id, StudentActivitySummary.updated_at, posts.c.post_count, posts.c.posts_updated_at, posts.c.like_count
+        )
+        .join(posts, true())
+        .where(User.id == user_id)
+    )
+    row = (await db.execute(stmt)).first()
+    return None if row is None else tuple(row[1:])
+
+
+async def get_student_with_summary(db: AsyncSession, user_id: int):
+    """生徒と活動サマリーの行 (User, StudentActivitySummary) を1文で取得（生徒でない場合はNone）"""
+    stmt = _student_query(User, StudentActivitySummary).where(User.id == user_id)
+    return (await db.execute(stmt)).first()
+
+
+async def get_recent_posts(db: AsyncSession, user_id: int, *, limit: int) -> list[Post]:
+    """生徒の最近の投稿（削除済みを除く、新しい順）"""
+    stmt = (
+        select(Post)
+        .where(Post.user_id == user_id, Post.deleted_at.is_(None))
+        .order_by(Post.created_at.desc(), Post.id.desc())
+        .limit(limit)
+    )
+    return list((await db.execute(stmt)).scalars().all())
+
+
+async def get_received_letters(db: AsyncSession, user_id: int, *, limit: int) -> list:
+    """生徒が受け取った感謝の手紙と送信者名の行 (ThanksLetter, sender_name)（新しい順）"""
+    stmt = (
+        select(ThanksLetter, User.full_name.label("sender_name"))
+        .join(User, User.id == ThanksLetter.sender_user_id)
+        .where(ThanksLetter.receiver_user_id == user_id)
+        .order_by(ThanksLetter.created_at.desc(), ThanksLetter.id.desc())
+        .limit(limit)
+    )
+    return (await db.execute(stmt)).all()
+
+
+async def get_letter_ability_points(db: AsyncSession, letter_ids: list[int]) -> dict[int, dict[int, float]]:
+    """手紙ごと・能力ごとのポイント合計をIN 1文で取得"""
+    if not letter_ids:
+        return {}
+    point = ThanksLetterAbilityPoint
+    stmt = (
+        select(point.thanks_letter_id, point.ability_id, func.sum(point.points))
+        .where(point.thanks_letter_id.in_(letter_ids))
+        .group_by(point.thanks_letter_id, point.ability_id)
+    )
+    points: dict[int, dict[int, float]] = {}
+    for letter_id, ability_id, total in (await db.execute(stmt)).all():
+        points.setdefault(letter_id, {})[ability_id] = float(total or 0)
+    return points
+
+
+async def get_phase_timeline(db: AsyncSession, user_id: int) -> list:
+    """生徒の投稿を (phase_code, phase_label) ごとに集計（件数・最初と最後の投稿日時）"""
+    stmt = (
+        select(
+            Post.phase_code,
+            Post.phase_label,
+            func.count(Post.id).label("post_count"),
+            func.min(Post.created_at).label("first_posted_at"),
+            func.max(Post.created_at).label("last_posted_at"),
+        )
+        .where(Post.user_id == user_id, Post.deleted_at.is_(None))
+        .group_by(Post.phase_code, Post.phase_label)
+    )
+    return (await db.execute(stmt)).all()
@@ -0,0 +1,134 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, delete, exists, func, or_, select, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from app.core.database import upsert
+from app.models.post import Post
+from app.models.student_activity_summary import StudentActivitySummary
+from app.models.student_intervention_flag import StudentInterventionFlag
+from app.models.user import RoleEnum, User
+
+
+# 1文あたりの最大行数
+_UPSERT_BATCH_SIZE = 1000
+
+# 定期スキャンを担当するプロセスが保持するMySQLの名前付きロック
+_SCAN_LOCK_NAME = "student_intervention_scan"
+
+
+async def scan_intervention_flags(db: AsyncSession, *, threshold_days: int, now: datetime) -> dict:
+    """全生徒の介入フラグを再計算する（コミットは呼び出し側）
+
+    在籍中の生徒ごとの最終投稿日時を1文のGROUP BYで取得し（idx_posts_user_id_deleted_at_created_at を使う）、
+    閾値より前（または未投稿）の生徒をフラグ付きにする。既にフラグ付きの生徒の flagged_since は変えない。
+    フラグの条件を満たさなくなった生徒（閾値以降に投稿した・在籍しなくなった生徒）のフラグは削除する。
+    """
+    threshold = timedelta(days=threshold_days)
+    last_posted_at = func.max(Post.created_at)
+    stmt = (
+        select(User.id, User.created_at, last_posted_at)
+        .outerjoin(Post, and_(Post.user_id == User.id, Post.deleted_at.is_(None)))
+        .where(
+            User.role == RoleEnum.student,
+            User.is_active == True,
+            User.is_deleted == False,
+        )
+        .group_by(User.id, User.created_at)
+        .having(or_(last_posted_at.is_(None), last_posted_at < now - threshold))
+    )
+    rows = [
+        {
+            "user_id": user_id,
+            "flagged_since": min((last_posted or created_at) + threshold, now),
+            "last_posted_at": last_posted,
+            "scanned_at": now,
+        }
+        for user_id, created_at, last_posted in (await db.execute(stmt)).all()
+    ]
+
+    flag = StudentInterventionFlag.__table__.c
+    for i in range(0, len(rows), _UPSERT_BATCH_SIZE):
+        await db.execute(upsert(
+            db,
+            StudentInterventionFlag,
+            rows[i:i + _UPSERT_BATCH_SIZE],
+            key_columns=["user_id"],
+            update=lambda new: {"last_posted_at": new.last_posted_at, "scanned_at": new.scanned_at},
+        ))
+    # scanned_at との比較では、秒未満を保存しない TIMESTAMP 列で今回書き込んだフラグまで消えるため、条件で判定する
+    enrolled = exists().where(
+        User.id == flag.user_id,
+        User.role == RoleEnum.student,
+        User.is_active == True,
+        User.is_deleted == False,
+    )
+    posted = exists().where(
+        Post.user_id == flag.user_id,
+        Post.deleted_at.is_(None),
+        Post.created_at >= now - threshold,
+    )
+    cleared = await db.execute(
+        delete(StudentInterventionFlag).where(or_(~enrolled, posted))
+    )
+    return {"flagged": len(rows), "cleared": cleared.rowcount}
+
+
+async def acquire_scan_lock(conn: AsyncConnection) -> bool:
+    """定期スキャンの担当を表す名前付きロックを、この接続で取得・保持しているか確認する
+
+    MySQLの GET_LOCK は接続単位のため、接続を閉じる（プロセスが停止する）まで保持される。
+    既に保持している場合はTrue、他の接続が保持している場合は待たずにFalseを返す。
+    SQLite（単一プロセス）では常にTrue。
+    """
+    if conn.dialect.name != "mysql":
+        return True
+    params = {"name": _SCAN_LOCK_NAME}
+    held = (await conn.execute(text("SELECT IS_USED_LOCK(:name) = CONNECTION_ID()"), params)).scalar()
+    if not held:
+        held = (await conn.execute(text("SELECT GET_LOCK(:name, 0)"), params)).scalar() == 1
+    await conn.commit()
+    return bool(held)
+
+
+async def list_flagged_students(
+    db: AsyncSession,
+    *,
+    posted_since: datetime,
+    grade: int | None = None,
+    class_name: str | None = None,
+    after: tuple | None = None,
+    limit: int | None = None,
+) -> list:
+    """介入フラグ付きの在籍中の生徒を、フラグが付いた順に取得
+
+    各行は (User, StudentInterventionFlag)。スキャン後に posted_since 以降の投稿があった生徒
+    （活動サマリーで判定）は除く。after は前ページ最後の (flagged_since, user_id)。
+    """
+    flag = StudentInterventionFlag
+    summary = StudentActivitySummary
+    stmt = (
+        select(User, flag)
+        .join(flag, flag.user_id == User.id)
+        .outerjoin(summary, summary.user_id == User.id)
+        .where(
+            User.role == RoleEnum.student,
+            User.is_active == True,
+            User.is_deleted == False,
+            or_(summary.last_posted_at.is_(None), summary.last_posted_at < posted_since),
+        )
+    )
+    if grade is not None:
+        stmt = stmt.where(User.grade == grade)
+    if class_name is not None:
+        stmt = stmt.where(User.class_name == class_name)
+    if after is not None:
+        after_value, after_id = after
+        stmt = stmt.where(or_(
+            flag.flagged_since > after_value,
+            and_(flag.flagged_since == after_value, flag.user_id > after_id),
+        ))
+    stmt = stmt.order_by(flag.flagged_since, flag.user_id)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return (await db.execute(stmt)).all()
@@ -0,0 +1,144 @@
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.non_cog_ability import NonCogAbility
+from app.models.period_ability_snapshot import PeriodAbilitySnapshot
+from app.models.post import EvaluationPeriod, Post
+from app.models.post_ability_point import PostAbilityPoint
+from app.models.student_activity_summary import StudentAbilitySummary, StudentActivitySummary
+from app.models.thanks_letter import ThanksLetter
+from app.models.thanks_letter_ability_point import ThanksLetterAbilityPoint
+from app.models.user import RoleEnum, User
+
+
+# スナップショット作成時の1文あたりの最大行数
+_INSERT_BATCH_SIZE = 1000
+
+
+def period_cutoff(period: EvaluationPeriod) -> datetime:
+    """評価期間の集計の締め日時（終了日の翌日0時）"""
+    return datetime.combine(period.end_date, time.min) + timedelta(days=1)
+
+
+async def get_period(db: AsyncSession, period_id: int) -> EvaluationPeriod | None:
+    return await db.get(EvaluationPeriod, period_id)
+
+
+async def list_closed_periods_without_snapshot(db: AsyncSession, today: date) -> list[EvaluationPeriod]:
+    """終了済みで、まだスナップショットのない評価期間（終了日順）"""
+    has_snapshot = select(PeriodAbilitySnapshot.period_id).where(
+        PeriodAbilitySnapshot.period_id == EvaluationPeriod.id
+    )
+    stmt = (
+        select(EvaluationPeriod)
+        .where(EvaluationPeriod.end_date < today, ~has_snapshot.exists())
+        .order_by(EvaluationPeriod.end_date, EvaluationPeriod.id)
+    )
+    return list((await db.execute(stmt)).scalars().all())
+
+
+async def has_snapshot(db: AsyncSession, period_id: int) -> bool:
+    stmt = select(PeriodAbilitySnapshot.period_id).where(PeriodAbilitySnapshot.period_id == period_id).limit(1)
+    return (await db.execute(stmt)).first() is not None
+
+
+async def create_period_snapshot(db: AsyncSession, period: EvaluationPeriod) -> int:
+    """評価期間の終了時点の累計を元データから集計し、スナップショットを作り直す（コミットは呼び出し側）
+
+    対象は在籍中の全生徒 × 全能力。作成した行数を返す。
+    """
+    cutoff = period_cutoff(period)
+    students = select(User.id).where(
+        User.role == RoleEnum.student,
+        User.is_active == True,
+        User.is_deleted == False,
+    )
+    student_ids = list((await db.execute(students)).scalars().all())
+    ability_ids = list((await db.execute(select(NonCogAbility.id).order_by(NonCogAbility.id))).scalars().all())
+
+    post_count_stmt = (
+        select(Post.user_id, func.count(Post.id))
+        .where(Post.deleted_at.is_(None), Post.created_at < cutoff, Post.user_id.in_(students))
+        .group_by(Post.user_id)
+    )
+    post_counts = dict((await db.execute(post_count_stmt)).all())
+
+    post_points_stmt = (
+        select(Post.user_id, PostAbilityPoint.ability_id, func.sum(PostAbilityPoint.point))
+        .join(Post, PostAbilityPoint.post_id == Post.id)
+        .where(Post.deleted_at.is_(None), Post.created_at < cutoff, Post.user_id.in_(students))
+        .group_by(Post.user_id, PostAbilityPoint.ability_id)
+    )
+    letter_points_stmt = (
+        select(ThanksLetter.receiver_user_id, ThanksLetterAbilityPoint.ability_id, func.sum(ThanksLetterAbilityPoint.points))
+        .join(ThanksLetter, ThanksLetterAbilityPoint.thanks_letter_id == ThanksLetter.id)
+        .where(ThanksLetter.created_at < cutoff, ThanksLetter.receiver_user_id.in_(students))
+        .group_by(ThanksLetter.receiver_user_id, ThanksLetterAbilityPoint.ability_id)
+    )
+    post_points = {(user_id, ability_id): total for user_id, ability_id, total in (await db.execute(post_points_stmt)).all()}
+    letter_points = {(user_id, ability_id): total for user_id, ability_id, total in (await db.execute(letter_points_stmt)).all()}
+
+    now = datetime.utcnow()
+    rows = [
+        {
+            "period_id": period.id,
+            "user_id": user_id,
+            "ability_id": ability_id,
+            "post_points": post_points.get((user_id, ability_id)) or 0,
+            "letter_points": letter_points.get((user_id, ability_id)) or 0,
+            "post_count": post_counts.get(user_id, 0),
+            "created_at": now,
+        }
+        for user_id in student_ids
+        for ability_id in ability_ids
+    ]
+
+    await db.execute(delete(PeriodAbilitySnapshot).where(PeriodAbilitySnapshot.period_id == period.id))
+    for i in range(0, len(rows), _INSERT_BATCH_SIZE):
+        await db.execute(insert(PeriodAbilitySnapshot).values(rows[i:i + _INSERT_BATCH_SIZE]))
+    return len(rows)
+
+
+async def get_snapshot_totals(
+    db: AsyncSession, period_id: int, user_ids: list[int]
+) -> dict[int, dict]:
+    """スナップショットの生徒ごとの投稿数・能力ごとのポイント（投稿 + 受け取った手紙）"""
+    if not user_ids:
+        return {}
+    stmt = select(
+        PeriodAbilitySnapshot.user_id,
+        PeriodAbilitySnapshot.ability_id,
+        PeriodAbilitySnapshot.post_points + PeriodAbilitySnapshot.letter_points,
+        PeriodAbilitySnapshot.post_count,
+    ).where(PeriodAbilitySnapshot.period_id == period_id, PeriodAbilitySnapshot.user_id.in_(user_ids))
+
+    totals: dict[int, dict] = {}
+    for user_id, ability_id, points, post_count in (await db.execute(stmt)).all():
+        user_totals = totals.setdefault(user_id, {"post_count": post_count, "abilities": {}})
+        user_totals["abilities"][ability_id] = float(points or 0)
+    return totals
+
+
+async def get_live_totals(db: AsyncSession, user_ids: list[int]) -> dict[int, dict]:
+    """現在の累計（書き込み時に差分更新している活動サマリーから取得）"""
+    if not user_ids:
+        return {}
+    stmt = (
+        select(
+            StudentActivitySummary.user_id,
+            StudentActivitySummary.post_count,
+            StudentAbilitySummary.ability_id,
+            StudentAbilitySummary.post_points + StudentAbilitySummary.letter_points,
+        )
+        .outerjoin(StudentAbilitySummary, StudentAbilitySummary.user_id == StudentActivitySummary.user_id)
+        .where(StudentActivitySummary.user_id.in_(user_ids))
+    )
+
+    totals: dict[int, dict] = {}
+    for user_id, post_count, ability_id, points in (await db.execute(stmt)).all():
+        user_totals = totals.setdefault(user_id, {"post_count": post_count, "abilities": {}})
+        if ability_id is not None:
+            user_totals["abilities"][ability_id] = float(points or 0)
+    return totals
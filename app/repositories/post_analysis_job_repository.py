@@ -0,0 +1,208 @@
+from datetime import datetime
+from uuid import uuid4
+
+from sqlalchemy import case, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.database import upsert
+from app.models.post import Post
+from app.models.post_analysis_job import PostAnalysisJob, PostAnalysisJobStatus
+
+
+# 1文あたりの最大行数
+_UPSERT_BATCH_SIZE = 1000
+
+
+async def enqueue(db: AsyncSession, post_ids: list[int], *, now: datetime) -> None:
+    """投稿の判定ジョブを登録する（登録済みの場合は再実行を依頼する、コミットは呼び出し側）
+
+    実行中のジョブは状態を変えずに version だけ進め、完了後にもう一度判定させる。
+    """
+    if not post_ids:
+        return
+    job = PostAnalysisJob.__table__.c
+    running = job.status == PostAnalysisJobStatus.running.name
+    rows = [
+        {
+            "post_id": post_id,
+            "status": PostAnalysisJobStatus.pending.name,
+            "version": 1,
+            "attempts": 0,
+            "run_after": now,
+            "created_at": now,
+            "updated_at": now,
+        }
+        for post_id in dict.fromkeys(post_ids)
+    ]
+    for i in range(0, len(rows), _UPSERT_BATCH_SIZE):
+        await db.execute(upsert(
+            db,
+            PostAnalysisJob,
+            rows[i:i + _UPSERT_BATCH_SIZE],
+            key_columns=["post_id"],
+            update=lambda new: {
+                "attempts": case((running, job.attempts), else_=0),
+                "status": case((running, job.status), else_=new.status),
+                "version": job.version + 1,
+                "run_after": new.run_after,
+                "last_error": None,
+                "updated_at": new.updated_at,
+            },
+        ))
+
+
+async def claim_due_jobs(db: AsyncSession, *, now: datetime, limit: int) -> list:
+    """実行できるジョブを最大 limit 件取り出して実行中にする（コミットは呼び出し側）
+
+    複数のワーカープロセスが同時に取り出しても1件のジョブは1プロセスだけが実行するよう、
+    status が pending のままの場合のみ更新する条件付きUPDATEで確保する。
+    各行は (post_id, version, attempts, claim_token)。attempts は今回の実行を含む回数。
+    """
+    candidates = (await db.execute(
+        select(PostAnalysisJob.post_id)
+        .where(PostAnalysisJob.status == PostAnalysisJobStatus.pending, PostAnalysisJob.run_after <= now)
+        .order_by(PostAnalysisJob.run_after, PostAnalysisJob.post_id)
+        .limit(limit)
+    )).scalars().all()
+
+    claimed = []
+    for post_id in candidates:
+        result = await db.execute(
+            update(PostAnalysisJob)
+            .where(PostAnalysisJob.post_id == post_id, PostAnalysisJob.status == PostAnalysisJobStatus.pending)
+            .values(
+                status=PostAnalysisJobStatus.running,
+                attempts=PostAnalysisJob.attempts + 1,
+                locked_at=now,
+                claim_token=uuid4().hex,
+                updated_at=now,
+            )
+        )
+        if result.rowcount == 1:
+            claimed.append(post_id)
+    if not claimed:
+        return []
+    stmt = (
+        select(PostAnalysisJob.post_id, PostAnalysisJob.version, PostAnalysisJob.attempts, PostAnalysisJob.claim_token)
+        .where(PostAnalysisJob.post_id.in_(claimed))
+        .order_by(PostAnalysisJob.post_id)
+    )
+    return (await db.execute(stmt)).all()
+
+
+def _owned(post_id: int, claim_token: str) -> tuple:
+    # ロックの期限切れで他のワーカーが取り出し直したジョブは更新しない
+    return (
+        PostAnalysisJob.post_id == post_id,
+        PostAnalysisJob.status == PostAnalysisJobStatus.running,
+        PostAnalysisJob.claim_token == claim_token,
+    )
+
+
+async def lock_job(db: AsyncSession, post_id: int, *, version: int, claim_token: str) -> bool:
+    """取り出したジョブの行をロックし、判定結果を書き込んでよいかを返す（コミットは呼び出し側）
+
+    ロックの期限切れで他のワーカーが取り出し直した場合、または実行中に再実行を依頼された
+    （version が進んだ）場合はFalse。判定結果の書き込みと同じトランザクションで呼び出す。
+    """
+    stmt = select(PostAnalysisJob.version).where(*_owned(post_id, claim_token)).with_for_update()
+    return (await db.execute(stmt)).scalar_one_or_none() == version
+
+
+async def complete_job(db: AsyncSession, post_id: int, *, version: int, claim_token: str, now: datetime) -> None:
+    """ジョブを完了にする（実行中に再実行を依頼された場合は実行待ちに戻す、コミットは呼び出し側）"""
+    requested_again = PostAnalysisJob.version != version
+    await db.execute(
+        update(PostAnalysisJob)
+        .where(*_owned(post_id, claim_token))
+        .values(
+            status=case((requested_again, PostAnalysisJobStatus.pending.name), else_=PostAnalysisJobStatus.done.name),
+            attempts=case((requested_again, 0), else_=PostAnalysisJob.attempts),
+            run_after=now,
+            locked_at=None,
+            claim_token=None,
+            last_error=None,
+            updated_at=now,
+        )
+    )
+
+
+async def fail_job(
+    db: AsyncSession,
+    post_id: int,
+    *,
+    version: int,
+    claim_token: str,
+    error: str,
+    retry_at: datetime | None,
+    now: datetime,
+) -> None:
+    """失敗したジョブを retry_at に再実行する（Noneの場合は失敗で終了、コミットは呼び出し側）
+
+    実行中に再実行を依頼された場合は、回数を数え直してすぐに実行待ちに戻す。
+    """
+    requested_again = PostAnalysisJob.version != version
+    final_status = PostAnalysisJobStatus.failed if retry_at is None else PostAnalysisJobStatus.pending
+    await db.execute(
+        update(PostAnalysisJob)
+        .where(*_owned(post_id, claim_token))
+        .values(
+            status=case((requested_again, PostAnalysisJobStatus.pending.name), else_=final_status.name),
+            attempts=case((requested_again, 0), else_=PostAnalysisJob.attempts),
+            run_after=case((requested_again, now), else_=retry_at or now),
+            locked_at=None,
+            claim_token=None,
+            last_error=error[:2000],
+            updated_at=now,
+        )
+    )
+
+
+async def release_stale_jobs(db: AsyncSession, *, locked_before: datetime, now: datetime) -> int:
+    """locked_before より前から実行中のジョブ（停止したワーカーのもの）を実行待ちに戻す（コミットは呼び出し側）"""
+    result = await db.execute(
+        update(PostAnalysisJob)
+        .where(
+            PostAnalysisJob.status == PostAnalysisJobStatus.running,
+            PostAnalysisJob.locked_at < locked_before,
+        )
+        .values(status=PostAnalysisJobStatus.pending, locked_at=None, claim_token=None, run_after=now, updated_at=now)
+    )
+    return result.rowcount
+
+
+async def count_jobs_by_status(db: AsyncSession) -> dict[str, int]:
+    """状態ごとのジョブ数"""
+    stmt = select(PostAnalysisJob.status, func.count()).group_by(PostAnalysisJob.status)
+    counts = {status.value: 0 for status in PostAnalysisJobStatus}
+    for status, count in (await db.execute(stmt)).all():
+        counts[status.value] = count
+    return counts
+
+
+async def retry_failed_jobs(db: AsyncSession, *, now: datetime) -> int:
+    """失敗で終了したジョブを実行待ちに戻す（コミットは呼び出し側）"""
+    result = await db.execute(
+        update(PostAnalysisJob)
+        .where(PostAnalysisJob.status == PostAnalysisJobStatus.failed)
+        .values(status=PostAnalysisJobStatus.pending, attempts=0, run_after=now, updated_at=now)
+    )
+    return result.rowcount
+
+
+async def enqueue_unanalyzed_posts(db: AsyncSession, *, after_id: int = 0, batch_size: int = 1000) -> int | None:
+    """AI判定結果のない投稿のうち、after_id より後の batch_size 件の判定ジョブを登録する
+
+    登録した最後の投稿IDを返す（対象がなくなった場合はNone、コミットは呼び出し側）。
+    """
+    stmt = (
+        select(Post.id)
+        .where(Post.id > after_id, Post.ai_raw_label.is_(None), Post.deleted_at.is_(None))
+        .order_by(Post.id)
+        .limit(batch_size)
+    )
+    post_ids = list((await db.execute(stmt)).scalars().all())
+    if not post_ids:
+        return None
+    await enqueue(db, post_ids, now=datetime.utcnow())
+    return post_ids[-1]
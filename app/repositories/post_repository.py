@@ -0,0 +1,302 @@
+from collections.abc import Callable
+from datetime import datetime
+
+from sqlalchemy import Select, and_, column, delete, exists, func, insert, literal, or_, select, table, text, update
+from sqlalchemy.dialects.mysql import match as mysql_match
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from app.core.database import update_returning
+from app.models.post import Post
+from app.models.post_ability_point import PostAbilityPoint, PostAbilityPointSource
+from app.models.post_like import PostLike
+from app.models.user import User
+from app.services import phase_service
+
+
+def _feed_filters(post, user_id: int | None) -> list:
+    """フィード対象の投稿条件（論理削除除外・ユーザー絞り込み）"""
+    filters = [post.deleted_at.is_(None)]
+    if user_id is not None:
+        filters.append(post.user_id == user_id)
+    return filters
+
+
+def _post_row_query(viewer_id: int | None) -> Select:
+    """投稿・投稿者名・アバターURL・閲覧者のいいね有無を列に持つSELECTを構築する"""
+    if viewer_id is not None:
+        liked_by_me = exists().where(
+            PostLike.post_id == Post.id,
+            PostLike.user_id == viewer_id,
+        )
+    else:
+        liked_by_me = literal(False)
+
+    return (
+        select(
+            Post,
+            User.full_name.label("user_name"),
+            User.avatar_url.label("user_avatar_url"),
+            liked_by_me.label("liked_by_me"),
+        )
+        .outerjoin(User, User.id == Post.user_id)
+    )
+
+
+def build_feed_query(
+    *,
+    viewer_id: int | None,
+    user_id: int | None = None,
+    cursor: tuple[datetime, int] | None = None,
+    skip: int = 0,
+    limit: int = 20,
+) -> Select:
+    """投稿一覧を1ステートメントで取得するクエリを構築する
+
+    各行に投稿・投稿者名・アバターURL・閲覧者のいいね有無・総件数を含める。
+    いいね有無は相関EXISTS、総件数は非相関スカラーサブクエリで求めるため
+    MySQL/SQLiteのどちらでも1往復で済む。
+    """
+    # 外側のpostsと相関させないよう別名で数える
+    counted_post = aliased(Post)
+    total = (
+        select(func.count(counted_post.id))
+        .where(*_feed_filters(counted_post, user_id))
+        .scalar_subquery()
+    )
+
+    stmt = (
+        _post_row_query(viewer_id)
+        .add_columns(total.label("total"))
+        .where(*_feed_filters(Post, user_id))
+        .order_by(Post.created_at.desc(), Post.id.desc())
+        .limit(limit)
+    )
+
+    if cursor is not None:
+        # OFFSETを使わず、前ページ最後の投稿より古いものをシークする
+        cursor_created_at, cursor_id = cursor
+        stmt = stmt.where(
+            or_(
+                Post.created_at < cursor_created_at,
+                and_(Post.created_at == cursor_created_at, Post.id < cursor_id),
+            )
+        )
+    else:
+        stmt = stmt.offset(skip)
+
+    return stmt
+
+
+async def get_post_rows_by_ids(db: AsyncSession, post_ids: list[int], *, viewer_id: int | None) -> list:
+    """指定IDの投稿をフィードと同じ列でIN 1文で取得（削除済みは除外、順序は不定）"""
+    if not post_ids:
+        return []
+    stmt = _post_row_query(viewer_id).where(Post.id.in_(post_ids), Post.deleted_at.is_(None))
+    return (await db.execute(stmt)).all()
+
+
+async def get_active_post(db: AsyncSession, post_id: int, *, for_update: bool = False) -> Post | None:
+    """削除されていない投稿を取得（for_update=True の場合は投稿の行をロックする）"""
+    stmt = select(Post).where(Post.id == post_id, Post.deleted_at.is_(None))
+    if for_update:
+        stmt = stmt.with_for_update()
+    return (await db.execute(stmt)).scalar_one_or_none()
+
+
+async def get_ability_ids_by_post(db: AsyncSession, post_ids: list[int]) -> dict[int, list[int]]:
+    """投稿ごとの能力IDをIN 1文で取得（AI判定から導いた能力は含めない）"""
+    if not post_ids:
+        return {}
+    stmt = (
+        select(PostAbilityPoint.post_id, PostAbilityPoint.ability_id)
+        .where(
+            PostAbilityPoint.post_id.in_(post_ids),
+            PostAbilityPoint.source == PostAbilityPointSource.selected,
+        )
+        .distinct()
+        .order_by(PostAbilityPoint.post_id, PostAbilityPoint.ability_id)
+    )
+    ability_ids: dict[int, list[int]] = {}
+    for post_id, ability_id in (await db.execute(stmt)).all():
+        ability_ids.setdefault(post_id, []).append(ability_id)
+    return ability_ids
+
+
+async def count_feed_posts(db: AsyncSession, user_id: int | None = None) -> int:
+    """フィード対象の投稿件数をCOUNT(*)で取得"""
+    stmt = select(func.count()).select_from(Post).where(*_feed_filters(Post, user_id))
+    return (await db.execute(stmt)).scalar_one()
+
+
+async def get_like_count(db: AsyncSession, post_id: int) -> int | None:
+    """投稿のいいね数を取得（投稿が存在しない・削除済みの場合はNone）"""
+    stmt = select(Post.like_count).where(Post.id == post_id, Post.deleted_at.is_(None))
+    return (await db.execute(stmt)).scalar_one_or_none()
+
+
+async def get_like_state(db: AsyncSession, post_id: int, user_id: int) -> tuple[int, bool] | None:
+    """投稿のいいね数とユーザーのいいね有無を1ステートメントで取得（投稿がない場合None）"""
+    liked = exists().where(PostLike.post_id == Post.id, PostLike.user_id == user_id)
+    stmt = select(Post.like_count, liked).where(Post.id == post_id, Post.deleted_at.is_(None))
+    row = (await db.execute(stmt)).first()
+    if row is None:
+        return None
+    return row[0], bool(row[1])
+
+
+async def add_like(db: AsyncSession, post_id: int, user_id: int) -> int | None:
+    """いいねを冪等に追加し、更新後のいいね数を返す（コミットは呼び出し側）
+
+    先に「いいねしていない場合のみ」カウンタを加算する条件付きUPDATEで投稿の行をロックし、
+    加算できた場合のみpost_likesへINSERTする。同時の二重タップは投稿の行ロックで直列化され、
+    後の方は条件に一致しないため何もしない。新しいいいねはUPDATE（更新後の値を返す）とINSERTの2文で済む。
+    投稿が存在しない・削除済みの場合はNoneを返す。
+    """
+    liked = exists().where(PostLike.post_id == post_id, PostLike.user_id == user_id)
+    like_count = await update_returning(
+        db,
+        Post,
+        where=(Post.id == post_id, Post.deleted_at.is_(None), ~liked),
+        column=Post.like_count,
+        value=Post.like_count + 1,
+    )
+    if like_count is None:
+        # いいね済み、または投稿がない
+        return await get_like_count(db, post_id)
+    await db.execute(
+        insert(PostLike).values(post_id=post_id, user_id=user_id, created_at=datetime.utcnow())
+    )
+    return like_count
+
+
+async def remove_like(db: AsyncSession, post_id: int, user_id: int) -> int | None:
+    """いいねを冪等に取り消し、更新後のいいね数を返す（コミットは呼び出し側）
+
+    add_like と同様に、いいねしている場合のみカウンタを減算してから post_likes の行を削除する。
+    投稿が存在しない・削除済みの場合はNoneを返す。
+    """
+    liked = exists().where(PostLike.post_id == post_id, PostLike.user_id == user_id)
+    like_count = await update_returning(
+        db,
+        Post,
+        where=(Post.id == post_id, Post.deleted_at.is_(None), liked),
+        column=Post.like_count,
+        value=Post.like_count - 1,
+    )
+    if like_count is None:
+        # いいねしていない、または投稿がない
+        return await get_like_count(db, post_id)
+    await db.execute(delete(PostLike).where(PostLike.post_id == post_id, PostLike.user_id == user_id))
+    return like_count
+
+
+async def rebuild_like_counts(db: AsyncSession, post_ids: list[int] | None = None) -> None:
+    """post_likesからいいね数カウンタを再計算する（post_ids未指定時は全投稿）"""
+    like_count_subquery = (
+        select(func.count(PostLike.id))
+        .where(PostLike.post_id == Post.id)
+        .scalar_subquery()
+    )
+    stmt = update(Post).values(like_count=like_count_subquery)
+    if post_ids is not None:
+        stmt = stmt.where(Post.id.in_(post_ids))
+    await db.execute(stmt)
+
+
+# SQLiteのFTS5仮想テーブル（app.models.post で作成）
+_posts_fts = table("posts_fts", column("rowid"), column("rank"))
+
+
+def build_search_query(
+    db: AsyncSession,
+    q: str,
+    *,
+    viewer_id: int | None,
+    skip: int = 0,
+    limit: int = 20,
+) -> Select | None:
+    """投稿の全文検索クエリを構築する（検索語がない場合はNone）
+
+    MySQLはngramパーサーのFULLTEXTインデックス、SQLiteはtrigramトークナイザーの
+    FTS5テーブルを使い、関連度の高い順に並べる。空白区切りの語はすべて含む投稿のみ返す。
+    各行には feed と同じ列に加えて総件数（ウィンドウ関数）を含める。
+    """
+    terms = [term.replace('"', "") for term in q.split()]
+    terms = [term for term in terms if term]
+    if not terms:
+        return None
+
+    stmt = (
+        _post_row_query(viewer_id)
+        .add_columns(func.count().over().label("total"))
+        .where(Post.deleted_at.is_(None))
+    )
+
+    if db.get_bind().dialect.name == "sqlite":
+        # trigramトークナイザーのため、3文字未満の語は一致しない
+        fts_query = " ".join(f'"{term}"' for term in terms)
+        stmt = (
+            stmt.join(_posts_fts, _posts_fts.c.rowid == Post.id)
+            .where(text("posts_fts MATCH :fts_query").bindparams(fts_query=fts_query))
+            .order_by(_posts_fts.c.rank, Post.id.desc())
+        )
+    else:
+        relevance = mysql_match(
+            Post.problem, Post.content_1, Post.content_2, Post.content_3,
+            against=" ".join(f'+"{term}"' for term in terms),
+        ).in_boolean_mode()
+        stmt = stmt.where(relevance).order_by(relevance.desc(), Post.id.desc())
+
+    return stmt.offset(skip).limit(limit)
+
+
+async def backfill_phase_codes(db: AsyncSession, *, after_id: int = 0, batch_size: int = 1000) -> tuple[int | None, int]:
+    """phase_code 未設定の投稿を id順に batch_size 件ずつ正規化する（コミットは呼び出し側）
+
+    (処理した最後の投稿ID, 更新件数) を返す。対象がなければ最後の投稿IDはNone。
+    該当するフェーズがない投稿は phase_code がNoneのまま残るため、after_id で続きから再開する。
+    """
+    stmt = (
+        select(Post.id, Post.phase_label)
+        .where(Post.phase_code.is_(None), Post.id > after_id)
+        .order_by(Post.id)
+        .limit(batch_size)
+    )
+    rows = (await db.execute(stmt)).all()
+    if not rows:
+        return None, 0
+
+    ids_by_code: dict = {}
+    for post_id, phase_label in rows:
+        code = phase_service.to_phase_code(phase_label)
+        if code is not None:
+            ids_by_code.setdefault(code, []).append(post_id)
+
+    # フェーズごとに1文で更新する（updated_at は変えない）
+    for code, post_ids in ids_by_code.items():
+        await db.execute(update(Post).where(Post.id.in_(post_ids)).values(phase_code=code))
+    return rows[-1].id, sum(len(post_ids) for post_ids in ids_by_code.values())
+
+
+async def backfill_all_phase_codes(
+    db: AsyncSession,
+    *,
+    after_id: int = 0,
+    batch_size: int = 1000,
+    on_batch: Callable[[int, int], None] | None = None,
+) -> int:
+    """phase_code 未設定の投稿をすべて正規化し、更新件数を返す（バッチごとにコミットする）
+
+    on_batch にはコミットのたびに (処理した最後の投稿ID, 累計の更新件数) を渡す（中断後の再開位置の表示用）。
+    """
+    total = 0
+    while True:
+        last_id, updated = await backfill_phase_codes(db, after_id=after_id, batch_size=batch_size)
+        if last_id is None:
+            return total
+        await db.commit()
+        total += updated
+        after_id = last_id
+        if on_batch is not None:
+            on_batch(last_id, total)
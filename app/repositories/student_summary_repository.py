@@ -0,0 +1,296 @@
+from datetime import datetime
+
+from sqlalchemy import case, delete, func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.database import upsert
+from app.models.post import PhaseCode, Post, QuestionStateChangeType
+from app.models.post_ability_point import PostAbilityPoint
+from app.models.student_activity_summary import StudentAbilitySummary, StudentActivitySummary
+from app.models.thanks_letter import ThanksLetter
+from app.models.thanks_letter_ability_point import ThanksLetterAbilityPoint
+from app.models.user import User
+from app.services import phase_service
+
+
+# 再計算時の1文あたりの最大行数
+_INSERT_BATCH_SIZE = 1000
+
+# 全ユーザーの再計算で1トランザクションに含めるユーザー数
+_REBUILD_BATCH_SIZE = 500
+
+
+def _user_filter(column, user_ids: list[int] | None) -> list:
+    """user_ids指定時のみ対象ユーザーに絞り込む条件"""
+    return [] if user_ids is None else [column.in_(user_ids)]
+
+
+async def lock_students(db: AsyncSession, user_ids: list[int] | None) -> None:
+    """サマリーを書き換える生徒の users の行をID順にロックする（user_ids未指定時は全ユーザー、コミットで解放）
+
+    サマリーの行はまだない場合があるため、必ず存在する users の行でロックする。
+    再計算（refresh_student_summaries）とAI判定の差分の反映は、同じ生徒についてはこのロックで直列化する。
+    """
+    stmt = select(User.id).where(*_user_filter(User.id, user_ids)).order_by(User.id).with_for_update()
+    await db.execute(stmt)
+
+
+async def _get_post_progress(db: AsyncSession, user_ids: list[int] | None) -> dict[int, dict]:
+    """ユーザーごとの投稿数・最終投稿日時・最新フェーズ・問いの変更回数を1文で取得
+
+    ウィンドウ関数でユーザーごとに集計し、最新の投稿（ROW_NUMBER = 1）の行だけを返す。
+    """
+    per_user = {"partition_by": Post.user_id}
+    ranked = (
+        select(
+            Post.user_id,
+            Post.phase_label,
+            Post.phase_code,
+            func.row_number().over(
+                order_by=(Post.created_at.desc(), Post.id.desc()), **per_user
+            ).label("row_number"),
+            func.count().over(**per_user).label("post_count"),
+            func.max(Post.created_at).over(**per_user).label("last_posted_at"),
+            func.sum(
+                case((Post.question_state_change_type != QuestionStateChangeType.none, 1), else_=0)
+            ).over(**per_user).label("question_change_count"),
+        )
+        .where(Post.deleted_at.is_(None), *_user_filter(Post.user_id, user_ids))
+        .subquery()
+    )
+    stmt = select(ranked).where(ranked.c.row_number == 1)
+
+    return {
+        row.user_id: {
+            "post_count": row.post_count,
+            "last_posted_at": row.last_posted_at,
+            "latest_phase": phase_service.display_label(row.phase_label, row.phase_code),
+            # phase_code の補完前の投稿はフェーズ名から正規化する
+            "latest_phase_code": row.phase_code or phase_service.to_phase_code(row.phase_label),
+            "question_change_count": row.question_change_count or 0,
+        }
+        for row in (await db.execute(stmt)).all()
+    }
+
+
+async def _count_letters(db: AsyncSession, user_column, user_ids: list[int] | None) -> dict[int, int]:
+    """ユーザーごとの感謝の手紙数（user_columnで送信/受信を指定）"""
+    stmt = (
+        select(user_column, func.count(ThanksLetter.id))
+        .where(*_user_filter(user_column, user_ids))
+        .group_by(user_column)
+    )
+    return dict((await db.execute(stmt)).all())
+
+
+async def _sum_ability_points(db: AsyncSession, user_ids: list[int] | None) -> dict[tuple[int, int], dict]:
+    """ユーザー・能力ごとの投稿/受け取った手紙の能力ポイント合計"""
+    # 生徒のロックを待つ間に他のトランザクションがコミットしたAI判定の行も数えるよう、ロックして最新の値を読む
+    # （MySQL 8では FOR SHARE OF post_ability_points となり、投稿の行はロックしない）
+    post_stmt = (
+        select(Post.user_id, PostAbilityPoint.ability_id, func.sum(PostAbilityPoint.point))
+        .join(Post, PostAbilityPoint.post_id == Post.id)
+        .where(Post.deleted_at.is_(None), *_user_filter(Post.user_id, user_ids))
+        .group_by(Post.user_id, PostAbilityPoint.ability_id)
+        .with_for_update(read=True, of=PostAbilityPoint)
+    )
+    letter_stmt = (
+        select(ThanksLetter.receiver_user_id, ThanksLetterAbilityPoint.ability_id, func.sum(ThanksLetterAbilityPoint.points))
+        .join(ThanksLetter, ThanksLetterAbilityPoint.thanks_letter_id == ThanksLetter.id)
+        .where(*_user_filter(ThanksLetter.receiver_user_id, user_ids))
+        .group_by(ThanksLetter.receiver_user_id, ThanksLetterAbilityPoint.ability_id)
+    )
+
+    points: dict[tuple[int, int], dict] = {}
+    for column, stmt in (("post_points", post_stmt), ("letter_points", letter_stmt)):
+        for user_id, ability_id, total in (await db.execute(stmt)).all():
+            row = points.setdefault(
+                (user_id, ability_id),
+                {"user_id": user_id, "ability_id": ability_id, "post_points": 0, "letter_points": 0},
+            )
+            row[column] = total or 0
+    return points
+
+
+async def refresh_student_summaries(db: AsyncSession, user_ids: list[int] | None = None) -> None:
+    """元データからサマリーを再計算する（user_ids未指定時は全ユーザー、コミットは呼び出し側）
+
+    更新・削除など差分で反映しにくい書き込みの後に、影響するユーザー分だけ呼び出す。
+    AI判定の差分の反映と互いに上書きしないよう、先に対象の生徒をロックする。
+    user_ids未指定では全ユーザーと全投稿の能力ポイントを1トランザクションでロックするため、
+    運用中のデータでは rebuild_all_student_summaries を使う。
+    """
+    if user_ids is not None:
+        user_ids = sorted(set(user_ids))
+        if not user_ids:
+            return
+
+    await lock_students(db, user_ids)
+
+    progress = await _get_post_progress(db, user_ids)
+    received = await _count_letters(db, ThanksLetter.receiver_user_id, user_ids)
+    sent = await _count_letters(db, ThanksLetter.sender_user_id, user_ids)
+    ability_points = await _sum_ability_points(db, user_ids)
+
+    now = datetime.utcnow()
+    summaries = []
+    for user_id in sorted(set(progress) | set(received) | set(sent)):
+        user_progress = progress.get(user_id, {})
+        summaries.append({
+            "user_id": user_id,
+            "post_count": user_progress.get("post_count", 0),
+            "last_posted_at": user_progress.get("last_posted_at"),
+            "latest_phase": user_progress.get("latest_phase"),
+            "latest_phase_code": user_progress.get("latest_phase_code"),
+            "question_change_count": user_progress.get("question_change_count", 0),
+            "letters_sent_count": sent.get(user_id, 0),
+            "letters_received_count": received.get(user_id, 0),
+            "updated_at": now,
+        })
+    ability_rows = [ability_points[key] for key in sorted(ability_points)]
+
+    await db.execute(
+        delete(StudentActivitySummary).where(*_user_filter(StudentActivitySummary.user_id, user_ids))
+    )
+    await db.execute(
+        delete(StudentAbilitySummary).where(*_user_filter(StudentAbilitySummary.user_id, user_ids))
+    )
+    for table, rows in ((StudentActivitySummary, summaries), (StudentAbilitySummary, ability_rows)):
+        for i in range(0, len(rows), _INSERT_BATCH_SIZE):
+            await db.execute(insert(table).values(rows[i:i + _INSERT_BATCH_SIZE]))
+
+
+async def rebuild_all_student_summaries(db: AsyncSession, *, batch_size: int = _REBUILD_BATCH_SIZE) -> int:
+    """全ユーザーのサマリーをユーザーID順に batch_size 人ずつ再計算し、対象のユーザー数を返す（バッチごとにコミットする）
+
+    ロックを持つのは再計算中のバッチのユーザーとその投稿の能力ポイントだけのため、投稿やAI判定を長く止めない。
+    """
+    after_id, total = 0, 0
+    while True:
+        stmt = select(User.id).where(User.id > after_id).order_by(User.id).limit(batch_size)
+        user_ids = list((await db.execute(stmt)).scalars().all())
+        if not user_ids:
+            return total
+        await refresh_student_summaries(db, user_ids)
+        await db.commit()
+        total += len(user_ids)
+        after_id = user_ids[-1]
+
+
+async def record_post_created(
+    db: AsyncSession,
+    *,
+    user_id: int,
+    phase_label: str,
+    phase_code: PhaseCode | None,
+    question_changed: bool,
+    created_at: datetime,
+    ability_ids: list[int],
+    point: float = 1.0,
+) -> None:
+    """投稿の作成をサマリーに差分で反映する（コミットは呼び出し側）
+
+    phase_label には表示用のフェーズ名（phase_service.display_label）、phase_code には正規化したコードを渡す。
+    新しい投稿は常に最新のため、最終投稿日時・最新フェーズはその値で上書きする。
+    """
+    summary = StudentActivitySummary.__table__.c
+    await db.execute(upsert(
+        db,
+        StudentActivitySummary,
+        {
+            "user_id": user_id,
+            "post_count": 1,
+            "last_posted_at": created_at,
+            "latest_phase": phase_label,
+            "latest_phase_code": phase_code,
+            "question_change_count": int(question_changed),
+            "letters_sent_count": 0,
+            "letters_received_count": 0,
+            "updated_at": created_at,
+        },
+        key_columns=["user_id"],
+        update=lambda new: {
+            "post_count": summary.post_count + new.post_count,
+            "last_posted_at": new.last_posted_at,
+            "latest_phase": new.latest_phase,
+            "latest_phase_code": new.latest_phase_code,
+            "question_change_count": summary.question_change_count + new.question_change_count,
+            "updated_at": new.updated_at,
+        },
+    ))
+    await _add_ability_points(db, user_id, ability_ids, "post_points", point)
+
+
+async def record_letter_created(
+    db: AsyncSession,
+    *,
+    sender_user_id: int,
+    receiver_user_id: int,
+    ability_ids: list[int],
+    points: float = 1.0,
+) -> None:
+    """感謝の手紙の作成をサマリーに差分で反映する（コミットは呼び出し側）"""
+    summary = StudentActivitySummary.__table__.c
+    now = datetime.utcnow()
+    rows = [
+        {"user_id": sender_user_id, "letters_sent_count": 1, "letters_received_count": 0, "updated_at": now},
+        {"user_id": receiver_user_id, "letters_sent_count": 0, "letters_received_count": 1, "updated_at": now},
+    ]
+    await db.execute(upsert(
+        db,
+        StudentActivitySummary,
+        rows,
+        key_columns=["user_id"],
+        update=lambda new: {
+            "letters_sent_count": summary.letters_sent_count + new.letters_sent_count,
+            "letters_received_count": summary.letters_received_count + new.letters_received_count,
+            "updated_at": new.updated_at,
+        },
+    ))
+    # 手紙の能力ポイントは受信者の能力として記録する
+    await _add_ability_points(db, receiver_user_id, ability_ids, "letter_points", points)
+
+
+async def record_post_points_changed(db: AsyncSession, *, user_id: int, changes: dict[int, float]) -> None:
+    """投稿の能力ポイントの増減（能力ID → 増減）をサマリーに差分で反映する（コミットは呼び出し側）
+
+    同じ生徒の複数の投稿を同時に判定しても、加算のupsertのため互いに上書きしない。
+    再計算と互いに上書きしないよう、呼び出し側は先に lock_students で生徒をロックしておく。
+    生徒別のダッシュボードのキャッシュが切り替わるよう、活動サマリーの更新日時も進める。
+    """
+    if not changes:
+        return
+    await db.execute(
+        update(StudentActivitySummary)
+        .where(StudentActivitySummary.user_id == user_id)
+        .values(updated_at=datetime.utcnow())
+    )
+    summary = StudentAbilitySummary.__table__.c
+    rows = [
+        {"user_id": user_id, "ability_id": ability_id, "post_points": change, "letter_points": 0}
+        for ability_id, change in sorted(changes.items())
+    ]
+    await db.execute(upsert(
+        db,
+        StudentAbilitySummary,
+        rows,
+        key_columns=["user_id", "ability_id"],
+        update=lambda new: {"post_points": summary.post_points + new.post_points},
+    ))
+
+
+async def _add_ability_points(db: AsyncSession, user_id: int, ability_ids: list[int], column: str, points: float) -> None:
+    if not ability_ids:
+        return
+    summary = StudentAbilitySummary.__table__.c
+    rows = [
+        {"user_id": user_id, "ability_id": ability_id, "post_points": 0, "letter_points": 0, column: points}
+        for ability_id in ability_ids
+    ]
+    await db.execute(upsert(
+        db,
+        StudentAbilitySummary,
+        rows,
+        key_columns=["user_id", "ability_id"],
+        update=lambda new: {column: summary[column] + new[column]},
+    ))
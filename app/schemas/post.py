@@ -4,7 +4,7 @@ from typing import Optional
 
 from pydantic import BaseModel, Field
 
-from app.models.post import QuestionStateChangeType
+from app.models.post import PhaseCode, QuestionStateChangeType
 
 
 class PostCreate(BaseModel):
@@ -39,6 +39,8 @@ class PostResponse(BaseModel):
     content_3: Optional[str]
     question_state_change_type: QuestionStateChangeType
     phase_label: str
+    # phase_label を正規化したフェーズ（該当なしはNone）
+    phase_code: Optional[PhaseCode] = None
     created_at: datetime
     updated_at: datetime
 
@@ -50,6 +52,9 @@ class PostResponse(BaseModel):
     like_count: int = 0
     liked_by_me: bool = False
 
+    # 非認知能力コード（一括取得 /posts/batch でのみ設定）
+    ability_codes: list[str] = Field(default_factory=list)
+
     class Config:
         from_attributes = True
 
@@ -58,3 +63,13 @@ class PostListResponse(BaseModel):
     """投稿一覧レスポンス"""
     posts: list[PostResponse]
     total: int
+    # 次ページ取得用カーソル（最終ページの場合はNone）
+    next_cursor: Optional[str] = None
+
+
+class PostBatchResponse(BaseModel):
+    """投稿一括取得レスポンス"""
+    # リクエストのID順
+    posts: list[PostResponse]
+    # 存在しない・削除済みの投稿ID
+    missing_ids: list[int]
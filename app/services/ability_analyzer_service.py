@@ -7,8 +7,10 @@ import json
 from typing import Optional
 
 from openai import AsyncOpenAI
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import settings
+from app.services import analysis_cache_service
 
 
 # 5段階レベルの説明（UI表示用）
@@ -187,6 +189,9 @@ class AbilityAnalyzerService:
     def __init__(self):
         self.client = AsyncOpenAI(api_key=settings.openai_api_key)
         self.model = settings.openai_model
+        self.system_prompt = self._build_system_prompt()
+        # ルーブリック・判定例を変えた場合は、以前の判定結果をキャッシュから使わない
+        self.prompt_version = analysis_cache_service.prompt_version(self.system_prompt)
 
     def _build_rubric_text(self) -> str:
         """ルーブリック情報をテキスト化"""
@@ -212,41 +217,12 @@ class AbilityAnalyzerService:
             examples_text += f"  {json.dumps(example['output'], ensure_ascii=False, indent=2)}\n"
         return examples_text
 
-    async def analyze_abilities(
-        self,
-        content: str,
-        problem: Optional[str] = None
-    ) -> dict:
-        """
-        投稿内容から該当する非認知能力を判定する（5段階レベル評価版）
-
-        Args:
-            content: 投稿内容（やってみたこと）
-            problem: 課題・問い（任意）
-
-        Returns:
-            {
-                "matched_abilities": [
-                    {
-                        "code": str,
-                        "name": str,
-                        "level": int (1-5),
-                        "level_reason": str,
-                        "reason": str
-                    },
-                    ...
-                ],
-                "analysis_summary": str
-            }
-        """
+    def _build_system_prompt(self) -> str:
+        """システムプロンプト（ルーブリック・Few-shot例を含み、投稿内容によらない）"""
         # ルーブリックとFew-shot例を構築
         rubric_text = self._build_rubric_text()
         few_shot_text = self._build_few_shot_text()
 
-        # ユーザー入力を構築
-        input_text = f"【課題・問い】\n{problem}\n\n" if problem else ""
-        input_text += f"【やってみたこと】\n{content}"
-
         system_prompt = f"""あなたは教育専門家です。
 生徒の探究活動の記録を読み、その活動で発揮された「非認知能力」を判定し、5段階のルーブリックでレベル評価してください。
 
@@ -285,12 +261,72 @@ class AbilityAnalyzerService:
 
 該当する能力がない場合は matched_abilities を空配列にしてください。
 """
+        return system_prompt
+
+    async def analyze_abilities(
+        self,
+        content: str,
+        problem: Optional[str] = None,
+        *,
+        db: Optional[AsyncSession] = None,
+        use_cache: bool = True,
+    ) -> dict:
+        """
+        投稿内容から該当する非認知能力を判定する（5段階レベル評価版）
+
+        同じ課題・本文（空白の違いは無視）の判定結果はキャッシュから返す
+        （app/services/analysis_cache_service.py）。
+
+        Args:
+            content: 投稿内容（やってみたこと）
+            problem: 課題・問い（任意）
+            db: 判定結果のキャッシュテーブルを使う場合のセッション（任意）
+            use_cache: Falseの場合はキャッシュを使わずに判定し直す（結果でキャッシュを置き換える）
+
+        Returns:
+            {
+                "matched_abilities": [
+                    {
+                        "code": str,
+                        "name": str,
+                        "level": int (1-5),
+                        "level_reason": str,
+                        "reason": str
+                    },
+                    ...
+                ],
+                "analysis_summary": str
+            }
+        """
+        if not settings.analysis_cache_enabled:
+            return await self._request_analysis(content, problem)
+
+        key = analysis_cache_service.cache_key(
+            problem=problem,
+            content=content,
+            model=self.model,
+            prompt_version=self.prompt_version,
+        )
+        return await analysis_cache_service.analysis_cache.get_or_analyze(
+            key,
+            lambda: self._request_analysis(content, problem),
+            model=self.model,
+            prompt_version=self.prompt_version,
+            db=db,
+            use_cache=use_cache,
+        )
+
+    async def _request_analysis(self, content: str, problem: Optional[str]) -> dict:
+        """OpenAI APIで判定する（エラー時は error を含む結果を返す）"""
+        # ユーザー入力を構築
+        input_text = f"【課題・問い】\n{problem}\n\n" if problem else ""
+        input_text += f"【やってみたこと】\n{content}"
 
         try:
             response = await self.client.chat.completions.create(
                 model=self.model,
                 messages=[
-                    {"role": "system", "content": system_prompt},
+                    {"role": "system", "content": self.system_prompt},
                     {"role": "user", "content": input_text}
                 ],
                 temperature=0.2,  # より一貫性を重視
@@ -0,0 +1,157 @@
+"""非認知能力マスターのプロセス内レジストリ
+
+non_cog_abilities（7件）・ability_rubrics・ability_score_bands はほぼ変更されないため、
+起動時に読み込んで不変のマップとして保持し、書き込み処理やダッシュボードから
+DBへ問い合わせずに参照できるようにする。
+ABILITY_REGISTRY_TTL_SECONDS 経過後の参照時、または管理者APIから再読み込みできる。
+"""
+import asyncio
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from types import MappingProxyType
+from typing import Iterable, Mapping
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.non_cog_ability import NonCogAbility
+from app.models.post import AbilityRubric, AbilityScoreBand, SignalColor
+
+
+@dataclass(frozen=True)
+class AbilityEntry:
+    """非認知能力"""
+    id: int
+    code: str
+    name: str
+
+
+@dataclass(frozen=True)
+class RubricEntry:
+    """能力ルーブリックの1レベル"""
+    level: int
+    title: str
+    coefficient: float
+
+
+@dataclass(frozen=True)
+class ScoreBandEntry:
+    """パーセンタイル帯（ability_id / grade がNoneの場合は全能力・全学年に適用）"""
+    ability_id: int | None
+    grade: int | None
+    band_order: int
+    signal_color: SignalColor
+    band_label: str
+    percentile_min: float
+    percentile_max: float | None
+
+
+@dataclass(frozen=True)
+class AbilitySnapshot:
+    """ある時点で読み込んだマスターデータ（不変）"""
+    version: int
+    loaded_at: datetime
+    abilities: tuple[AbilityEntry, ...]
+    code_to_id: Mapping[str, int]
+    id_to_code: Mapping[int, str]
+    rubrics: Mapping[int, tuple[RubricEntry, ...]]
+    score_bands: tuple[ScoreBandEntry, ...]
+
+
+class AbilityRegistry:
+    """非認知能力マスターのレジストリ（プロセス単位）"""
+
+    def __init__(self):
+        self._snapshot: AbilitySnapshot | None = None
+        self._loaded_monotonic = 0.0
+        self._version = 0
+        self._lock: asyncio.Lock | None = None
+
+    @property
+    def snapshot(self) -> AbilitySnapshot | None:
+        """現在のスナップショット（未読み込みの場合はNone）"""
+        return self._snapshot
+
+    def invalidate(self) -> None:
+        """スナップショットを破棄し、次回参照時に再読み込みさせる"""
+        self._snapshot = None
+
+    def _is_fresh(self) -> bool:
+        if self._snapshot is None:
+            return False
+        ttl = settings.ability_registry_ttl_seconds
+        return ttl <= 0 or time.monotonic() - self._loaded_monotonic < ttl
+
+    async def load(self, db: AsyncSession) -> AbilitySnapshot:
+        """DBからマスターデータを読み込み、スナップショットを差し替える"""
+        abilities_result = await db.execute(select(NonCogAbility).order_by(NonCogAbility.id))
+        abilities = tuple(
+            AbilityEntry(id=ability.id, code=ability.code, name=ability.name)
+            for ability in abilities_result.scalars().all()
+        )
+
+        rubrics_result = await db.execute(
+            select(AbilityRubric).order_by(AbilityRubric.ability_id, AbilityRubric.level)
+        )
+        rubrics: dict[int, list[RubricEntry]] = {}
+        for rubric in rubrics_result.scalars().all():
+            rubrics.setdefault(rubric.ability_id, []).append(
+                RubricEntry(level=rubric.level, title=rubric.title, coefficient=float(rubric.coefficient))
+            )
+
+        bands_result = await db.execute(
+            select(AbilityScoreBand).order_by(AbilityScoreBand.band_order)
+        )
+        score_bands = tuple(
+            ScoreBandEntry(
+                ability_id=band.ability_id,
+                grade=band.grade,
+                band_order=band.band_order,
+                signal_color=band.signal_color,
+                band_label=band.band_label,
+                percentile_min=float(band.percentile_min),
+                percentile_max=float(band.percentile_max) if band.percentile_max is not None else None,
+            )
+            for band in bands_result.scalars().all()
+        )
+
+        self._version += 1
+        self._snapshot = AbilitySnapshot(
+            version=self._version,
+            loaded_at=datetime.utcnow(),
+            abilities=abilities,
+            code_to_id=MappingProxyType({ability.code: ability.id for ability in abilities}),
+            id_to_code=MappingProxyType({ability.id: ability.code for ability in abilities}),
+            rubrics=MappingProxyType({ability_id: tuple(levels) for ability_id, levels in rubrics.items()}),
+            score_bands=score_bands,
+        )
+        self._loaded_monotonic = time.monotonic()
+        return self._snapshot
+
+    async def get(self, db: AsyncSession) -> AbilitySnapshot:
+        """スナップショットを取得（未読み込み・TTL切れの場合のみDBから読み込む）"""
+        if self._is_fresh():
+            return self._snapshot
+
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            # 待っている間に他のリクエストが読み込んでいれば、それを使う
+            if self._is_fresh():
+                return self._snapshot
+            return await self.load(db)
+
+    async def resolve_codes(self, db: AsyncSession, codes: Iterable[str]) -> list[int]:
+        """能力コードをIDに変換する（未知のコードは無視、重複は除去）"""
+        snapshot = await self.get(db)
+        return [
+            snapshot.code_to_id[code]
+            for code in dict.fromkeys(codes)
+            if code in snapshot.code_to_id
+        ]
+
+
+# グローバルインスタンス
+ability_registry = AbilityRegistry()
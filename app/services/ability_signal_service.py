@@ -0,0 +1,136 @@
+"""非認知能力スコアの学年内パーセンタイルと信号色（ability_score_bands）の算出
+
+在籍中の全生徒の能力スコアを 生徒 × 能力 の行列として読み込み、
+学年ごと・能力ごとのパーセンタイル順位をNumPyでまとめて計算する。
+信号色は、パーセンタイル帯の下限（昇順）に対する二分探索で割り当てる。
+"""
+from dataclasses import dataclass
+
+import numpy as np
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.repositories import dashboard_repository
+from app.services.ability_registry_service import AbilitySnapshot, ScoreBandEntry, ability_registry
+
+
+# 学年未設定の生徒のグループ
+_NO_GRADE = -1
+
+
+@dataclass(frozen=True)
+class AbilitySignal:
+    """ある生徒・能力のパーセンタイルと信号色（該当する帯がない場合、色・ラベルはNone）"""
+    percentile: float
+    signal_color: str | None
+    band_label: str | None
+
+    def to_dict(self) -> dict:
+        return {
+            "percentile": self.percentile,
+            "signal_color": self.signal_color,
+            "band_label": self.band_label,
+        }
+
+
+def build_score_matrix(rows, snapshot: AbilitySnapshot) -> tuple[np.ndarray, list[tuple], np.ndarray]:
+    """生徒ごとの能力スコアの行（dashboard_repository.get_active_student_ability_totals）を行列にする
+
+    (生徒IDの配列, 生徒ごとの (学年, クラス), 生徒 × snapshot.abilities の順のスコア行列) を返す。
+    """
+    user_index: dict[int, int] = {}
+    students: list[tuple] = []
+    for row in rows:
+        if row.user_id not in user_index:
+            user_index[row.user_id] = len(students)
+            students.append((row.grade, row.class_name))
+
+    ability_index = {ability.id: column for column, ability in enumerate(snapshot.abilities)}
+    scores = np.zeros((len(students), len(ability_index)), dtype=float)
+    for row in rows:
+        column = ability_index.get(row.ability_id)
+        if column is not None:
+            scores[user_index[row.user_id], column] = float(row.score or 0)
+    return np.array(list(user_index), dtype=np.int64), students, scores
+
+
+def percentile_ranks(scores: np.ndarray, groups: np.ndarray) -> np.ndarray:
+    """グループ（学年）内・列（能力）ごとのパーセンタイル順位（0〜100）
+
+    同点は中間順位として扱う: (自分より低い人数 + 同点の人数 / 2) / グループの人数 × 100
+    """
+    ranks = np.zeros(scores.shape, dtype=float)
+    for group in np.unique(groups):
+        rows = groups == group
+        block = scores[rows]
+        ordered = np.sort(block, axis=0)
+        group_ranks = np.empty(block.shape, dtype=float)
+        for column in range(block.shape[1]):
+            below = np.searchsorted(ordered[:, column], block[:, column], side="left")
+            at_or_below = np.searchsorted(ordered[:, column], block[:, column], side="right")
+            group_ranks[:, column] = (below + at_or_below) / 2
+        ranks[rows] = group_ranks / block.shape[0] * 100
+    return ranks
+
+
+def _bands_for(bands: tuple[ScoreBandEntry, ...], ability_id: int, grade: int) -> list[ScoreBandEntry]:
+    """能力・学年に適用する帯（能力と学年の指定が具体的なものを優先）を下限の昇順で返す"""
+    for key in ((ability_id, grade), (ability_id, None), (None, grade), (None, None)):
+        matched = [band for band in bands if (band.ability_id, band.grade) == key]
+        if matched:
+            return sorted(matched, key=lambda band: (band.percentile_min, band.band_order))
+    return []
+
+
+def assign_bands(percentiles: np.ndarray, bands: list[ScoreBandEntry]) -> np.ndarray:
+    """各パーセンタイルが属する帯のインデックス（帯の下限未満は最初の帯、帯がない場合は-1）"""
+    if not bands:
+        return np.full(percentiles.shape, -1, dtype=int)
+    lower_bounds = np.array([band.percentile_min for band in bands])
+    indexes = np.searchsorted(lower_bounds, percentiles, side="right") - 1
+    return np.clip(indexes, 0, len(bands) - 1)
+
+
+def compute_signals(
+    user_ids: np.ndarray,
+    grades: np.ndarray,
+    scores: np.ndarray,
+    snapshot: AbilitySnapshot,
+) -> dict[int, dict[str, AbilitySignal]]:
+    """生徒ごと・能力コードごとの信号を算出
+
+    scores は 生徒 × snapshot.abilities の順の行列、grades は学年（未設定は _NO_GRADE）。
+    """
+    ranks = percentile_ranks(scores, grades)
+    signals: dict[int, dict[str, AbilitySignal]] = {int(user_id): {} for user_id in user_ids}
+
+    for grade in np.unique(grades):
+        rows = np.flatnonzero(grades == grade)
+        band_grade = None if grade == _NO_GRADE else int(grade)
+        for column, ability in enumerate(snapshot.abilities):
+            bands = _bands_for(snapshot.score_bands, ability.id, band_grade)
+            indexes = assign_bands(ranks[rows, column], bands)
+            for row, index in zip(rows, indexes):
+                band = bands[index] if index >= 0 else None
+                signals[int(user_ids[row])][ability.code] = AbilitySignal(
+                    percentile=round(float(ranks[row, column]), 1),
+                    signal_color=band.signal_color.value if band else None,
+                    band_label=band.band_label if band else None,
+                )
+    return signals
+
+
+async def get_ability_signals(db: AsyncSession) -> dict[int, dict[str, dict]]:
+    """在籍中の全生徒の信号（生徒ID → 能力コード → パーセンタイル・信号色）
+
+    学年内の順位は全生徒のスコアに依存するため、ページングや絞り込みに関わらず全生徒分を計算する。
+    """
+    snapshot = await ability_registry.get(db)
+    rows = await dashboard_repository.get_active_student_ability_totals(db)
+    user_ids, students, scores = build_score_matrix(rows, snapshot)
+    grades = np.array([grade if grade is not None else _NO_GRADE for grade, _ in students])
+
+    signals = compute_signals(user_ids, grades, scores, snapshot)
+    return {
+        user_id: {code: signal.to_dict() for code, signal in by_code.items()}
+        for user_id, by_code in signals.items()
+    }
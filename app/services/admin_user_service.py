@@ -4,11 +4,12 @@ from datetime import datetime
 from typing import Iterable, Optional, Sequence
 
 from fastapi import HTTPException, UploadFile, status
-from sqlalchemy import and_, func, or_, select
+from sqlalchemy import and_, delete, func, or_, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.security import hash_password, now_utc
 from app.models.user import GenderEnum, RoleEnum, User, UserLocalAccount
+from app.repositories import post_repository, student_summary_repository
 from app.schemas.admin_user import (
     BulkResult,
     BulkRowResult,
@@ -239,6 +240,7 @@ async def hard_delete_user(db: AsyncSession, user_id: int) -> None:
     """物理削除（DBから完全に削除）"""
     from app.models.post import Post
     from app.models.post_ability_point import PostAbilityPoint
+    from app.models.post_like import PostLike
     from app.models.thanks_letter import ThanksLetter
     from app.models.thanks_letter_ability_point import ThanksLetterAbilityPoint
     from app.models.user import UserSession, UserGoogleAccount
@@ -261,6 +263,14 @@ async def hard_delete_user(db: AsyncSession, user_id: int) -> None:
     if google_account:
         await db.delete(google_account)
 
+    # 0-3. いいねを削除し、いいねした投稿のいいね数を再計算
+    # （post_likes は ON DELETE CASCADE のため、そのままではいいね数カウンタだけが多く残る）
+    liked_stmt = select(PostLike.post_id).where(PostLike.user_id == user_id)
+    liked_post_ids = list((await db.execute(liked_stmt)).scalars().all())
+    if liked_post_ids:
+        await db.execute(delete(PostLike).where(PostLike.user_id == user_id))
+        await post_repository.rebuild_like_counts(db, liked_post_ids)
+
     # 1. 投稿に紐づく能力ポイントを削除
     posts_stmt = select(Post.id).where(Post.user_id == user_id)
     posts_result = await db.execute(posts_stmt)
@@ -290,6 +300,16 @@ async def hard_delete_user(db: AsyncSession, user_id: int) -> None:
 
     all_letter_ids = list(set(sent_letter_ids + received_letter_ids))
 
+    # 手紙の相手のサマリーも変わるため、相手のユーザーIDを控えておく
+    counterpart_user_ids: set[int] = set()
+    if all_letter_ids:
+        counterpart_stmt = select(ThanksLetter.sender_user_id, ThanksLetter.receiver_user_id).where(
+            ThanksLetter.id.in_(all_letter_ids)
+        )
+        for sender_user_id, receiver_user_id in (await db.execute(counterpart_stmt)).all():
+            counterpart_user_ids.update({sender_user_id, receiver_user_id})
+        counterpart_user_ids.discard(user_id)
+
     if all_letter_ids:
         for letter_id in all_letter_ids:
             ability_points_stmt = select(ThanksLetterAbilityPoint).where(
@@ -305,6 +325,10 @@ async def hard_delete_user(db: AsyncSession, user_id: int) -> None:
             if letter:
                 await db.delete(letter)
 
+    # 2-1. 本人と手紙の相手のサマリーを再計算（本人の行は削除される）
+    await db.flush()
+    await student_summary_repository.refresh_student_summaries(db, [user_id, *counterpart_user_ids])
+
     # 3. ローカルアカウントを削除
     local_account_stmt = select(UserLocalAccount).where(UserLocalAccount.user_id == user_id)
     local_account_result = await db.execute(local_account_stmt)
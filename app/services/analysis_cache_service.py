@@ -0,0 +1,173 @@
+"""能力判定結果のキャッシュ（プロセス内LRU + DB）
+
+同じ投稿の再送信や教師による再判定では、OpenAI APIを呼ばずに前回の結果を返す。
+キーは正規化した課題・本文（NFKC、連続する空白は1つにまとめる）、モデル名、
+プロンプトのバージョン（ルーブリック・判定例を含むシステムプロンプトのハッシュ）のSHA-256。
+1. プロセス内のLRU（同じキーの同時リクエストはAPI呼び出し1回にまとめる）
+2. ability_analysis_cache テーブル（ワーカープロセス間・再起動後も共有）
+3. OpenAI API（エラーになった結果は保存しない）
+"""
+import hashlib
+import json
+import logging
+import unicodedata
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.cache import ResponseCache
+from app.core.config import settings
+from app.repositories import analysis_cache_repository
+
+
+logger = logging.getLogger(__name__)
+
+
+class _AnalysisFailed(Exception):
+    """エラーになった判定結果（キャッシュに保存させないための例外）"""
+
+    def __init__(self, result: dict):
+        super().__init__(result.get("error"))
+        self.result = result
+
+
+def normalize_text(text: str | None) -> str:
+    """キー用の正規化（全角・半角の統一、前後と連続する空白・改行の除去）"""
+    if not text:
+        return ""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+def prompt_version(system_prompt: str) -> str:
+    """プロンプトのバージョン（ルーブリック・判定例を変えると変わる）"""
+    return hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()
+
+
+def cache_key(*, problem: str | None, content: str, model: str, prompt_version: str) -> str:
+    """判定結果のキャッシュキー"""
+    payload = json.dumps(
+        [normalize_text(problem), normalize_text(content), model, prompt_version],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class AnalysisCache:
+    """能力判定結果の2段階キャッシュ（ワーカープロセス単位）"""
+
+    def __init__(self, max_entries: int = 1000):
+        self._memory = ResponseCache(max_entries=max_entries)
+        self._stats = {"requests": 0, "db_hits": 0, "misses": 0, "bypasses": 0, "failures": 0}
+
+    def stats(self) -> dict:
+        """ヒット率と内訳（memory_hits はプロセス内、db_hits はテーブルから返した件数）"""
+        requests = self._stats["requests"]
+        memory_hits = requests - self._stats["db_hits"] - self._stats["misses"]
+        memory = self._memory.stats()
+        return {
+            **self._stats,
+            "memory_hits": memory_hits,
+            "hit_rate": round((memory_hits + self._stats["db_hits"]) / requests, 3) if requests else None,
+            "memory_entries": memory["entries"],
+            "memory_evictions": memory["evictions"],
+        }
+
+    def clear(self) -> None:
+        """プロセス内のエントリと統計を破棄（テーブルの行は残す）"""
+        self._memory.clear()
+        for key in self._stats:
+            self._stats[key] = 0
+
+    async def get_or_analyze(
+        self,
+        key: str,
+        analyze: Callable[[], Awaitable[dict]],
+        *,
+        model: str,
+        prompt_version: str,
+        db: AsyncSession | None = None,
+        use_cache: bool = True,
+    ) -> dict:
+        """キャッシュから判定結果を返し、なければ analyze() を呼んで保存する
+
+        db を渡した場合はテーブルも参照・更新する（リクエストのセッションとは別のセッションで読み書きする）。
+        use_cache=False の場合はキャッシュを読まずに判定し直し、結果で置き換える。
+        """
+        ttl = settings.analysis_cache_ttl_seconds
+        session_factory = async_sessionmaker(db.bind, expire_on_commit=False) if db is not None else None
+
+        async def _analyze_and_save() -> dict:
+            result = await analyze()
+            if "error" in result:
+                self._stats["failures"] += 1
+                raise _AnalysisFailed(result)
+            if session_factory is not None:
+                await self._save(session_factory, key, result, model=model, prompt_version=prompt_version, ttl=ttl)
+            return result
+
+        async def _load() -> dict:
+            if session_factory is not None:
+                cached = await self._find(session_factory, key)
+                if cached is not None:
+                    self._stats["db_hits"] += 1
+                    return cached
+            self._stats["misses"] += 1
+            return await _analyze_and_save()
+
+        try:
+            if not use_cache:
+                self._stats["bypasses"] += 1
+                result = await _analyze_and_save()
+                self._memory.put(key, result)
+                return result
+            self._stats["requests"] += 1
+            return await self._memory.get_or_load(key, _load, ttl=ttl)
+        except _AnalysisFailed as e:
+            return e.result
+
+    async def _find(self, session_factory: async_sessionmaker[AsyncSession], key: str) -> dict | None:
+        # テーブルの障害時もOpenAI APIでの判定は続ける
+        try:
+            async with session_factory() as session:
+                return await analysis_cache_repository.get_analysis(session, key, now=datetime.utcnow())
+        except Exception:
+            logger.exception("Failed to read ability analysis cache")
+            return None
+
+    async def _save(
+        self,
+        session_factory: async_sessionmaker[AsyncSession],
+        key: str,
+        result: dict,
+        *,
+        model: str,
+        prompt_version: str,
+        ttl: int,
+    ) -> None:
+        now = datetime.utcnow()
+        try:
+            async with session_factory() as session:
+                await analysis_cache_repository.save_analysis(
+                    session,
+                    cache_key=key,
+                    model=model,
+                    prompt_version=prompt_version,
+                    result=result,
+                    now=now,
+                    expires_at=now + timedelta(seconds=ttl),
+                )
+                await session.commit()
+        except Exception:
+            logger.exception("Failed to write ability analysis cache")
+
+
+async def purge_expired(db: AsyncSession) -> int:
+    """期限切れの判定結果をテーブルから削除してコミットする"""
+    deleted = await analysis_cache_repository.delete_expired_analyses(db, now=datetime.utcnow())
+    await db.commit()
+    return deleted
+
+
+# グローバルインスタンス
+analysis_cache = AnalysisCache(max_entries=settings.analysis_cache_max_entries)
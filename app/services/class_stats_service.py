@@ -0,0 +1,83 @@
+"""学年・クラス単位のダッシュボード集計
+
+件数（在籍・活動中・介入対象）とフェーズ分布は学年・クラスごとのGROUP BYで集計する。
+能力スコアの平均・中央値・90パーセンタイルはSQLで移植性のある書き方がないため、
+生徒 × 能力 の行列を読み込み、クラスごとにNumPyでまとめて計算する。
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.repositories import dashboard_repository
+from app.services import phase_service
+from app.services.ability_registry_service import ability_registry
+from app.services.ability_signal_service import build_score_matrix
+
+
+# 活動中とみなす最終投稿からの日数
+ACTIVE_DAYS_THRESHOLD = 7
+
+
+def summarize_scores(scores: np.ndarray) -> dict[str, np.ndarray]:
+    """生徒 × 能力 の行列から、能力ごとの平均・中央値・90パーセンタイル"""
+    if scores.shape[0] == 0:
+        empty = np.zeros(scores.shape[1])
+        return {"mean": empty, "median": empty, "p90": empty}
+    return {
+        "mean": scores.mean(axis=0),
+        "median": np.median(scores, axis=0),
+        "p90": np.percentile(scores, 90, axis=0),
+    }
+
+
+async def get_class_stats(
+    db: AsyncSession,
+    *,
+    intervention_days: int,
+    no_post_phase: str,
+    grade: int | None = None,
+) -> list[dict]:
+    """学年・クラスごとの在籍生徒数・活動率・介入対象数・フェーズ分布・能力スコアの統計"""
+    now = datetime.utcnow()
+    counts = await dashboard_repository.get_class_activity_counts(
+        db,
+        active_since=now - timedelta(days=ACTIVE_DAYS_THRESHOLD),
+        intervention_threshold=now - timedelta(days=intervention_days),
+        grade=grade,
+    )
+    phase_counts = await dashboard_repository.get_class_phase_counts(db, grade=grade)
+    snapshot = await ability_registry.get(db)
+    _, students, scores = build_score_matrix(
+        await dashboard_repository.get_active_student_ability_totals(db, grade=grade), snapshot
+    )
+
+    phases: dict[tuple, dict[str, int]] = {}
+    for class_grade, class_name, phase_code, phase_label, count in phase_counts:
+        # 集計はコードで行い、表示名への変換はここでのみ行う
+        label = phase_service.PHASE_LABELS[phase_code] if phase_code else phase_label or no_post_phase
+        phases.setdefault((class_grade, class_name), {})[label] = count
+
+    # クラスごとの行の番号（生徒の並び順）
+    class_rows: dict[tuple, list[int]] = {}
+    for row, key in enumerate(students):
+        class_rows.setdefault(key, []).append(row)
+
+    classes = []
+    for row in counts:
+        key = (row.grade, row.class_name)
+        stats = summarize_scores(scores[class_rows.get(key, [])])
+        classes.append({
+            "grade": row.grade,
+            "class_name": row.class_name,
+            "student_count": row.student_count,
+            "active_count": row.active_count or 0,
+            "active_ratio": round((row.active_count or 0) / row.student_count, 3),
+            "intervention_count": row.intervention_count or 0,
+            "phase_distribution": phases.get(key, {}),
+            "abilities": {
+                ability.code: {name: round(float(values[column]), 1) for name, values in stats.items()}
+                for column, ability in enumerate(snapshot.abilities)
+            },
+        })
+    return classes
@@ -0,0 +1,659 @@
+"""ダッシュボード（管理者・教師用）の集計"""
+import asyncio
+import base64
+import csv
+import io
+import json
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from operator import itemgetter
+from typing import Any, AsyncIterator, Awaitable, Callable
+
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.cache import response_cache
+from app.core.config import settings
+from app.models.post import PhaseCode
+from app.models.user import RoleEnum
+from app.repositories import dashboard_repository, intervention_repository, period_snapshot_repository, post_repository
+from app.services import ability_signal_service, class_stats_service, phase_service
+from app.services.ability_registry_service import ability_registry
+
+
+# 介入フラグの閾値（投稿がない日数）
+INTERVENTION_DAYS_THRESHOLD = 14
+
+# 投稿のない生徒の表示用フェーズ
+NO_POST_PHASE = "未投稿"
+
+# 並び替えに使える列
+LEARNING_PROGRESS_SORTS = ("full_name", "last_posted_at", "post_count", "question_change_count")
+NON_COGNITIVE_ABILITY_SORTS = ("full_name", "post_count", "received_letters_count", "sent_letters_count", "ability")
+ABILITY_GROWTH_SORTS = ("full_name", "post_count")
+OVERVIEW_SORTS = tuple(dict.fromkeys(LEARNING_PROGRESS_SORTS + NON_COGNITIVE_ABILITY_SORTS))
+
+# CSV/NDJSON出力で1回に読み込む行数
+EXPORT_BATCH_SIZE = 500
+
+# 生徒の詳細に含める最近の投稿・受け取った手紙の件数
+STUDENT_DETAIL_RECENT_LIMIT = 20
+
+# キャッシュのタグ（投稿・感謝の手紙 / 生徒名簿）
+ACTIVITY_CACHE_TAG = "dashboard:activity"
+ROSTER_CACHE_TAG = "dashboard:roster"
+
+
+def invalidate_activity_cache() -> None:
+    """投稿・感謝の手紙の書き込み後に、ダッシュボードのキャッシュを破棄する"""
+    response_cache.invalidate_tags(ACTIVITY_CACHE_TAG)
+
+
+def invalidate_roster_cache() -> None:
+    """ユーザーの追加・更新・削除後に、ダッシュボードのキャッシュを破棄する"""
+    response_cache.invalidate_tags(ROSTER_CACHE_TAG)
+
+
+async def get_cached(
+    db: AsyncSession,
+    name: str,
+    role: RoleEnum,
+    compute: Callable[..., Awaitable[Any]],
+    **filters,
+) -> Any:
+    """集計結果をロール・フィルター単位でキャッシュして返す
+
+    再計算はバックグラウンドでも行うため、リクエストのセッションではなく
+    同じ接続先の新しいセッションで compute(session, **filters) を呼び出す。
+    """
+    key = ":".join([name, role.value, *(f"{k}={v}" for k, v in sorted(filters.items()))])
+    return await _get_or_load(db, key, compute, **filters)
+
+
+async def _get_or_load(
+    db: AsyncSession,
+    key: str,
+    compute: Callable[..., Awaitable[Any]],
+    **filters,
+) -> Any:
+    session_factory = async_sessionmaker(db.bind, expire_on_commit=False)
+
+    async def _load() -> Any:
+        async with session_factory() as session:
+            return await compute(session, **filters)
+
+    return await response_cache.get_or_load(
+        key,
+        _load,
+        tags=(ACTIVITY_CACHE_TAG, ROSTER_CACHE_TAG),
+        ttl=settings.dashboard_cache_ttl_seconds,
+        stale_ttl=settings.dashboard_cache_stale_seconds,
+    )
+
+
+async def get_ability_signals(db: AsyncSession) -> dict[int, dict[str, dict]]:
+    """全生徒の学年内パーセンタイル・信号色
+
+    投稿・名簿の更新（キャッシュのタグ）と能力マスターのバージョンが変わるまで使い回す。
+    """
+    snapshot = await ability_registry.get(db)
+    return await _get_or_load(db, f"ability-signals:v{snapshot.version}", ability_signal_service.get_ability_signals)
+
+
+def _needs_intervention(last_posted_at: datetime | None, threshold: datetime) -> bool:
+    """介入フラグの判定（一度も投稿がない、または最終投稿が閾値より前）"""
+    return last_posted_at is None or last_posted_at < threshold
+
+
+@dataclass(frozen=True)
+class StudentListQuery:
+    """ダッシュボードの生徒一覧の絞り込み・並び替え・ページング条件"""
+    grade: int | None = None
+    class_name: str | None = None
+    intervention_flag: bool | None = None
+    # フェーズのコード、または表示用・旧フェーズ名（"未投稿" を含む）
+    phase: str | None = None
+    # 列名、または "ability:<能力コード>"（非認知能力のみ）
+    sort: str = "full_name"
+    descending: bool = False
+    cursor: str | None = None
+    limit: int | None = None
+
+
+def _encode_cursor(sort_value, user_id: int) -> str:
+    """ページ最後の行の (並び替えの値, ユーザーID) からカーソル文字列を生成"""
+    if isinstance(sort_value, datetime):
+        sort_value = sort_value.isoformat()
+    elif isinstance(sort_value, Decimal):
+        sort_value = float(sort_value)
+    raw = json.dumps([sort_value, user_id], ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_cursor(cursor: str, sort: str) -> tuple:
+    try:
+        sort_value, user_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if sort in ("last_posted_at", "flagged_since"):
+            sort_value = datetime.fromisoformat(sort_value)
+        return sort_value, int(user_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _phase_filter(phase: str) -> list[PhaseCode | str | None]:
+    """絞り込みのフェーズを活動サマリーの条件にする（コードに正規化できない名前はそのまま、未投稿はNone）"""
+    if phase == NO_POST_PHASE:
+        return [None]
+    code = phase_service.to_phase_code(phase)
+    return [code] if code else [phase]
+
+
+async def _student_list_options(
+    db: AsyncSession,
+    query: StudentListQuery,
+    *,
+    sorts: tuple[str, ...],
+    intervention_threshold: datetime,
+) -> dict:
+    """絞り込み・並び替え・カーソルの条件を検証し、dashboard_repository に渡す引数にする"""
+    sort = query.sort
+    sort_ability_id = None
+    if sort.startswith("ability:") and "ability" in sorts:
+        code = sort.removeprefix("ability:")
+        sort_ability_id = (await ability_registry.get(db)).code_to_id.get(code)
+        if sort_ability_id is None:
+            raise HTTPException(status_code=400, detail=f"Unknown ability: {code}")
+        sort = "ability"
+    elif sort not in sorts or sort == "ability":
+        raise HTTPException(status_code=400, detail=f"Unsupported sort: {query.sort}")
+
+    return {
+        "grade": query.grade,
+        "class_name": query.class_name,
+        "phases": _phase_filter(query.phase) if query.phase is not None else None,
+        "intervention_threshold": intervention_threshold,
+        "intervention_flag": query.intervention_flag,
+        "sort": sort,
+        "sort_ability_id": sort_ability_id,
+        "descending": query.descending,
+        "after": _decode_cursor(query.cursor, sort) if query.cursor else None,
+        "limit": query.limit,
+    }
+
+
+async def _list_students(
+    db: AsyncSession,
+    query: StudentListQuery,
+    *,
+    sorts: tuple[str, ...],
+    intervention_threshold: datetime,
+) -> tuple[list, str | None]:
+    """条件に合う生徒とサマリーを1ページ分取得し、次ページのカーソルとともに返す"""
+    options = await _student_list_options(
+        db, query, sorts=sorts, intervention_threshold=intervention_threshold
+    )
+    rows = await dashboard_repository.list_active_student_summaries(db, **options)
+
+    next_cursor = None
+    if query.limit is not None and len(rows) == query.limit:
+        next_cursor = _encode_cursor(rows[-1].sort_value, rows[-1].User.id)
+    return rows, next_cursor
+
+
+def _progress_row(student, summary, intervention_threshold: datetime) -> dict:
+    last_posted_at = summary.last_posted_at if summary else None
+    # 活動サマリーには書き込み時に正規化した表示名を保存している
+    display_phase = (summary.latest_phase if summary else None) or NO_POST_PHASE
+
+    return {
+        "user_id": student.id,
+        "full_name": student.full_name,
+        "grade": student.grade,
+        "class_name": student.class_name,
+        "phase": display_phase,
+        "post_count": summary.post_count if summary else 0,
+        "question_change_count": summary.question_change_count if summary else 0,
+        "last_posted_at": last_posted_at.isoformat() if last_posted_at else None,
+        "intervention_flag": _needs_intervention(last_posted_at, intervention_threshold),
+    }
+
+
+def _ability_row(student, summary, user_scores: dict[int, float], abilities, signals: dict) -> dict:
+    return {
+        "user_id": student.id,
+        "full_name": student.full_name,
+        "grade": student.grade,
+        "class_name": student.class_name,
+        "post_count": summary.post_count if summary else 0,
+        "received_letters_count": summary.letters_received_count if summary else 0,
+        "sent_letters_count": summary.letters_sent_count if summary else 0,
+        "abilities": {
+            ability.code: round(user_scores.get(ability.id, 0.0), 1)
+            for ability in abilities
+        },
+        "signals": signals,
+    }
+
+
+async def get_learning_progress(
+    db: AsyncSession, query: StudentListQuery = StudentListQuery()
+) -> tuple[list[dict], str | None]:
+    """探求学習の進捗状況（生徒ごと）と次ページのカーソル
+
+    絞り込み・並び替え・ページングを含め、活動サマリーを生徒一覧と結合して1文で取得する。
+    """
+    # 介入判定用の閾値日時（現在から2週間前）
+    intervention_threshold = datetime.utcnow() - timedelta(days=INTERVENTION_DAYS_THRESHOLD)
+
+    rows, next_cursor = await _list_students(
+        db,
+        query,
+        sorts=LEARNING_PROGRESS_SORTS,
+        intervention_threshold=intervention_threshold,
+    )
+    progress_data = [
+        _progress_row(student, summary, intervention_threshold) for student, summary, _ in rows
+    ]
+    return progress_data, next_cursor
+
+
+async def get_non_cognitive_abilities(
+    db: AsyncSession, query: StudentListQuery = StudentListQuery()
+) -> tuple[list[dict], str | None]:
+    """非認知能力データ（生徒ごと）と次ページのカーソル
+
+    活動サマリーと、ページ内の生徒の能力サマリーの2文で取得し、
+    能力ごとの辞書への展開はメモリ上で行う。
+    signals（学年内パーセンタイル・信号色）は全生徒分をまとめて計算し、キャッシュしたものを使う。
+    """
+    intervention_threshold = datetime.utcnow() - timedelta(days=INTERVENTION_DAYS_THRESHOLD)
+    rows, next_cursor = await _list_students(
+        db,
+        query,
+        sorts=NON_COGNITIVE_ABILITY_SORTS,
+        intervention_threshold=intervention_threshold,
+    )
+    scores = await dashboard_repository.get_ability_scores_by_student(db, [row.User.id for row in rows])
+    all_abilities = (await ability_registry.get(db)).abilities
+    signals = await get_ability_signals(db)
+
+    ability_data = [
+        _ability_row(student, summary, scores.get(student.id, {}), all_abilities, signals.get(student.id, {}))
+        for student, summary, _ in rows
+    ]
+    return ability_data, next_cursor
+
+
+async def get_overview(
+    db: AsyncSession, query: StudentListQuery = StudentListQuery()
+) -> tuple[dict, str | None]:
+    """教師のホーム画面用に、進捗状況と非認知能力データを同じ生徒一覧から返す
+
+    生徒一覧（活動サマリーとの結合）は両方に共通の1文で取得する。
+    全生徒の信号（キャッシュ済みでなければ全生徒の能力スコアの1文）は生徒一覧と独立しているため、
+    接続プールの別の接続で同時に実行する。ページ内の生徒の能力スコアは生徒一覧の後に1文で取得する。
+    """
+    intervention_threshold = datetime.utcnow() - timedelta(days=INTERVENTION_DAYS_THRESHOLD)
+    options = await _student_list_options(
+        db, query, sorts=OVERVIEW_SORTS, intervention_threshold=intervention_threshold
+    )
+    session_factory = async_sessionmaker(db.bind, expire_on_commit=False)
+
+    async def _load_students() -> list:
+        async with session_factory() as session:
+            return await dashboard_repository.list_active_student_summaries(session, **options)
+
+    rows, signals = await asyncio.gather(_load_students(), get_ability_signals(db))
+    scores = await dashboard_repository.get_ability_scores_by_student(db, [row.User.id for row in rows])
+    all_abilities = (await ability_registry.get(db)).abilities
+
+    next_cursor = None
+    if query.limit is not None and len(rows) == query.limit:
+        next_cursor = _encode_cursor(rows[-1].sort_value, rows[-1].User.id)
+
+    overview = {
+        "learning_progress": [
+            _progress_row(student, summary, intervention_threshold) for student, summary, _ in rows
+        ],
+        "non_cognitive_abilities": [
+            _ability_row(student, summary, scores.get(student.id, {}), all_abilities, signals.get(student.id, {}))
+            for student, summary, _ in rows
+        ],
+    }
+    return overview, next_cursor
+
+
+def _csv_line(values: list) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(["" if value is None else value for value in values])
+    return buffer.getvalue()
+
+
+def _format_rows(rows: list[dict], export_format: str, columns: list[tuple[str, Callable[[dict], Any]]]) -> str:
+    if export_format == "ndjson":
+        return "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+    return "".join(_csv_line([value(row) for _, value in columns]) for row in rows)
+
+
+async def _stream_students(
+    db: AsyncSession,
+    options: dict,
+    export_format: str,
+    columns: list[tuple[str, Callable[[dict], Any]]],
+    to_rows: Callable[[AsyncSession, list], Awaitable[list[dict]]],
+) -> AsyncIterator[str]:
+    """生徒一覧をサーバーサイドカーソルで EXPORT_BATCH_SIZE 行ずつ読み、整形して返す
+
+    ストリーミング中はリクエストのセッションが閉じられる可能性があるため、同じ接続先の新しいセッションを使う。
+    カーソルを開いている接続では他の文を実行できないため、行ごとの追加の取得（to_rows）は別のセッションで行う。
+    """
+    session_factory = async_sessionmaker(db.bind, expire_on_commit=False)
+    if export_format == "csv":
+        # Excelで文字化けしないようBOMを付ける
+        yield "\ufeff" + _csv_line([name for name, _ in columns])
+
+    async with session_factory() as stream_session, session_factory() as lookup_session:
+        stmt = dashboard_repository.active_student_summaries_query(**options)
+        result = await stream_session.stream(stmt.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        async for partition in result.partitions():
+            yield _format_rows(await to_rows(lookup_session, partition), export_format, columns)
+
+
+async def export_learning_progress(
+    db: AsyncSession, query: StudentListQuery, export_format: str
+) -> AsyncIterator[str]:
+    """探求学習の進捗状況をCSV/NDJSONで少しずつ返すイテレーター
+
+    条件の検証（不正な並び替え・カーソルは400）はレスポンスの送信前に行う。
+    """
+    intervention_threshold = datetime.utcnow() - timedelta(days=INTERVENTION_DAYS_THRESHOLD)
+    options = await _student_list_options(
+        db, query, sorts=LEARNING_PROGRESS_SORTS, intervention_threshold=intervention_threshold
+    )
+    columns = [(name, itemgetter(name)) for name in (
+        "user_id", "full_name", "grade", "class_name", "phase", "post_count",
+        "question_change_count", "last_posted_at", "intervention_flag",
+    )]
+
+    async def _to_rows(_: AsyncSession, rows: list) -> list[dict]:
+        return [_progress_row(student, summary, intervention_threshold) for student, summary, _ in rows]
+
+    return _stream_students(db, options, export_format, columns, _to_rows)
+
+
+async def export_non_cognitive_abilities(
+    db: AsyncSession, query: StudentListQuery, export_format: str
+) -> AsyncIterator[str]:
+    """非認知能力データをCSV/NDJSONで少しずつ返すイテレーター
+
+    能力スコアはバッチごとに1文で取得する。CSVでは能力ごとにスコアと信号色の列を並べる。
+    """
+    intervention_threshold = datetime.utcnow() - timedelta(days=INTERVENTION_DAYS_THRESHOLD)
+    options = await _student_list_options(
+        db, query, sorts=NON_COGNITIVE_ABILITY_SORTS, intervention_threshold=intervention_threshold
+    )
+    all_abilities = (await ability_registry.get(db)).abilities
+    signals = await get_ability_signals(db)
+
+    columns = [(name, itemgetter(name)) for name in (
+        "user_id", "full_name", "grade", "class_name", "post_count", "received_letters_count", "sent_letters_count",
+    )]
+    for ability in all_abilities:
+        columns.append((ability.code, lambda row, code=ability.code: row["abilities"][code]))
+        columns.append((
+            f"{ability.code}_signal",
+            lambda row, code=ability.code: row["signals"].get(code, {}).get("signal_color"),
+        ))
+
+    async def _to_rows(lookup_session: AsyncSession, rows: list) -> list[dict]:
+        scores = await dashboard_repository.get_ability_scores_by_student(
+            lookup_session, [row.User.id for row in rows]
+        )
+        return [
+            _ability_row(student, summary, scores.get(student.id, {}), all_abilities, signals.get(student.id, {}))
+            for student, summary, _ in rows
+        ]
+
+    return _stream_students(db, options, export_format, columns, _to_rows)
+
+
+async def get_class_stats(db: AsyncSession, grade: int | None = None) -> list[dict]:
+    """学年・クラスごとの集計（在籍生徒数・活動率・介入対象数・フェーズ分布・能力スコアの統計）"""
+    return await class_stats_service.get_class_stats(
+        db,
+        intervention_days=INTERVENTION_DAYS_THRESHOLD,
+        no_post_phase=NO_POST_PHASE,
+        grade=grade,
+    )
+
+
+async def get_flagged_students(
+    db: AsyncSession, query: StudentListQuery = StudentListQuery()
+) -> tuple[list[dict], str | None]:
+    """介入フラグ付きの生徒（フラグが付いた順）と次ページのカーソル
+
+    定期スキャンで記録した student_intervention_flags を読むため、全生徒の集計は行わない。
+    学年・クラスによる絞り込みとページングのみ対応する。
+    """
+    posted_since = datetime.utcnow() - timedelta(days=INTERVENTION_DAYS_THRESHOLD)
+    rows = await intervention_repository.list_flagged_students(
+        db,
+        posted_since=posted_since,
+        grade=query.grade,
+        class_name=query.class_name,
+        after=_decode_cursor(query.cursor, "flagged_since") if query.cursor else None,
+        limit=query.limit,
+    )
+
+    next_cursor = None
+    if query.limit is not None and len(rows) == query.limit:
+        last_flag = rows[-1].StudentInterventionFlag
+        next_cursor = _encode_cursor(last_flag.flagged_since, last_flag.user_id)
+
+    flagged = [
+        {
+            "user_id": student.id,
+            "full_name": student.full_name,
+            "grade": student.grade,
+            "class_name": student.class_name,
+            "flagged_since": flag.flagged_since.isoformat(),
+            "last_posted_at": flag.last_posted_at.isoformat() if flag.last_posted_at else None,
+            "scanned_at": flag.scanned_at.isoformat(),
+        }
+        for student, flag in rows
+    ]
+    return flagged, next_cursor
+
+
+async def get_student_detail(db: AsyncSession, user_id: int) -> dict:
+    """生徒の詳細（最近の投稿と能力コード・受け取った手紙と能力ポイント・フェーズの推移・能力ごとの累計）
+
+    活動サマリーの更新日時と投稿の件数・最終更新日時・いいね数の合計をデータのバージョンとしてキーに含め、
+    キャッシュは他のワーカープロセスでの書き込み後も古い内容を返さない。
+    キャッシュ済みであれば、バージョンの確認の1文のみで返す。
+    """
+    version = await dashboard_repository.get_student_data_version(db, user_id)
+    if version is None:
+        raise HTTPException(status_code=404, detail="生徒が見つかりません")
+    parts = (value.isoformat() if isinstance(value, datetime) else str(value) for value in version)
+    key = f"student:{user_id}:v{':'.join(parts)}"
+    return await _get_or_load(db, key, _load_student_detail, user_id=user_id)
+
+
+async def _load_student_detail(db: AsyncSession, user_id: int) -> dict:
+    """生徒の詳細を固定数の文で取得（投稿・手紙の能力はそれぞれIN 1文）"""
+    row = await dashboard_repository.get_student_with_summary(db, user_id)
+    if row is None:
+        raise HTTPException(status_code=404, detail="生徒が見つかりません")
+    student, summary = row
+    snapshot = await ability_registry.get(db)
+
+    posts = await dashboard_repository.get_recent_posts(db, user_id, limit=STUDENT_DETAIL_RECENT_LIMIT)
+    post_abilities = await post_repository.get_ability_ids_by_post(db, [post.id for post in posts])
+    letters = await dashboard_repository.get_received_letters(db, user_id, limit=STUDENT_DETAIL_RECENT_LIMIT)
+    letter_points = await dashboard_repository.get_letter_ability_points(db, [letter.id for letter, _ in letters])
+    phase_rows = await dashboard_repository.get_phase_timeline(db, user_id)
+    scores = (await dashboard_repository.get_ability_scores_by_student(db, [user_id])).get(user_id, {})
+
+    def _codes(ability_ids) -> list[str]:
+        return [snapshot.id_to_code[ability_id] for ability_id in ability_ids if ability_id in snapshot.id_to_code]
+
+    # 表記ゆれのあるフェーズ名は表示名ごとにまとめる
+    timeline: dict[str, dict] = {}
+    for phase_code, phase_label, post_count, first_posted_at, last_posted_at in phase_rows:
+        # phase_code の補完前の投稿はフェーズ名から正規化する
+        phase_code = phase_code or phase_service.to_phase_code(phase_label)
+        label = phase_service.display_label(phase_label, phase_code)
+        entry = timeline.setdefault(label, {
+            "phase": label,
+            "phase_code": phase_code.value if phase_code else None,
+            "post_count": 0,
+            "first_posted_at": first_posted_at,
+            "last_posted_at": last_posted_at,
+        })
+        entry["post_count"] += post_count
+        entry["first_posted_at"] = min(entry["first_posted_at"], first_posted_at)
+        entry["last_posted_at"] = max(entry["last_posted_at"], last_posted_at)
+    phase_timeline = [
+        {
+            **entry,
+            "first_posted_at": entry["first_posted_at"].isoformat(),
+            "last_posted_at": entry["last_posted_at"].isoformat(),
+        }
+        for entry in sorted(timeline.values(), key=itemgetter("first_posted_at"))
+    ]
+
+    intervention_threshold = datetime.utcnow() - timedelta(days=INTERVENTION_DAYS_THRESHOLD)
+    progress = _progress_row(student, summary, intervention_threshold)
+    return {
+        "user_id": student.id,
+        "full_name": student.full_name,
+        "grade": student.grade,
+        "class_name": student.class_name,
+        "summary": {
+            "phase": progress["phase"],
+            "post_count": progress["post_count"],
+            "question_change_count": progress["question_change_count"],
+            "last_posted_at": progress["last_posted_at"],
+            "intervention_flag": progress["intervention_flag"],
+            "received_letters_count": summary.letters_received_count if summary else 0,
+            "sent_letters_count": summary.letters_sent_count if summary else 0,
+        },
+        "recent_posts": [
+            {
+                "id": post.id,
+                "problem": post.problem,
+                "content_1": post.content_1,
+                "phase_label": post.phase_label,
+                "phase_code": post.phase_code.value if post.phase_code else None,
+                "question_state_change_type": post.question_state_change_type.value,
+                "like_count": post.like_count,
+                "created_at": post.created_at.isoformat(),
+                "ability_codes": _codes(post_abilities.get(post.id, [])),
+            }
+            for post in posts
+        ],
+        "received_letters": [
+            {
+                "id": letter.id,
+                "sender_user_id": letter.sender_user_id,
+                "sender_name": sender_name,
+                "content_1": letter.content_1,
+                "created_at": letter.created_at.isoformat(),
+                "abilities": {
+                    snapshot.id_to_code[ability_id]: round(points, 1)
+                    for ability_id, points in letter_points.get(letter.id, {}).items()
+                    if ability_id in snapshot.id_to_code
+                },
+            }
+            for letter, sender_name in letters
+        ],
+        "phase_timeline": phase_timeline,
+        "abilities": {
+            ability.code: round(scores.get(ability.id, 0.0), 1)
+            for ability in snapshot.abilities
+        },
+    }
+
+
+async def _resolve_period(db: AsyncSession, period_id: int, today: date) -> tuple[dict, bool]:
+    """評価期間の情報と、現在の累計（スナップショットではなく活動サマリー）を使うかどうか"""
+    period = await period_snapshot_repository.get_period(db, period_id)
+    if period is None:
+        raise HTTPException(status_code=404, detail="評価期間が見つかりません")
+    if period.start_date > today:
+        raise HTTPException(status_code=400, detail="開始前の評価期間は指定できません")
+
+    live = period.end_date >= today
+    if not live and not await period_snapshot_repository.has_snapshot(db, period.id):
+        raise HTTPException(status_code=409, detail=f"評価期間（{period.name}）のスナップショットがありません")
+    info = {
+        "id": period.id,
+        "name": period.name,
+        "start_date": period.start_date.isoformat(),
+        "end_date": period.end_date.isoformat(),
+        "live": live,
+    }
+    return info, live
+
+
+async def get_ability_growth(
+    db: AsyncSession,
+    from_period_id: int,
+    to_period_id: int | None = None,
+    query: StudentListQuery = StudentListQuery(),
+) -> tuple[dict, str | None]:
+    """評価期間の間の成長（投稿数・能力ポイントの差分）と次ページのカーソル
+
+    終了した期間はスナップショット（period_ability_snapshots）、実施中の期間と
+    to_period_id 未指定時は書き込み時に差分更新している活動サマリーの累計を使う。
+    """
+    today = datetime.utcnow().date()
+    from_info, from_live = await _resolve_period(db, from_period_id, today)
+    if from_live:
+        raise HTTPException(status_code=400, detail="比較元には終了した評価期間を指定してください")
+    if to_period_id is None:
+        to_info, to_live = None, True
+    else:
+        to_info, to_live = await _resolve_period(db, to_period_id, today)
+
+    intervention_threshold = datetime.utcnow() - timedelta(days=INTERVENTION_DAYS_THRESHOLD)
+    rows, next_cursor = await _list_students(
+        db,
+        query,
+        sorts=ABILITY_GROWTH_SORTS,
+        intervention_threshold=intervention_threshold,
+    )
+    user_ids = [row.User.id for row in rows]
+    before = await period_snapshot_repository.get_snapshot_totals(db, from_period_id, user_ids)
+    if to_live:
+        after = await period_snapshot_repository.get_live_totals(db, user_ids)
+    else:
+        after = await period_snapshot_repository.get_snapshot_totals(db, to_period_id, user_ids)
+    all_abilities = (await ability_registry.get(db)).abilities
+
+    def _change(old: float, new: float) -> dict:
+        return {"from": old, "to": new, "delta": round(new - old, 1)}
+
+    students = []
+    for student, _, _ in rows:
+        # スナップショット作成後に登録された生徒は、比較元を0とする
+        old = before.get(student.id, {"post_count": 0, "abilities": {}})
+        new = after.get(student.id, {"post_count": 0, "abilities": {}})
+        students.append({
+            "user_id": student.id,
+            "full_name": student.full_name,
+            "grade": student.grade,
+            "class_name": student.class_name,
+            "post_count": _change(old["post_count"], new["post_count"]),
+            "abilities": {
+                ability.code: _change(
+                    round(old["abilities"].get(ability.id, 0.0), 1),
+                    round(new["abilities"].get(ability.id, 0.0), 1),
+                )
+                for ability in all_abilities
+            },
+        })
+
+    return {"from_period": from_info, "to_period": to_info, "students": students}, next_cursor
@@ -0,0 +1,94 @@
+"""介入フラグの定期スキャン
+
+INTERVENTION_SCAN_INTERVAL_SECONDS ごとに全生徒の最終投稿日時を1文で集計し、
+student_intervention_flags を更新する。ダッシュボードの介入対象一覧はこのテーブルだけを読む。
+INTERVENTION_SCAN_ENABLED=false の場合は起動しない（管理者APIからの手動スキャンは可能）。
+複数のワーカープロセスで起動しても、MySQLの名前付きロックを保持する1プロセスだけがスキャンする。
+担当のプロセスが停止すると（接続が閉じてロックが解放され）、次の間隔で他のプロセスが引き継ぐ。
+"""
+import asyncio
+import logging
+from datetime import datetime
+
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession, async_sessionmaker
+
+from app.core.config import settings
+from app.repositories import intervention_repository
+from app.services.dashboard_service import INTERVENTION_DAYS_THRESHOLD
+
+
+logger = logging.getLogger(__name__)
+
+
+async def scan(db: AsyncSession) -> dict:
+    """介入フラグを再計算してコミットする"""
+    result = await intervention_repository.scan_intervention_flags(
+        db, threshold_days=INTERVENTION_DAYS_THRESHOLD, now=datetime.utcnow()
+    )
+    await db.commit()
+    return result
+
+
+class InterventionScanner:
+    """介入フラグの定期スキャン（ワーカープロセス単位）"""
+
+    def __init__(self):
+        self._session_factory: async_sessionmaker[AsyncSession] | None = None
+        self._stopping: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        # スキャンの担当を表すロックを保持する接続
+        self._lock_conn: AsyncConnection | None = None
+
+    def start(self, session_factory: async_sessionmaker[AsyncSession]) -> None:
+        """定期スキャンのバックグラウンドタスクを開始（起動直後に1回スキャンする）"""
+        self._session_factory = session_factory
+        # 同期プリミティブは実行中のイベントループ上で生成する
+        self._stopping = asyncio.Event()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """バックグラウンドタスクを止める（実行中のスキャンは完了を待つ）"""
+        if self._task is not None:
+            self._stopping.set()
+            await self._task
+            self._task = None
+        await self._release_lock()
+
+    async def _is_leader(self) -> bool:
+        """このプロセスがスキャンを担当するか（ロックを取得できなければ次の間隔で再試行する）"""
+        try:
+            if self._lock_conn is None:
+                self._lock_conn = await self._session_factory.kw["bind"].connect()
+            return await intervention_repository.acquire_scan_lock(self._lock_conn)
+        except Exception:
+            logger.exception("Failed to acquire intervention scan lock; retrying at next interval")
+            await self._release_lock()
+            return False
+
+    async def _release_lock(self) -> None:
+        if self._lock_conn is not None:
+            try:
+                await self._lock_conn.close()
+            except Exception:
+                logger.exception("Failed to close intervention scan lock connection")
+            self._lock_conn = None
+
+    async def _run(self) -> None:
+        interval = settings.intervention_scan_interval_seconds
+        while not self._stopping.is_set():
+            if await self._is_leader():
+                try:
+                    async with self._session_factory() as db:
+                        result = await scan(db)
+                    logger.info("Intervention scan: %d flagged, %d cleared", result["flagged"], result["cleared"])
+                except Exception:
+                    logger.exception("Intervention scan failed; retrying at next interval")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+
+
+# グローバルインスタンス
+intervention_scanner = InterventionScanner()
@@ -0,0 +1,204 @@
+"""いいねの書き込み遅延（write-behind）バッファ
+
+集会などで人気投稿にいいねが集中した場合に、いいね/取り消しの意図をワーカープロセスの
+メモリに溜め、一定間隔または件数閾値でpost_likesへまとめて書き込む。
+LIKE_WRITE_BEHIND_ENABLED=true のときのみ有効（既定は即時書き込み）。
+
+投稿の一覧・詳細・一括取得は、このワーカープロセスのバッファ上の意図をいいね数・いいね有無に反映する。
+他のワーカープロセスで記録された意図は、そのプロセスのフラッシュまで反映されない。
+削除された投稿・ユーザーへの意図（外部キー違反）は、ログに記録して破棄する。
+"""
+import asyncio
+import logging
+from datetime import datetime
+
+from sqlalchemy import delete, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.config import settings
+from app.core.database import insert_ignore
+from app.models.post_like import PostLike
+from app.repositories import post_repository
+
+
+logger = logging.getLogger(__name__)
+
+# (post_id, user_id) -> (DB上の状態, 目標の状態, 意図の発生日時)
+_Intent = tuple[bool, bool, datetime]
+
+
+class LikeWriteBuffer:
+    """いいね/取り消しの意図をまとめてpost_likesへ書き込むバッファ（ワーカープロセス単位）
+
+    同じ (post_id, user_id) への連続した操作は最後の意図にまとめる。
+    書き込みに失敗した意図はバッファに戻し、次回のフラッシュで再試行する。
+    停止時（シャットダウン時）は残っている意図をすべて書き込んでから終了する。
+    """
+
+    def __init__(self):
+        self._session_factory: async_sessionmaker[AsyncSession] | None = None
+        self._pending: dict[tuple[int, int], _Intent] = {}
+        self._in_flight: dict[tuple[int, int], _Intent] = {}
+        self._flush_lock: asyncio.Lock | None = None
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self._closing = False
+
+    @property
+    def pending_count(self) -> int:
+        """未書き込みの意図の件数"""
+        return len(self._pending) + len(self._in_flight)
+
+    def start(self, session_factory: async_sessionmaker[AsyncSession]) -> None:
+        """定期フラッシュのバックグラウンドタスクを開始"""
+        self._session_factory = session_factory
+        self._closing = False
+        # 同期プリミティブは実行中のイベントループ上で生成する
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """バックグラウンドタスクを止め、残っている意図をすべて書き込む"""
+        self._closing = True
+        if self._task is not None:
+            self._wakeup.set()
+            await self._task
+            self._task = None
+
+        # 書き込みに失敗し続けた場合でも数回は再試行する
+        for _ in range(3):
+            if not self._pending:
+                break
+            await self.flush()
+        if self._pending:
+            logger.error("Like buffer stopped with %d unwritten intents", len(self._pending))
+
+    def is_liked(self, post_id: int, user_id: int, db_liked: bool) -> bool:
+        """バッファ上の意図を反映した、ユーザーのいいね状態"""
+        key = (post_id, user_id)
+        intent = self._pending.get(key) or self._in_flight.get(key)
+        return intent[1] if intent else db_liked
+
+    def pending_delta(self, post_id: int) -> int:
+        """まだDBに反映されていない、投稿のいいね数の増減"""
+        return self.pending_deltas([post_id]).get(post_id, 0)
+
+    def pending_deltas(self, post_ids: list[int]) -> dict[int, int]:
+        """まだDBに反映されていない、投稿ごとのいいね数の増減（増減のない投稿は含めない）"""
+        if not self._pending and not self._in_flight:
+            return {}
+        targets = set(post_ids)
+        deltas: dict[int, int] = {}
+        for intents in (self._in_flight, self._pending):
+            for (post_id, _), (base, liked, _) in intents.items():
+                if post_id in targets:
+                    deltas[post_id] = deltas.get(post_id, 0) + int(liked) - int(base)
+        return {post_id: delta for post_id, delta in deltas.items() if delta}
+
+    def record(self, post_id: int, user_id: int, liked: bool, db_liked: bool) -> None:
+        """いいね(liked=True)/取り消し(liked=False)の意図を記録する"""
+        key = (post_id, user_id)
+        if key in self._pending:
+            base = self._pending[key][0]
+        elif key in self._in_flight:
+            # 書き込み中の意図が反映された後の状態を起点にする
+            base = self._in_flight[key][1]
+        else:
+            base = db_liked
+
+        if liked == base:
+            # 元の状態に戻っただけなら書き込む必要はない
+            self._pending.pop(key, None)
+        else:
+            self._pending[key] = (base, liked, datetime.utcnow())
+
+        if self._wakeup is not None and len(self._pending) >= settings.like_flush_max_batch:
+            self._wakeup.set()
+
+    async def flush(self) -> None:
+        """溜まっている意図をpost_likesへまとめて書き込む"""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            if not self._pending or self._session_factory is None:
+                return
+
+            self._in_flight, self._pending = self._pending, {}
+            try:
+                await self._write(self._in_flight)
+            except IntegrityError:
+                # 削除された投稿・ユーザーへの意図が1件でもあるとまとめた書き込み全体が失敗するため、1件ずつ書き込む
+                await self._write_each(self._in_flight)
+            except Exception:
+                logger.exception("Failed to flush %d like intents; retrying later", len(self._in_flight))
+                self._requeue(self._in_flight)
+            finally:
+                self._in_flight = {}
+
+    async def _write(self, intents: dict[tuple[int, int], _Intent]) -> None:
+        likes = [
+            {"post_id": post_id, "user_id": user_id, "created_at": created_at}
+            for (post_id, user_id), (_, liked, created_at) in intents.items()
+            if liked
+        ]
+        unlikes = [key for key, (_, liked, _) in intents.items() if not liked]
+        post_ids = sorted({post_id for post_id, _ in intents})
+
+        batch_size = settings.like_flush_max_batch
+        async with self._session_factory() as db:
+            # 複数行INSERT / DELETEでまとめて書き込む（1文あたりの行数は閾値まで）
+            for i in range(0, len(likes), batch_size):
+                await db.execute(insert_ignore(db, PostLike).values(likes[i:i + batch_size]))
+            for i in range(0, len(unlikes), batch_size):
+                batch = unlikes[i:i + batch_size]
+                await db.execute(
+                    delete(PostLike).where(tuple_(PostLike.post_id, PostLike.user_id).in_(batch))
+                )
+            # 書き込んだ投稿のいいね数カウンタをpost_likesから再計算する
+            await post_repository.rebuild_like_counts(db, post_ids)
+            await db.commit()
+
+    async def _write_each(self, intents: dict[tuple[int, int], _Intent]) -> None:
+        """意図を1件ずつ書き込み、外部キー違反の意図は破棄する（その他の失敗はバッファに戻す）"""
+        failed: dict[tuple[int, int], _Intent] = {}
+        for key, intent in intents.items():
+            if failed:
+                # DBに書き込めなくなった後の意図は、次回のフラッシュで再試行する
+                failed[key] = intent
+                continue
+            try:
+                await self._write({key: intent})
+            except IntegrityError:
+                logger.warning("Dropping like intent for a deleted post or user (post_id=%d, user_id=%d)", *key)
+            except Exception:
+                logger.exception("Failed to flush like intent; retrying later")
+                failed[key] = intent
+        self._requeue(failed)
+
+    def _requeue(self, intents: dict[tuple[int, int], _Intent]) -> None:
+        """書き込めなかった意図をバッファに戻す（その後に届いた意図を優先）"""
+        for key, (base, liked, created_at) in intents.items():
+            newer = self._pending.get(key)
+            if newer is None:
+                self._pending[key] = (base, liked, created_at)
+            elif newer[1] == base:
+                del self._pending[key]
+            else:
+                self._pending[key] = (base, newer[1], newer[2])
+
+    async def _run(self) -> None:
+        interval = settings.like_flush_interval_ms / 1000
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+
+# グローバルインスタンス
+like_write_buffer = LikeWriteBuffer()
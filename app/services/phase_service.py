@@ -0,0 +1,43 @@
+"""探究のフェーズの正規化
+
+posts.phase_label には旧英語名（2種類）と日本語名が混在しているため、
+投稿の作成・更新時に正規化したコード（posts.phase_code）も保存する。
+集計・絞り込みはコードで行い、表示名への変換はここにまとめる。
+"""
+from app.models.post import PhaseCode
+
+
+# コード → 表示名
+PHASE_LABELS: dict[PhaseCode, str] = {
+    PhaseCode.theme_setting: "テーマ設定",
+    PhaseCode.problem_setting: "課題設定",
+    PhaseCode.information_gathering: "情報収集",
+    PhaseCode.analysis: "整理・分析",
+    PhaseCode.summary: "まとめ・表現",
+    PhaseCode.presentation: "発表準備",
+}
+
+# phase_label の値 → コード
+_PHASE_ALIASES: dict[str, PhaseCode] = {
+    # 旧英語フェーズ名
+    **{code.value: code for code in PhaseCode},
+    # 別の旧英語フェーズ名
+    "planning": PhaseCode.problem_setting,
+    "execution": PhaseCode.information_gathering,
+    "verification": PhaseCode.analysis,
+    # 日本語
+    **{label: code for code, label in PHASE_LABELS.items()},
+}
+
+
+def to_phase_code(phase_label: str | None) -> PhaseCode | None:
+    """phase_label を正規化したコード（該当するフェーズがない場合はNone）"""
+    if phase_label is None:
+        return None
+    return _PHASE_ALIASES.get(phase_label.strip())
+
+
+def display_label(phase_label: str, phase_code: PhaseCode | None = None) -> str:
+    """表示用のフェーズ名（該当するフェーズがない場合は phase_label をそのまま返す）"""
+    code = phase_code or to_phase_code(phase_label)
+    return PHASE_LABELS[code] if code else phase_label
@@ -0,0 +1,234 @@
+"""投稿のAI判定（非同期のジョブ）
+
+投稿の作成・本文の更新では post_analysis_jobs にジョブを登録するだけにし、OpenAI APIの呼び出しは
+リクエストの外で行う。ワーカー（ワーカープロセス単位のasyncioタスク）は最大
+POST_ANALYSIS_CONCURRENCY 件のジョブを同時に実行し、判定結果を posts.ai_raw_label に保存して、
+判定した能力を post_ability_points（source=analysis、ポイントはルーブリックの係数）に反映する。
+失敗したジョブは指数バックオフで再試行し、POST_ANALYSIS_MAX_ATTEMPTS 回失敗すると failed にする。
+ジョブはテーブルに残るため、再起動や停止したワーカーのジョブ（ロックの期限切れ）も再実行される。
+"""
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.config import settings
+from app.repositories import (
+    ability_point_repository,
+    post_analysis_job_repository,
+    post_repository,
+    student_summary_repository,
+)
+from app.services import dashboard_service
+from app.services.ability_analyzer_service import ability_analyzer_service
+from app.services.ability_registry_service import AbilitySnapshot, ability_registry
+
+
+logger = logging.getLogger(__name__)
+
+# 再試行の待ち時間の上限（秒）
+_MAX_RETRY_DELAY_SECONDS = 3600
+
+
+class PostAnalysisError(Exception):
+    """判定に失敗した（再試行する）"""
+
+
+@dataclass(frozen=True)
+class ClaimedJob:
+    """取り出した判定ジョブ"""
+    post_id: int
+    version: int
+    attempts: int
+    claim_token: str
+
+
+def retry_delay(attempts: int) -> timedelta:
+    """attempts 回目の失敗後、次に実行するまでの待ち時間（指数バックオフ）"""
+    seconds = settings.post_analysis_retry_base_seconds * 2 ** max(attempts - 1, 0)
+    return timedelta(seconds=min(seconds, _MAX_RETRY_DELAY_SECONDS))
+
+
+def derive_ability_points(result: dict, snapshot: AbilitySnapshot) -> list[tuple[int, int, float]]:
+    """判定結果から (ability_id, レベル, ポイント) を導く（ポイントはレベルのルーブリックの係数、なければ1.0）"""
+    abilities = {}
+    for matched in result.get("matched_abilities", []):
+        ability_id = snapshot.code_to_id.get(matched.get("code"))
+        if ability_id is None or ability_id in abilities:
+            continue
+        level = matched.get("level", 1)
+        coefficient = next(
+            (rubric.coefficient for rubric in snapshot.rubrics.get(ability_id, ()) if rubric.level == level),
+            1.0,
+        )
+        abilities[ability_id] = (ability_id, level, coefficient)
+    return list(abilities.values())
+
+
+async def claim_jobs(session_factory: async_sessionmaker[AsyncSession], limit: int) -> list[ClaimedJob]:
+    """ロックの期限切れのジョブを戻してから、実行できるジョブを最大 limit 件取り出す"""
+    now = datetime.utcnow()
+    async with session_factory() as db:
+        released = await post_analysis_job_repository.release_stale_jobs(
+            db, locked_before=now - timedelta(seconds=settings.post_analysis_lock_timeout_seconds), now=now
+        )
+        if released:
+            logger.warning("Released %d stale post analysis jobs", released)
+        rows = await post_analysis_job_repository.claim_due_jobs(db, now=now, limit=limit)
+        await db.commit()
+    return [ClaimedJob(post_id=row.post_id, version=row.version, attempts=row.attempts, claim_token=row.claim_token) for row in rows]
+
+
+async def run_job(session_factory: async_sessionmaker[AsyncSession], job: ClaimedJob) -> bool:
+    """ジョブを実行し、結果（完了 / 再試行・失敗）を記録する（完了した場合True）"""
+    try:
+        user_id = await _analyze_post(session_factory, job)
+    except Exception as e:
+        if job.attempts < settings.post_analysis_max_attempts:
+            retry_at = datetime.utcnow() + retry_delay(job.attempts)
+        else:
+            retry_at = None
+        logger.warning(
+            "Post analysis failed (post_id=%d, attempt %d): %s%s",
+            job.post_id, job.attempts, e, "" if retry_at else "; giving up",
+        )
+        async with session_factory() as db:
+            await post_analysis_job_repository.fail_job(
+                db,
+                job.post_id,
+                version=job.version,
+                claim_token=job.claim_token,
+                error=str(e) or type(e).__name__,
+                retry_at=retry_at,
+                now=datetime.utcnow(),
+            )
+            await db.commit()
+        return False
+
+    async with session_factory() as db:
+        await post_analysis_job_repository.complete_job(
+            db, job.post_id, version=job.version, claim_token=job.claim_token, now=datetime.utcnow()
+        )
+        await db.commit()
+    if user_id is not None:
+        dashboard_service.invalidate_activity_cache()
+    return True
+
+
+async def _analyze_post(session_factory: async_sessionmaker[AsyncSession], job: ClaimedJob) -> int | None:
+    """投稿を判定して結果を保存し、投稿者のIDを返す
+
+    OpenAI APIの呼び出し中はDB接続を保持しないよう、読み込みと書き込みを別のセッションで行う。
+    書き込みのトランザクションでは、投稿・ジョブ・生徒の順にロックしてから能力ポイントとサマリーを更新する。
+    投稿が削除済みの場合、判定中に本文が更新された場合（version が進んだ）、ロックの期限切れで
+    他のワーカーが取り出し直した場合は何も書き込まずNoneを返す。
+    """
+    async with session_factory() as db:
+        post = await post_repository.get_active_post(db, job.post_id)
+        if post is None:
+            return None
+        problem = post.problem
+        content = "\n".join(text for text in (post.content_1, post.content_2, post.content_3) if text)
+    # このセッションは判定結果のキャッシュの接続先としてのみ使う（判定中は接続を確保しない）
+    async with session_factory() as db:
+        result = await ability_analyzer_service.analyze_abilities(content, problem, db=db)
+    if "error" in result:
+        raise PostAnalysisError(result["error"])
+
+    async with session_factory() as db:
+        # 本文の更新（投稿の行を先に更新する）と同じ順序でロックする
+        post = await post_repository.get_active_post(db, job.post_id, for_update=True)
+        if post is None:
+            return None
+        if not await post_analysis_job_repository.lock_job(
+            db, job.post_id, version=job.version, claim_token=job.claim_token
+        ):
+            # 古い本文の判定結果は書き込まない（再実行が必要な場合は complete_job が実行待ちに戻す）
+            return None
+        await student_summary_repository.lock_students(db, [post.user_id])
+        snapshot = await ability_registry.get(db)
+        post.ai_raw_label = result
+        changes = await ability_point_repository.replace_analysis_ability_points(
+            db, post.id, derive_ability_points(result, snapshot)
+        )
+        await student_summary_repository.record_post_points_changed(db, user_id=post.user_id, changes=changes)
+        await db.commit()
+        return post.user_id
+
+
+class PostAnalysisWorker:
+    """判定ジョブのワーカー（ワーカープロセス単位、同時実行数は POST_ANALYSIS_CONCURRENCY まで）"""
+
+    def __init__(self):
+        self._session_factory: async_sessionmaker[AsyncSession] | None = None
+        self._stopping: asyncio.Event | None = None
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self._running: set[asyncio.Task] = set()
+
+    @property
+    def running_count(self) -> int:
+        """実行中のジョブ数"""
+        return len(self._running)
+
+    def start(self, session_factory: async_sessionmaker[AsyncSession]) -> None:
+        """ジョブを取り出すバックグラウンドタスクを開始"""
+        self._session_factory = session_factory
+        # 同期プリミティブは実行中のイベントループ上で生成する
+        self._stopping = asyncio.Event()
+        self._wakeup = asyncio.Event()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def notify(self) -> None:
+        """ジョブの登録後に呼び、ポーリング間隔を待たずに取り出させる（未起動の場合は何もしない）"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def stop(self) -> None:
+        """新しいジョブの取り出しを止め、実行中のジョブの完了を待つ
+
+        完了を待たずにプロセスが終了した場合も、ジョブはロックの期限切れ後に再実行される。
+        """
+        if self._task is not None:
+            self._stopping.set()
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        if self._running:
+            await asyncio.gather(*self._running, return_exceptions=True)
+
+    async def _run(self) -> None:
+        interval = settings.post_analysis_poll_interval_seconds
+        while not self._stopping.is_set():
+            self._wakeup.clear()
+            try:
+                await self._dispatch()
+            except Exception:
+                logger.exception("Failed to claim post analysis jobs; retrying at next interval")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _dispatch(self) -> None:
+        slots = settings.post_analysis_concurrency - len(self._running)
+        if slots <= 0:
+            return
+        for job in await claim_jobs(self._session_factory, slots):
+            task = asyncio.create_task(run_job(self._session_factory, job))
+            self._running.add(task)
+            task.add_done_callback(self._finished)
+
+    def _finished(self, task: asyncio.Task) -> None:
+        self._running.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Post analysis job crashed", exc_info=task.exception())
+        # 空いた枠で次のジョブを取り出す
+        self.notify()
+
+
+# グローバルインスタンス
+post_analysis_worker = PostAnalysisWorker()
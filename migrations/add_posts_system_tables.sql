@@ -102,6 +102,7 @@ CREATE TABLE IF NOT EXISTS user_period_posts_cache (
 CREATE TABLE IF NOT EXISTS post_ability_points (
     id BIGINT AUTO_INCREMENT PRIMARY KEY,
     post_id BIGINT NOT NULL,
+    source ENUM('selected','analysis') NOT NULL DEFAULT 'selected',  -- 生徒が選んだ能力 / AI判定から導いた能力
     action_index TINYINT NOT NULL,
     ability_id TINYINT NOT NULL,
     quality_level TINYINT NOT NULL,
@@ -109,5 +110,5 @@ CREATE TABLE IF NOT EXISTS post_ability_points (
     created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (post_id) REFERENCES posts(id),
     FOREIGN KEY (ability_id) REFERENCES non_cog_abilities(id),
-    UNIQUE (post_id, action_index, ability_id)
+    UNIQUE KEY uq_post_ability_points_source (post_id, source, action_index, ability_id)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
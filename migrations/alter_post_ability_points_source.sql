@@ -0,0 +1,10 @@
+-- ==============================================
+-- post_ability_points の一意キーに source を含める（一度だけ実行）
+-- ==============================================
+-- AI判定から導いた能力（source='analysis'）は、生徒が選んだ能力と同じ action_index・能力で保存される。
+-- add_posts_system_tables.sql で作成した旧一意キー UNIQUE (post_id, action_index, ability_id) が残っていると
+-- 判定結果を保存できないため、source を含む一意キーに置き換える。
+-- source 列と uq_post_ability_points_source はアプリケーションの起動時に追加される。
+-- 旧一意キーの名前は SHOW INDEX FROM post_ability_points で確認する（名前を付けずに作成した場合は post_id）。
+
+ALTER TABLE post_ability_points DROP INDEX post_id;
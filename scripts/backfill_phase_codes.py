@@ -0,0 +1,59 @@
+"""投稿のフェーズ（posts.phase_code）を phase_label から正規化して埋めるスクリプト
+
+phase_code 未設定の投稿を id順にバッチで更新し、バッチごとにコミットする。
+中断した場合は、表示された最後の投稿IDを --start-id に指定して再開できる
+（未指定でも phase_code 未設定の投稿だけが対象になるため、最初からやり直しても結果は同じ）。
+最後に生徒の活動サマリーを再計算し、最新フェーズを正規化済みの表示名にそろえる。
+"""
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.core.config import settings
+from app.repositories import post_repository, student_summary_repository
+
+
+async def backfill_phase_codes(start_id: int, batch_size: int):
+    """phase_code 未設定の投稿をバッチごとに正規化"""
+    engine = create_async_engine(
+        settings.database_url(),
+        pool_pre_ping=True,
+        echo=False,
+        connect_args={"ssl": {"ssl_ca": settings.ssl_ca_path}} if settings.ssl_ca_path else {},
+    )
+
+    async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    try:
+        async with async_session() as session:
+            total = await post_repository.backfill_all_phase_codes(
+                session,
+                after_id=start_id,
+                batch_size=batch_size,
+                on_batch=lambda last_id, total: print(f"  投稿ID {last_id} まで処理（累計 {total}件 更新）"),
+            )
+
+            await student_summary_repository.rebuild_all_student_summaries(session)
+            print(f"✅ {total}件の投稿のフェーズを正規化しました")
+    except Exception as e:
+        print(f"❌ エラー: {e}")
+        sys.exit(1)
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--start-id", type=int, default=0, help="この投稿IDより後から処理する")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    print("投稿のフェーズを正規化中...")
+    asyncio.run(backfill_phase_codes(args.start_id, args.batch_size))
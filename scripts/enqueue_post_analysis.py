@@ -0,0 +1,61 @@
+"""AI判定結果（posts.ai_raw_label）のない投稿の判定ジョブを登録するスクリプト
+
+判定ジョブの導入前の投稿を id順にバッチで post_analysis_jobs に登録し、バッチごとにコミットする。
+判定はアプリケーションのワーカー（POST_ANALYSIS_ENABLED=true）が POST_ANALYSIS_CONCURRENCY 件ずつ実行する。
+中断した場合は、表示された最後の投稿IDを --start-id に指定して再開できる。
+"""
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.core.config import settings
+from app.repositories import post_analysis_job_repository
+
+
+async def enqueue_post_analysis(start_id: int, batch_size: int):
+    """AI判定結果のない投稿の判定ジョブをバッチごとに登録"""
+    engine = create_async_engine(
+        settings.database_url(),
+        pool_pre_ping=True,
+        echo=False,
+        connect_args={"ssl": {"ssl_ca": settings.ssl_ca_path}} if settings.ssl_ca_path else {},
+    )
+
+    async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    try:
+        async with async_session() as session:
+            after_id = start_id
+            while True:
+                last_id = await post_analysis_job_repository.enqueue_unanalyzed_posts(
+                    session, after_id=after_id, batch_size=batch_size
+                )
+                if last_id is None:
+                    break
+                await session.commit()
+                after_id = last_id
+                print(f"  投稿ID {last_id} まで登録")
+
+            print(f"✅ 投稿ID {after_id} までの判定ジョブを登録しました")
+    except Exception as e:
+        print(f"❌ エラー: {e}")
+        sys.exit(1)
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--start-id", type=int, default=0, help="この投稿IDより後から処理する")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    print("投稿の判定ジョブを登録中...")
+    asyncio.run(enqueue_post_analysis(args.start_id, args.batch_size))
@@ -0,0 +1,41 @@
+"""posts.like_count をpost_likesから再計算するスクリプト"""
+import asyncio
+import sys
+from pathlib import Path
+
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.core.config import settings
+from app.repositories import post_repository
+
+
+async def rebuild_like_counts():
+    """全投稿のいいね数カウンタを再計算"""
+    engine = create_async_engine(
+        settings.database_url(),
+        pool_pre_ping=True,
+        echo=False,
+        connect_args={"ssl": {"ssl_ca": settings.ssl_ca_path}} if settings.ssl_ca_path else {},
+    )
+
+    async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    try:
+        async with async_session() as session:
+            await post_repository.rebuild_like_counts(session)
+            await session.commit()
+            print("✅ いいね数カウンタを再計算しました")
+    except Exception as e:
+        print(f"❌ エラー: {e}")
+        sys.exit(1)
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    print("いいね数カウンタを再計算中...")
+    asyncio.run(rebuild_like_counts())
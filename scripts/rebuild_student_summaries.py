@@ -0,0 +1,40 @@
+"""生徒の活動サマリー（student_activity_summary / student_ability_summary）を再計算するスクリプト"""
+import asyncio
+import sys
+from pathlib import Path
+
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.core.config import settings
+from app.repositories import student_summary_repository
+
+
+async def rebuild_student_summaries():
+    """全ユーザーのサマリーを投稿・感謝の手紙から再計算"""
+    engine = create_async_engine(
+        settings.database_url(),
+        pool_pre_ping=True,
+        echo=False,
+        connect_args={"ssl": {"ssl_ca": settings.ssl_ca_path}} if settings.ssl_ca_path else {},
+    )
+
+    async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    try:
+        async with async_session() as session:
+            total = await student_summary_repository.rebuild_all_student_summaries(session)
+            print(f"✅ {total}人分の生徒の活動サマリーを再計算しました")
+    except Exception as e:
+        print(f"❌ エラー: {e}")
+        sys.exit(1)
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    print("生徒の活動サマリーを再計算中...")
+    asyncio.run(rebuild_student_summaries())
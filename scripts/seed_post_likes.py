@@ -13,6 +13,7 @@ from sqlalchemy.orm import sessionmaker
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from app.core.config import settings
+from app.repositories import post_repository
 
 
 async def seed_likes():
@@ -93,6 +94,9 @@ async def seed_likes():
                     )
                     print(f"  {min(i + batch_size, len(all_likes))}/{len(all_likes)} 件挿入...")
 
+            # いいね数カウンタをpost_likesに合わせる
+            await post_repository.rebuild_like_counts(session)
+
             await session.commit()
             print(f"✅ {len(post_ids)}件の投稿に合計{total_likes}件のいいねを追加しました")
             print(f"   平均いいね数: {total_likes / len(post_ids):.1f}")
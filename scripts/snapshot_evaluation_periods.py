@@ -0,0 +1,66 @@
+"""終了した評価期間の能力スナップショット（period_ability_snapshots）を作成するスクリプト
+
+期間の終了後に定期実行する（作成済みの期間はスキップ）。
+--period-id を指定した場合は、その期間のスナップショットを作り直す。
+"""
+import argparse
+import asyncio
+import sys
+from datetime import datetime
+from pathlib import Path
+
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.core.config import settings
+from app.repositories import period_snapshot_repository
+
+
+async def snapshot_evaluation_periods(period_id: int | None = None):
+    """終了した評価期間ごとにスナップショットを作成"""
+    engine = create_async_engine(
+        settings.database_url(),
+        pool_pre_ping=True,
+        echo=False,
+        connect_args={"ssl": {"ssl_ca": settings.ssl_ca_path}} if settings.ssl_ca_path else {},
+    )
+
+    async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    try:
+        async with async_session() as session:
+            if period_id is not None:
+                period = await period_snapshot_repository.get_period(session, period_id)
+                if period is None:
+                    print(f"❌ 評価期間が見つかりません: {period_id}")
+                    sys.exit(1)
+                periods = [period]
+            else:
+                periods = await period_snapshot_repository.list_closed_periods_without_snapshot(
+                    session, datetime.utcnow().date()
+                )
+
+            if not periods:
+                print("✅ スナップショットが必要な評価期間はありません")
+            for period in periods:
+                row_count = await period_snapshot_repository.create_period_snapshot(session, period)
+                # 期間ごとにコミットし、途中で失敗しても作成済みの期間は残す
+                await session.commit()
+                print(f"✅ {period.name}（{period.end_date}まで）: {row_count}行")
+    except Exception as e:
+        print(f"❌ エラー: {e}")
+        sys.exit(1)
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--period-id", type=int, default=None, help="作り直す評価期間のID")
+    args = parser.parse_args()
+
+    print("評価期間の能力スナップショットを作成中...")
+    asyncio.run(snapshot_evaluation_periods(args.period_id))
@@ -7,10 +7,32 @@ from sqlalchemy.ext.asyncio import (
 )
 from fastapi.testclient import TestClient
 
+from app.core.cache import response_cache
 from app.core.database import get_db
 from app.main import create_app
 
 from app.models.base import Base
+from app.services.ability_registry_service import ability_registry
+
+
+@pytest.fixture(autouse=True)
+def reset_ability_registry():
+    """
+    Drops the process-wide ability registry so each test reads its own database.
+    """
+    ability_registry.invalidate()
+    yield
+    ability_registry.invalidate()
+
+
+@pytest.fixture(autouse=True)
+def reset_response_cache():
+    """
+    Clears the process-wide response cache so cached dashboards do not leak between tests.
+    """
+    response_cache.clear()
+    yield
+    response_cache.clear()
 
 
 @pytest.fixture
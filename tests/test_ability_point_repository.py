@@ -0,0 +1,95 @@
+import pytest
+from datetime import datetime
+from typing import Callable
+
+from sqlalchemy import event, select
+
+from app.models.non_cog_ability import NonCogAbility
+from app.models.post import Post
+from app.models.post_ability_point import PostAbilityPoint
+from app.models.thanks_letter import ThanksLetter
+from app.models.thanks_letter_ability_point import ThanksLetterAbilityPoint
+from app.models.user import RoleEnum, User
+from app.repositories import ability_point_repository
+
+
+async def _seed(session) -> tuple[int, int]:
+    """能力3件・ユーザー2人・投稿1件・感謝の手紙1件を作成"""
+    now = datetime.utcnow()
+    session.add_all([
+        NonCogAbility(id=1, code="problem_setting", name="課題設定力"),
+        NonCogAbility(id=2, code="information_gathering", name="情報収集力"),
+        NonCogAbility(id=3, code="involvement", name="巻き込む力"),
+        User(id=1, role=RoleEnum.student, full_name="Sender", email="sender@example.com"),
+        User(id=2, role=RoleEnum.student, full_name="Receiver", email="receiver@example.com"),
+    ])
+    post = Post(user_id=1, problem="問い", content_1="内容", phase_label="情報収集", created_at=now, updated_at=now)
+    letter = ThanksLetter(sender_user_id=1, receiver_user_id=2, content_1="ありがとう", created_at=now)
+    session.add_all([post, letter])
+    await session.commit()
+    return post.id, letter.id
+
+
+def _record_statements(db_engine) -> tuple[list[str], Callable[[], None]]:
+    statements = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db_engine.sync_engine, "before_cursor_execute", _record)
+    return statements, lambda: event.remove(db_engine.sync_engine, "before_cursor_execute", _record)
+
+
+@pytest.mark.asyncio
+async def test_sync_post_ability_points_writes_only_the_difference(session, db_engine):
+    post_id, _ = await _seed(session)
+    await ability_point_repository.add_post_ability_points(session, post_id, [1, 2])
+    await session.commit()
+
+    statements, stop = _record_statements(db_engine)
+    try:
+        changed = await ability_point_repository.sync_post_ability_points(session, post_id, [2, 3])
+    finally:
+        stop()
+
+    assert changed is True
+    # 現在の能力のSELECT・外れた能力のDELETE・増えた能力のINSERTのみ
+    assert [s.split()[0] for s in statements] == ["SELECT", "DELETE", "INSERT"]
+    await session.commit()
+
+    result = await session.execute(
+        select(PostAbilityPoint.ability_id).where(PostAbilityPoint.post_id == post_id)
+    )
+    assert sorted(result.scalars().all()) == [2, 3]
+
+
+@pytest.mark.asyncio
+async def test_sync_post_ability_points_skips_writes_when_unchanged(session, db_engine):
+    post_id, _ = await _seed(session)
+    await ability_point_repository.add_post_ability_points(session, post_id, [1, 2])
+    await session.commit()
+
+    statements, stop = _record_statements(db_engine)
+    try:
+        changed = await ability_point_repository.sync_post_ability_points(session, post_id, [2, 1])
+    finally:
+        stop()
+
+    assert changed is False
+    assert [s.split()[0] for s in statements] == ["SELECT"]
+
+
+@pytest.mark.asyncio
+async def test_sync_thanks_letter_ability_points(session):
+    _, letter_id = await _seed(session)
+
+    assert await ability_point_repository.sync_thanks_letter_ability_points(session, letter_id, [1, 3]) is True
+    await session.commit()
+    assert await ability_point_repository.sync_thanks_letter_ability_points(session, letter_id, [3, 1]) is False
+    assert await ability_point_repository.sync_thanks_letter_ability_points(session, letter_id, []) is True
+    await session.commit()
+
+    result = await session.execute(
+        select(ThanksLetterAbilityPoint).where(ThanksLetterAbilityPoint.thanks_letter_id == letter_id)
+    )
+    assert result.scalars().all() == []
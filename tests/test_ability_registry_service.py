@@ -0,0 +1,119 @@
+import pytest
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.models.non_cog_ability import NonCogAbility
+from app.models.post_ability_point import PostAbilityPoint
+from app.models.user import RoleEnum
+from app.services.ability_registry_service import ability_registry
+from tests.test_posts_api import _create_user_with_token
+
+
+async def _seed_abilities(SessionLocal) -> dict[str, int]:
+    async with SessionLocal() as db:
+        abilities = [
+            NonCogAbility(id=1, code="problem_setting", name="課題設定力"),
+            NonCogAbility(id=2, code="information_gathering", name="情報収集力"),
+            NonCogAbility(id=3, code="involvement", name="巻き込む力"),
+        ]
+        db.add_all(abilities)
+        await db.commit()
+        return {ability.code: ability.id for ability in abilities}
+
+
+@pytest.mark.asyncio
+async def test_resolve_codes_uses_loaded_snapshot(session, db_engine):
+    ids = await _seed_abilities(async_sessionmaker(db_engine, expire_on_commit=False))
+
+    snapshot = await ability_registry.load(session)
+    assert [a.code for a in snapshot.abilities] == ["problem_setting", "information_gathering", "involvement"]
+    with pytest.raises(TypeError):
+        snapshot.code_to_id["new"] = 99
+
+    statements = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db_engine.sync_engine, "before_cursor_execute", _record)
+    try:
+        resolved = await ability_registry.resolve_codes(
+            session, ["involvement", "unknown", "problem_setting", "involvement"]
+        )
+    finally:
+        event.remove(db_engine.sync_engine, "before_cursor_execute", _record)
+
+    assert resolved == [ids["involvement"], ids["problem_setting"]]
+    assert statements == []
+
+
+@pytest.mark.asyncio
+async def test_registry_reloads_after_invalidate(session, db_engine):
+    await _seed_abilities(async_sessionmaker(db_engine, expire_on_commit=False))
+    first = await ability_registry.get(session)
+
+    session.add(NonCogAbility(id=4, code="execution", name="実行力"))
+    await session.commit()
+    assert "execution" not in (await ability_registry.get(session)).code_to_id
+
+    ability_registry.invalidate()
+    second = await ability_registry.get(session)
+    assert "execution" in second.code_to_id
+    assert second.version > first.version
+
+
+@pytest.mark.asyncio
+async def test_create_post_resolves_codes_without_ability_query(app_client, db_engine):
+    client, SessionLocal = app_client
+    ids = await _seed_abilities(SessionLocal)
+    headers = await _create_user_with_token(SessionLocal, user_id=200, role=RoleEnum.student)
+    async with SessionLocal() as db:
+        await ability_registry.load(db)
+
+    statements = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db_engine.sync_engine, "before_cursor_execute", _record)
+    try:
+        resp = client.post("/posts", headers=headers, json={
+            "problem": "問い",
+            "content_1": "やってみたこと",
+            "phase_label": "情報収集",
+            "ability_codes": ["information_gathering", "involvement"],
+        })
+    finally:
+        event.remove(db_engine.sync_engine, "before_cursor_execute", _record)
+
+    assert resp.status_code == 201
+    assert not [s for s in statements if "non_cog_abilities" in s]
+
+    async with SessionLocal() as db:
+        result = await db.execute(
+            select(PostAbilityPoint.ability_id).where(PostAbilityPoint.post_id == resp.json()["id"])
+        )
+        assert sorted(result.scalars().all()) == sorted([ids["information_gathering"], ids["involvement"]])
+
+
+@pytest.mark.asyncio
+async def test_admin_refresh_endpoint_reloads_registry(app_client):
+    client, SessionLocal = app_client
+    await _seed_abilities(SessionLocal)
+    admin_headers = await _create_user_with_token(SessionLocal, user_id=210, role=RoleEnum.admin)
+    student_headers = await _create_user_with_token(SessionLocal, user_id=211, role=RoleEnum.student)
+
+    async with SessionLocal() as db:
+        before = await ability_registry.load(db)
+        db.add(NonCogAbility(id=4, code="execution", name="実行力"))
+        await db.commit()
+
+    assert client.post("/admin/database/ability-registry/refresh", headers=student_headers).status_code == 403
+
+    resp = client.post("/admin/database/ability-registry/refresh", headers=admin_headers)
+    assert resp.status_code == 200
+    assert resp.json()["ability_count"] == 4
+    assert resp.json()["version"] == before.version + 1
+    assert "execution" in ability_registry.snapshot.code_to_id
+
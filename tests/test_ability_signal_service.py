@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+from datetime import datetime
+
+from app.models.non_cog_ability import NonCogAbility
+from app.models.post import AbilityScoreBand, SignalColor
+from app.models.student_activity_summary import StudentAbilitySummary
+from app.models.user import RoleEnum, User
+from app.services import ability_signal_service
+from app.services.ability_registry_service import ability_registry
+
+
+def test_percentile_ranks_within_each_grade():
+    scores = np.array([[0.0], [2.0], [2.0], [5.0], [1.0], [9.0]])
+    grades = np.array([1, 1, 1, 1, 2, 2])
+
+    ranks = ability_signal_service.percentile_ranks(scores, grades)
+
+    # 同点は中間順位、学年ごとに独立して順位付け
+    assert ranks[:, 0].tolist() == [12.5, 50.0, 50.0, 87.5, 25.0, 75.0]
+
+
+async def _seed(SessionLocal) -> None:
+    now = datetime.utcnow()
+
+    def band(order, color, label, low, high, *, ability_id=None, grade=None):
+        return AbilityScoreBand(
+            id=order + (ability_id or 0) * 10 + (grade or 0) * 100,
+            ability_id=ability_id,
+            grade=grade,
+            band_order=order,
+            signal_color=color,
+            band_label=label,
+            percentile_min=low,
+            percentile_max=high,
+            created_at=now,
+            updated_at=now,
+        )
+
+    async with SessionLocal() as db:
+        db.add_all([
+            NonCogAbility(id=1, code="problem_setting", name="課題設定力"),
+            NonCogAbility(id=2, code="involvement", name="巻き込む力"),
+            # 全能力・全学年の既定の帯
+            band(1, SignalColor.red, "要支援", 0, 25),
+            band(2, SignalColor.yellow, "標準", 25, 75),
+            band(3, SignalColor.green, "良好", 75, None),
+            # 1年生の巻き込む力だけは基準が厳しい
+            band(1, SignalColor.red, "要支援", 0, 90, ability_id=2, grade=1),
+            band(2, SignalColor.green, "良好", 90, None, ability_id=2, grade=1),
+        ])
+        for i, (grade, points) in enumerate([(1, 0), (1, 1), (1, 2), (1, 3), (2, 5), (None, 0)]):
+            db.add(User(id=100 + i, role=RoleEnum.student, full_name=f"S{i}", email=f"s{i}@example.com", grade=grade))
+            if points:
+                db.add(StudentAbilitySummary(user_id=100 + i, ability_id=1, post_points=points, letter_points=0))
+                db.add(StudentAbilitySummary(user_id=100 + i, ability_id=2, post_points=0, letter_points=points))
+        await db.commit()
+
+
+@pytest.mark.asyncio
+async def test_get_ability_signals_maps_percentiles_to_bands(app_client):
+    _, SessionLocal = app_client
+    await _seed(SessionLocal)
+
+    async with SessionLocal() as db:
+        await ability_registry.load(db)
+        signals = await ability_signal_service.get_ability_signals(db)
+
+    assert set(signals) == {100, 101, 102, 103, 104, 105}
+    assert signals[100]["problem_setting"] == {"percentile": 12.5, "signal_color": "red", "band_label": "要支援"}
+    assert signals[101]["problem_setting"] == {"percentile": 37.5, "signal_color": "yellow", "band_label": "標準"}
+    assert signals[103]["problem_setting"] == {"percentile": 87.5, "signal_color": "green", "band_label": "良好"}
+    # 能力・学年を指定した帯が優先される
+    assert signals[103]["involvement"]["signal_color"] == "red"
+    # 学年内で1人だけの生徒・学年未設定の生徒は、既定の帯で判定する
+    assert signals[104]["involvement"] == {"percentile": 50.0, "signal_color": "yellow", "band_label": "標準"}
+    assert signals[105]["problem_setting"]["percentile"] == 50.0
+
+
+def test_assign_bands_without_bands_returns_no_band():
+    assert ability_signal_service.assign_bands(np.array([10.0, 90.0]), []).tolist() == [-1, -1]
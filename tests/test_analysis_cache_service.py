@@ -0,0 +1,116 @@
+import asyncio
+
+import pytest
+
+from app.services import analysis_cache_service
+from app.services.ability_analyzer_service import ability_analyzer_service
+from app.services.analysis_cache_service import AnalysisCache, cache_key
+
+
+RESULT = {"matched_abilities": [], "analysis_summary": "該当なし"}
+
+
+class _Analyzer:
+    """呼び出し回数を数える判定（resultにerrorを含めると失敗扱い）"""
+
+    def __init__(self, result: dict = RESULT):
+        self.calls = 0
+        self.result = result
+
+    async def __call__(self) -> dict:
+        self.calls += 1
+        await asyncio.sleep(0)
+        return self.result
+
+
+def _key(content: str, **overrides) -> str:
+    options = {"problem": "問い", "content": content, "model": "gpt-4o-mini", "prompt_version": "v1", **overrides}
+    return cache_key(**options)
+
+
+def test_cache_key_ignores_whitespace_and_width():
+    assert _key("図書館で 本を\n読んだ") == _key("  図書館で　本を 読んだ ")
+    assert _key("ＡＢＣ") == _key("ABC")
+    assert _key("内容") != _key("内容", model="gpt-4o")
+    assert _key("内容") != _key("内容", prompt_version="v2")
+    assert _key("内容") != _key("内容", problem=None)
+
+
+@pytest.mark.asyncio
+async def test_memory_then_database_tier(session):
+    analyze = _Analyzer()
+    options = {"model": "gpt-4o-mini", "prompt_version": "v1", "db": session}
+
+    cache = AnalysisCache()
+    assert await cache.get_or_analyze("k", analyze, **options) == RESULT
+    assert await cache.get_or_analyze("k", analyze, **options) == RESULT
+    assert analyze.calls == 1
+
+    # 別のワーカープロセス（プロセス内キャッシュが空）はテーブルから返す
+    other = AnalysisCache()
+    assert await other.get_or_analyze("k", analyze, **options) == RESULT
+    assert analyze.calls == 1
+    assert other.stats()["db_hits"] == 1
+
+    assert cache.stats() == {
+        "requests": 2, "db_hits": 0, "misses": 1, "bypasses": 0, "failures": 0,
+        "memory_hits": 1, "hit_rate": 0.5, "memory_entries": 1, "memory_evictions": 0,
+    }
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_share_one_analysis():
+    cache = AnalysisCache()
+    analyze = _Analyzer()
+    results = await asyncio.gather(*[
+        cache.get_or_analyze("k", analyze, model="m", prompt_version="v1") for _ in range(5)
+    ])
+    assert results == [RESULT] * 5
+    assert analyze.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_force_refresh_and_failures_are_not_cached(session):
+    cache = AnalysisCache()
+    options = {"model": "m", "prompt_version": "v1", "db": session}
+    failing = _Analyzer({"matched_abilities": [], "analysis_summary": "失敗", "error": "timeout"})
+
+    assert (await cache.get_or_analyze("k", failing, **options))["error"] == "timeout"
+    assert (await cache.get_or_analyze("k", failing, **options))["error"] == "timeout"
+    assert failing.calls == 2
+    assert cache.stats()["failures"] == 2
+
+    analyze = _Analyzer()
+    await cache.get_or_analyze("k", analyze, **options)
+    refreshed = _Analyzer({"matched_abilities": [], "analysis_summary": "再判定"})
+    # 強制的な再判定はキャッシュを読まず、結果で置き換える
+    assert (await cache.get_or_analyze("k", refreshed, use_cache=False, **options))["analysis_summary"] == "再判定"
+    assert (await cache.get_or_analyze("k", analyze, **options))["analysis_summary"] == "再判定"
+    assert (await AnalysisCache().get_or_analyze("k", analyze, **options))["analysis_summary"] == "再判定"
+    assert analyze.calls == 1
+    assert cache.stats()["bypasses"] == 1
+
+
+@pytest.mark.asyncio
+async def test_analyze_endpoint_uses_cache(app_client, monkeypatch):
+    client, _ = app_client
+    analysis_cache_service.analysis_cache.clear()
+    calls = []
+
+    async def _request_analysis(content, problem):
+        calls.append(content)
+        return {"matched_abilities": [], "analysis_summary": f"{len(calls)}回目"}
+
+    monkeypatch.setattr(ability_analyzer_service, "_request_analysis", _request_analysis)
+    try:
+        first = client.post("/ability-analysis/analyze", json={"problem": "問い", "content": "本を読んだ"})
+        again = client.post("/ability-analysis/analyze", json={"problem": "問い", "content": " 本を読んだ\n"})
+        forced = client.post(
+            "/ability-analysis/analyze", json={"problem": "問い", "content": "本を読んだ", "force_refresh": True}
+        )
+    finally:
+        analysis_cache_service.analysis_cache.clear()
+
+    assert first.json()["analysis_summary"] == again.json()["analysis_summary"] == "1回目"
+    assert forced.json()["analysis_summary"] == "2回目"
+    assert len(calls) == 2
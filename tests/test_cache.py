@@ -0,0 +1,114 @@
+import asyncio
+
+import pytest
+
+from app.core.cache import ResponseCache
+
+
+class _Counter:
+    """呼び出し回数を数えるローダー（gateを渡すと完了を待たせる）"""
+
+    def __init__(self, gate: asyncio.Event | None = None):
+        self.calls = 0
+        self.gate = gate
+
+    async def __call__(self):
+        self.calls += 1
+        if self.gate is not None:
+            await self.gate.wait()
+        return self.calls
+
+
+@pytest.mark.asyncio
+async def test_hit_and_miss():
+    cache = ResponseCache()
+    loader = _Counter()
+
+    assert await cache.get_or_load("k", loader, ttl=60) == 1
+    assert await cache.get_or_load("k", loader, ttl=60) == 1
+    assert loader.calls == 1
+    assert cache.stats() == {
+        "hits": 1, "stale_hits": 0, "misses": 1, "refreshes": 0, "invalidations": 0, "evictions": 0, "entries": 1,
+    }
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_share_one_load():
+    cache = ResponseCache()
+    gate = asyncio.Event()
+    loader = _Counter(gate)
+
+    tasks = [asyncio.create_task(cache.get_or_load("k", loader, ttl=60)) for _ in range(5)]
+    await asyncio.sleep(0)
+    gate.set()
+    assert await asyncio.gather(*tasks) == [1] * 5
+    assert loader.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_stale_value_is_served_while_refreshing_once():
+    cache = ResponseCache()
+    loader = _Counter()
+    await cache.get_or_load("k", loader, ttl=0, stale_ttl=60)
+
+    gate = asyncio.Event()
+    loader.gate = gate
+    # TTL切れの間は古い値を返し、再計算は1回だけ
+    assert await cache.get_or_load("k", loader, ttl=0, stale_ttl=60) == 1
+    await asyncio.sleep(0)
+    assert await cache.get_or_load("k", loader, ttl=0, stale_ttl=60) == 1
+    assert loader.calls == 2
+
+    gate.set()
+    await asyncio.sleep(0.01)
+    assert await cache.get_or_load("k", loader, ttl=0, stale_ttl=60) == 2
+    assert cache.stats()["stale_hits"] == 3
+    assert cache.stats()["refreshes"] == 2
+
+
+@pytest.mark.asyncio
+async def test_invalidation_drops_entries_and_in_flight_results():
+    cache = ResponseCache()
+    loader = _Counter()
+    await cache.get_or_load("tagged", loader, tags=["a"], ttl=60)
+    await cache.get_or_load("other", _Counter(), tags=["b"], ttl=60)
+
+    cache.invalidate_tags("a")
+    assert cache.stats()["entries"] == 1
+
+    # 計算中に無効化された結果は保存しない
+    gate = asyncio.Event()
+    loader.gate = gate
+    task = asyncio.create_task(cache.get_or_load("tagged", loader, tags=["a"], ttl=60))
+    await asyncio.sleep(0)
+    cache.invalidate_tags("a")
+    gate.set()
+    assert await task == 2
+    assert cache.stats()["entries"] == 1
+
+
+@pytest.mark.asyncio
+async def test_evicts_least_recently_used_entry_over_limit():
+    cache = ResponseCache(max_entries=2)
+    loaders = {key: _Counter() for key in ("a", "b", "c")}
+
+    await cache.get_or_load("a", loaders["a"], ttl=60)
+    await cache.get_or_load("b", loaders["b"], ttl=60)
+    # 参照した "a" は残り、"b" が破棄される
+    await cache.get_or_load("a", loaders["a"], ttl=60)
+    await cache.get_or_load("c", loaders["c"], ttl=60)
+
+    assert cache.stats()["entries"] == 2
+    assert cache.stats()["evictions"] == 1
+    await cache.get_or_load("a", loaders["a"], ttl=60)
+    assert loaders["a"].calls == 1
+    await cache.get_or_load("b", loaders["b"], ttl=60)
+    assert loaders["b"].calls == 2
+
+
+def test_put_replaces_value():
+    cache = ResponseCache()
+    cache.put("k", 1)
+    cache.put("k", 2)
+    assert cache.stats()["entries"] == 1
+    assert cache._entries["k"].value == 2
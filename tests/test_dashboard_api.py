@@ -0,0 +1,674 @@
+import csv
+import io
+import json
+import re
+
+import numpy as np
+import pytest
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, select
+
+from app.core.cache import response_cache
+from app.models.non_cog_ability import NonCogAbility
+from app.models.post import EvaluationPeriod, PhaseCode, Post, QuestionStateChangeType
+from app.models.post_ability_point import PostAbilityPoint
+from app.models.student_intervention_flag import StudentInterventionFlag
+from app.models.thanks_letter import ThanksLetter
+from app.models.thanks_letter_ability_point import ThanksLetterAbilityPoint
+from app.models.user import RoleEnum, User
+from app.repositories import post_repository, student_summary_repository
+from app.services import class_stats_service, dashboard_service
+from app.services.ability_registry_service import ability_registry
+from tests.test_posts_api import _create_user_with_token
+
+
+async def _seed_cohort(SessionLocal, *, student_count: int) -> list[int]:
+    """生徒を作成し、最後の生徒以外に投稿を作成する（生徒IDを返す）"""
+    now = datetime.utcnow()
+    student_ids = []
+    async with SessionLocal() as db:
+        for i in range(student_count):
+            student = User(
+                id=1000 + i,
+                role=RoleEnum.student,
+                full_name=f"Student {i:03d}",
+                email=f"student{i}@example.com",
+                grade=1 + i % 3,
+                class_name=f"{1 + i % 2}組",
+            )
+            db.add(student)
+            student_ids.append(student.id)
+        # 卒業・削除済みの生徒は対象外
+        db.add(User(id=1999, role=RoleEnum.student, full_name="Inactive", email="inactive@example.com", is_active=False))
+        await db.flush()
+
+        for i, student_id in enumerate(student_ids[:-1]):
+            # 偶数番目の生徒は3週間前が最終投稿（介入対象）
+            last = now - timedelta(days=21 if i % 2 == 0 else 1)
+            posts = [
+                ("planning", QuestionStateChangeType.none, last - timedelta(days=2)),
+                ("information_gathering", QuestionStateChangeType.deepened, last - timedelta(days=1)),
+                ("整理・分析", QuestionStateChangeType.changed, last),
+            ]
+            for phase_label, change_type, created_at in posts:
+                db.add(Post(
+                    user_id=student_id,
+                    problem="問い",
+                    content_1="内容",
+                    phase_label=phase_label,
+                    question_state_change_type=change_type,
+                    created_at=created_at,
+                    updated_at=created_at,
+                ))
+            # 削除済みの投稿は数えない
+            db.add(Post(
+                user_id=student_id,
+                problem="削除",
+                content_1="削除",
+                phase_label="発表準備",
+                question_state_change_type=QuestionStateChangeType.changed,
+                created_at=now,
+                updated_at=now,
+                deleted_at=now,
+            ))
+        await db.flush()
+        await student_summary_repository.refresh_student_summaries(db)
+        await db.commit()
+    return student_ids
+
+
+def _count_statements(db_engine, client, path: str, headers: dict) -> tuple[int, object]:
+    statements = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db_engine.sync_engine, "before_cursor_execute", _record)
+    try:
+        resp = client.get(path, headers=headers)
+    finally:
+        event.remove(db_engine.sync_engine, "before_cursor_execute", _record)
+    # 認証（セッション・ユーザー取得）の2文を除いたステートメント数
+    return len(statements) - 2, resp
+
+
+@pytest.mark.asyncio
+async def test_learning_progress_output(app_client):
+    client, SessionLocal = app_client
+    headers = await _create_user_with_token(SessionLocal, user_id=1, role=RoleEnum.teacher)
+    student_ids = await _seed_cohort(SessionLocal, student_count=3)
+
+    resp = client.get("/dashboard/learning-progress", headers=headers)
+    assert resp.status_code == 200
+    data = resp.json()
+
+    assert [row["user_id"] for row in data] == student_ids
+    first, second, without_posts = data
+    assert set(first) == {
+        "user_id", "full_name", "grade", "class_name", "phase", "post_count",
+        "question_change_count", "last_posted_at", "intervention_flag",
+    }
+    assert first["phase"] == "整理・分析"
+    assert first["post_count"] == 3
+    assert first["question_change_count"] == 2
+    assert first["intervention_flag"] is True
+    assert second["intervention_flag"] is False
+    assert without_posts == {
+        "user_id": student_ids[2],
+        "full_name": "Student 002",
+        "grade": 3,
+        "class_name": "1組",
+        "phase": "未投稿",
+        "post_count": 0,
+        "question_change_count": 0,
+        "last_posted_at": None,
+        "intervention_flag": True,
+    }
+
+
+@pytest.mark.asyncio
+async def test_learning_progress_query_count_is_constant(app_client, db_engine):
+    client, SessionLocal = app_client
+    headers = await _create_user_with_token(SessionLocal, user_id=1, role=RoleEnum.teacher)
+    await _seed_cohort(SessionLocal, student_count=2)
+    small, _ = _count_statements(db_engine, client, "/dashboard/learning-progress", headers)
+
+    async with SessionLocal() as db:
+        for i in range(2, 30):
+            db.add(User(id=1000 + i, role=RoleEnum.student, full_name=f"Student {i:03d}", email=f"student{i}@example.com"))
+        await db.commit()
+    # 管理APIを通さずに生徒を追加したため、キャッシュを手動で破棄する
+    response_cache.clear()
+    large, resp = _count_statements(db_engine, client, "/dashboard/learning-progress", headers)
+
+    assert len(resp.json()) == 30
+    # 生徒一覧と活動サマリーの結合1文のみ
+    assert small == large == 1
+
+
+def test_learning_progress_requires_teacher_or_admin(app_client):
+    client, _ = app_client
+    assert client.get("/dashboard/learning-progress").status_code in (401, 403)
+
+
+async def _seed_ability_points(SessionLocal, student_ids: list[int]) -> None:
+    """能力マスター・能力ポイント付きの投稿・感謝の手紙を作成"""
+    now = datetime.utcnow()
+    async with SessionLocal() as db:
+        db.add_all([
+            NonCogAbility(id=1, code="problem_setting", name="課題設定力"),
+            NonCogAbility(id=2, code="information_gathering", name="情報収集力"),
+        ])
+        post = Post(user_id=student_ids[0], problem="問い", content_1="内容", phase_label="情報収集", created_at=now, updated_at=now)
+        deleted = Post(user_id=student_ids[0], problem="問い", content_1="内容", phase_label="情報収集", created_at=now, updated_at=now, deleted_at=now)
+        letter = ThanksLetter(sender_user_id=student_ids[1], receiver_user_id=student_ids[0], content_1="ありがとう", created_at=now)
+        db.add_all([post, deleted, letter])
+        await db.flush()
+        db.add_all([
+            PostAbilityPoint(post_id=post.id, ability_id=1, point=1.5),
+            PostAbilityPoint(post_id=post.id, ability_id=1, action_index=1, point=0.5),
+            PostAbilityPoint(post_id=deleted.id, ability_id=2, point=3.0),
+            ThanksLetterAbilityPoint(thanks_letter_id=letter.id, ability_id=1, points=1),
+            ThanksLetterAbilityPoint(thanks_letter_id=letter.id, ability_id=2, points=1.5),
+        ])
+        await db.flush()
+        await student_summary_repository.refresh_student_summaries(db)
+        await db.commit()
+
+
+@pytest.mark.asyncio
+async def test_non_cognitive_abilities_output(app_client):
+    client, SessionLocal = app_client
+    headers = await _create_user_with_token(SessionLocal, user_id=1, role=RoleEnum.admin)
+    student_ids = await _seed_cohort(SessionLocal, student_count=2)
+    await _seed_ability_points(SessionLocal, student_ids)
+
+    resp = client.get("/dashboard/non-cognitive-abilities", headers=headers)
+    assert resp.status_code == 200
+    first, second = resp.json()
+
+    # 学年が異なるため、それぞれ学年内で1人（中間順位の50）
+    assert first.pop("signals") == {
+        "problem_setting": {"percentile": 50.0, "signal_color": None, "band_label": None},
+        "information_gathering": {"percentile": 50.0, "signal_color": None, "band_label": None},
+    }
+    assert first == {
+        "user_id": student_ids[0],
+        "full_name": "Student 000",
+        "grade": 1,
+        "class_name": "1組",
+        "post_count": 4,
+        "received_letters_count": 1,
+        "sent_letters_count": 0,
+        "abilities": {"problem_setting": 3.0, "information_gathering": 1.5},
+    }
+    assert second["post_count"] == 0
+    assert second["sent_letters_count"] == 1
+    assert second["abilities"] == {"problem_setting": 0.0, "information_gathering": 0.0}
+
+
+@pytest.mark.asyncio
+async def test_non_cognitive_abilities_query_count_is_constant(app_client, db_engine):
+    client, SessionLocal = app_client
+    headers = await _create_user_with_token(SessionLocal, user_id=1, role=RoleEnum.teacher)
+    student_ids = await _seed_cohort(SessionLocal, student_count=2)
+    await _seed_ability_points(SessionLocal, student_ids)
+    async with SessionLocal() as db:
+        await ability_registry.load(db)
+
+    small, _ = _count_statements(db_engine, client, "/dashboard/non-cognitive-abilities", headers)
+
+    async with SessionLocal() as db:
+        for i in range(2, 30):
+            db.add(User(id=1000 + i, role=RoleEnum.student, full_name=f"Student {i:03d}", email=f"student{i}@example.com"))
+        await db.commit()
+    # 管理APIを通さずに生徒を追加したため、キャッシュを手動で破棄する
+    response_cache.clear()
+    large, resp = _count_statements(db_engine, client, "/dashboard/non-cognitive-abilities", headers)
+
+    assert len(resp.json()) == 30
+    # 活動サマリー・能力サマリー・信号算出用の全生徒の能力スコアの3文のみ
+    assert small == large == 3
+
+
+@pytest.mark.asyncio
+async def test_dashboard_is_cached_until_a_post_is_written(app_client, db_engine):
+    client, SessionLocal = app_client
+    teacher = await _create_user_with_token(SessionLocal, user_id=1, role=RoleEnum.teacher)
+    admin = await _create_user_with_token(SessionLocal, user_id=2, role=RoleEnum.admin)
+    student = await _create_user_with_token(SessionLocal, user_id=3, role=RoleEnum.student)
+
+    first = client.get("/dashboard/learning-progress", headers=teacher).json()
+    assert first[0]["post_count"] == 0
+
+    # 2回目はキャッシュから返す（認証以外のクエリなし）
+    count, resp = _count_statements(db_engine, client, "/dashboard/learning-progress", teacher)
+    assert count == 0
+    assert resp.json() == first
+
+    client.post("/posts", headers=student, json={"problem": "問い", "content_1": "内容", "phase_label": "情報収集"})
+    assert client.get("/dashboard/learning-progress", headers=teacher).json()[0]["post_count"] == 1
+
+    stats = client.get("/dashboard/cache-stats", headers=admin).json()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+    assert stats["invalidations"] == 1
+    assert client.get("/dashboard/cache-stats", headers=teacher).status_code == 403
+
+
+@pytest.mark.asyncio
+async def test_learning_progress_filters(app_client):
+    client, SessionLocal = app_client
+    headers = await _create_user_with_token(SessionLocal, user_id=1, role=RoleEnum.teacher)
+    student_ids = await _seed_cohort(SessionLocal, student_count=6)
+
+    def _ids(params: dict) -> list[int]:
+        resp = client.get("/dashboard/learning-progress", headers=headers, params=params)
+        assert resp.status_code == 200
+        return [row["user_id"] for row in resp.json()]
+
+    # 学年: 1 + i % 3、クラス: 1 + i % 2
+    assert _ids({"grade": 1}) == [student_ids[0], student_ids[3]]
+    assert _ids({"grade": 1, "class_name": "2組"}) == [student_ids[3]]
+    # 偶数番目と未投稿の生徒（最後）が介入対象
+    assert _ids({"intervention_flag": True}) == [student_ids[0], student_ids[2], student_ids[4], student_ids[5]]
+    assert _ids({"intervention_flag": False}) == [student_ids[1], student_ids[3]]
+    assert _ids({"phase": "整理・分析"}) == student_ids[:-1]
+    # コード・旧英語名でも同じフェーズとして絞り込む
+    assert _ids({"phase": "analysis"}) == _ids({"phase": "verification"}) == student_ids[:-1]
+    assert _ids({"phase": "未投稿"}) == [student_ids[-1]]
+    assert _ids({"phase": "発表準備"}) == []
+
+
+@pytest.mark.asyncio
+async def test_learning_progress_sort_and_cursor_pages(app_client):
+    client, SessionLocal = app_client
+    headers = await _create_user_with_token(SessionLocal, user_id=1, role=RoleEnum.teacher)
+    await _seed_cohort(SessionLocal, student_count=7)
+
+    everything = client.get(
+        "/dashboard/learning-progress", headers=headers, params={"sort": "last_posted_at", "order": "desc"}
+    ).json()
+    # 最終投稿が新しい順（未投稿は最後）、同じ日時はユーザーID順の逆
+    assert everything[-1]["last_posted_at"] is None
+    posted = [row["last_posted_at"] for row in everything if row["last_posted_at"]]
+    assert posted == sorted(posted, reverse=True)
+
+    pages, cursor = [], None
+    while True:
+        params = {"sort": "last_posted_at", "order": "desc", "limit": 3}
+        if cursor:
+            params["cursor"] = cursor
+        resp = client.get("/dashboard/learning-progress", headers=headers, params=params)
+        assert resp.status_code == 200
+        pages.append(resp.json())
+        cursor = resp.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+
+    assert [len(page) for page in pages] == [3, 3, 1]
+    assert [row for page in pages for row in page] == everything
+
+
+@pytest.mark.asyncio
+async def test_non_cognitive_abilities_sort_by_ability(app_client):
+    client, SessionLocal = app_client
+    headers = await _create_user_with_token(SessionLocal, user_id=1, role=RoleEnum.teacher)
+    student_ids = await _seed_cohort(SessionLocal, student_count=3)
+    await _seed_ability_points(SessionLocal, student_ids)
+
+    resp = client.get(
+        "/dashboard/non-cognitive-abilities",
+        headers=headers,
+        params={"sort": "ability:problem_setting", "order": "desc", "limit": 1},
+    )
+    assert resp.status_code == 200
+    assert [row["user_id"] for row in resp.json()] == [student_ids[0]]
+
+    rest = client.get(
+        "/dashboard/non-cognitive-abilities",
+        headers=headers,
+        params={"sort": "ability:problem_setting", "order": "desc", "cursor": resp.headers["X-Next-Cursor"]},
+    )
+    assert [row["user_id"] for row in rest.json()] == [student_ids[2], student_ids[1]]
+    assert "X-Next-Cursor" not in rest.headers
+
+    unknown = client.get("/dashboard/non-cognitive-abilities", headers=headers, params={"sort": "ability:unknown"})
+    assert unknown.status_code == 400
+    unsupported = client.get("/dashboard/learning-progress", headers=headers, params={"sort": "ability:problem_setting"})
+    assert unsupported.status_code == 400
+    invalid = client.get("/dashboard/learning-progress", headers=headers, params={"cursor": "not-a-cursor"})
+    assert invalid.status_code == 400
+
+
+async def _seed_periods(SessionLocal) -> tuple[int, int, int]:
+    """終了した評価期間2つ（1学期・2学期）と実施中の評価期間（3学期）を作成"""
+    today = datetime.utcnow().date()
+    now = datetime.utcnow()
+    periods = [
+        EvaluationPeriod(id=1, name="1学期", start_date=today - timedelta(days=90), end_date=today - timedelta(days=61)),
+        EvaluationPeriod(id=2, name="2学期", start_date=today - timedelta(days=60), end_date=today - timedelta(days=31)),
+        EvaluationPeriod(id=3, name="3学期", start_date=today - timedelta(days=30), end_date=today + timedelta(days=30)),
+    ]
+    async with SessionLocal() as db:
+        for period in periods:
+            period.created_at = period.updated_at = now
+        db.add_all(periods)
+        await db.commit()
+    return 1, 2, 3
+
+
+async def _add_post_with_ability(SessionLocal, user_id: int, ability_id: int, days_ago: int) -> None:
+    created_at = datetime.utcnow() - timedelta(days=days_ago)
+    async with SessionLocal() as db:
+        post = Post(user_id=user_id, problem="問い", content_1="内容", phase_label="情報収集", created_at=created_at, updated_at=created_at)
+        db.add(post)
+        await db.flush()
+        db.add(PostAbilityPoint(post_id=post.id, ability_id=ability_id, point=1.0))
+        await db.commit()
+
+
+@pytest.mark.asyncio
+async def test_ability_growth_between_snapshots_and_live(app_client):
+    client, SessionLocal = app_client
+    headers = await _create_user_with_token(SessionLocal, user_id=1, role=RoleEnum.teacher)
+    admin = await _create_user_with_token(SessionLocal, user_id=2, role=RoleEnum.admin)
+    async with SessionLocal() as db:
+        db.add_all([
+            NonCogAbility(id=1, code="problem_setting", name="課題設定力"),
+            NonCogAbility(id=2, code="information_gathering", name="情報収集力"),
+            User(id=1000, role=RoleEnum.student, full_name="Student 000", email="student0@example.com", grade=1),
+        ])
+        await db.commit()
+    term1, term2, term3 = await _seed_periods(SessionLocal)
+
+    # 1学期に1件、2学期に2件、3学期（実施中）に1件
+    for ability_id, days_ago in [(1, 70), (1, 45), (2, 40), (2, 5)]:
+        await _add_post_with_ability(SessionLocal, 1000, ability_id, days_ago)
+    async with SessionLocal() as db:
+        await student_summary_repository.refresh_student_summaries(db)
+        await db.commit()
+
+    # スナップショット作成前は比較できない
+    resp = client.get("/dashboard/ability-growth", headers=headers, params={"from_period_id": term1})
+    assert resp.status_code == 409
+
+    for period_id in (term1, term2):
+        resp = client.post(f"/admin/database/period-snapshots/{period_id}", headers=admin)
+        assert resp.json() == {"period_id": period_id, "row_count": 2}
+
+    resp = client.get("/dashboard/ability-growth", headers=headers, params={"from_period_id": term1, "to_period_id": term2})
+    assert resp.status_code == 200
+    growth = resp.json()
+    assert growth["to_period"]["live"] is False
+    [student] = growth["students"]
+    assert student["post_count"] == {"from": 1, "to": 3, "delta": 2}
+    assert student["abilities"] == {
+        "problem_setting": {"from": 1.0, "to": 2.0, "delta": 1.0},
+        "information_gathering": {"from": 0.0, "to": 1.0, "delta": 1.0},
+    }
+
+    # 実施中の期間は活動サマリーの現在の累計と比較する
+    for params in ({"from_period_id": term2, "to_period_id": term3}, {"from_period_id": term2}):
+        [student] = client.get("/dashboard/ability-growth", headers=headers, params=params).json()["students"]
+        assert student["post_count"] == {"from": 3, "to": 4, "delta": 1}
+        assert student["abilities"]["information_gathering"] == {"from": 1.0, "to": 2.0, "delta": 1.0}
+
+    # 比較元は終了した期間のみ
+    resp = client.get("/dashboard/ability-growth", headers=headers, params={"from_period_id": term3})
+    assert resp.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_intervention_flags_are_scanned_and_listed(app_client, db_engine):
+    client, SessionLocal = app_client
+    teacher = await _create_user_with_token(SessionLocal, user_id=1, role=RoleEnum.teacher)
+    admin = await _create_user_with_token(SessionLocal, user_id=2, role=RoleEnum.admin)
+    student_ids = await _seed_cohort(SessionLocal, student_count=6)
+
+    # 全生徒の集計は1文、フラグの書き込み・削除で計3文
+    statements = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db_engine.sync_engine, "before_cursor_execute", _record)
+    try:
+        resp = client.post("/admin/database/intervention-flags/scan", headers=admin)
+    finally:
+        event.remove(db_engine.sync_engine, "before_cursor_execute", _record)
+    assert resp.json() == {"flagged": 4, "cleared": 0}
+    assert len(statements) - 2 == 3
+
+    first = client.get("/dashboard/intervention-flags", headers=teacher).json()
+    # 最終投稿（3週間前）から14日後にフラグが付いた生徒が先、未投稿の生徒は登録から14日後（=スキャン時点）
+    assert [row["user_id"] for row in first] == [student_ids[0], student_ids[2], student_ids[4], student_ids[5]]
+    assert first[-1]["last_posted_at"] is None
+
+    page = client.get("/dashboard/intervention-flags", headers=teacher, params={"limit": 3})
+    rest = client.get(
+        "/dashboard/intervention-flags", headers=teacher, params={"cursor": page.headers["X-Next-Cursor"]}
+    )
+    assert [row["user_id"] for row in page.json() + rest.json()] == [row["user_id"] for row in first]
+    assert client.get("/dashboard/intervention-flags", headers=teacher, params={"grade": 2}).json() == [
+        row for row in first if row["user_id"] == student_ids[4]
+    ]
+
+    # 投稿した生徒は次のスキャンを待たずに一覧から外れ、スキャンでフラグが削除される
+    now = datetime.utcnow()
+    async with SessionLocal() as db:
+        db.add(Post(user_id=student_ids[0], problem="問い", content_1="内容", phase_label="情報収集", created_at=now, updated_at=now))
+        await db.flush()
+        await student_summary_repository.refresh_student_summaries(db, [student_ids[0]])
+        await db.commit()
+    listed = client.get("/dashboard/intervention-flags", headers=teacher).json()
+    assert listed == first[1:]
+
+    assert client.post("/admin/database/intervention-flags/scan", headers=admin).json() == {"flagged": 3, "cleared": 1}
+    rescanned = client.get("/dashboard/intervention-flags", headers=teacher).json()
+    # 再スキャンしても flagged_since は変わらない
+    assert [row["flagged_since"] for row in rescanned] == [row["flagged_since"] for row in listed]
+    assert client.get("/dashboard/intervention-flags").status_code in (401, 403)
+
+
+@pytest.mark.asyncio
+async def test_intervention_scan_keeps_flags_stored_in_whole_seconds(app_client, db_engine):
+    client, SessionLocal = app_client
+    admin = await _create_user_with_token(SessionLocal, user_id=2, role=RoleEnum.admin)
+    await _seed_cohort(SessionLocal, student_count=6)
+
+    # MySQLの TIMESTAMP 列のように、フラグの日時を秒未満を切り捨てて保存する（SQLiteには文字列で渡る）
+    def _truncate(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("INSERT INTO student_intervention_flags"):
+            parameters = tuple(
+                re.sub(r"^(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d)\.\d+$", r"\1", value) if isinstance(value, str) else value
+                for value in parameters
+            )
+        return statement, parameters
+
+    event.listen(db_engine.sync_engine, "before_cursor_execute", _truncate, retval=True)
+    try:
+        assert client.post("/admin/database/intervention-flags/scan", headers=admin).json() == {"flagged": 4, "cleared": 0}
+        assert client.post("/admin/database/intervention-flags/scan", headers=admin).json() == {"flagged": 4, "cleared": 0}
+    finally:
+        event.remove(db_engine.sync_engine, "before_cursor_execute", _truncate)
+    async with SessionLocal() as db:
+        assert len((await db.execute(select(StudentInterventionFlag))).scalars().all()) == 4
+
+
+@pytest.mark.asyncio
+async def test_class_stats(app_client, db_engine):
+    client, SessionLocal = app_client
+    headers = await _create_user_with_token(SessionLocal, user_id=1, role=RoleEnum.teacher)
+    student_ids = await _seed_cohort(SessionLocal, student_count=6)
+    await _seed_ability_points(SessionLocal, student_ids)
+    async with SessionLocal() as db:
+        await ability_registry.load(db)
+
+    count, resp = _count_statements(db_engine, client, "/dashboard/classes", headers)
+    assert resp.status_code == 200
+    # 件数・フェーズ分布・能力スコアの3文のみ
+    assert count == 3
+    classes = {(row["grade"], row["class_name"]): row for row in resp.json()}
+
+    # 学年: 1 + i % 3、クラス: 1 + i % 2 → 1年1組は 0番目、1年2組は 3番目の生徒
+    assert set(classes) == {(1, "1組"), (1, "2組"), (2, "1組"), (2, "2組"), (3, "1組"), (3, "2組")}
+    first = classes[(1, "1組")]
+    assert first["student_count"] == 1
+    assert first["active_count"] == 1  # 能力ポイント付きの投稿（直近）がある
+    assert first["active_ratio"] == 1.0
+    assert first["intervention_count"] == 0
+    assert first["phase_distribution"] == {"情報収集": 1}
+    assert first["abilities"]["problem_setting"] == {"mean": 3.0, "median": 3.0, "p90": 3.0}
+
+    no_posts = classes[(3, "2組")]
+    assert no_posts["active_ratio"] == 0.0
+    assert no_posts["intervention_count"] == 1
+    assert no_posts["phase_distribution"] == {"未投稿": 1}
+    assert no_posts["abilities"]["information_gathering"] == {"mean": 0.0, "median": 0.0, "p90": 0.0}
+
+    only_grade = client.get("/dashboard/classes", headers=headers, params={"grade": 2}).json()
+    assert [(row["grade"], row["class_name"]) for row in only_grade] == [(2, "1組"), (2, "2組")]
+
+
+def test_class_stats_statistics_are_vectorized_per_ability():
+    stats = class_stats_service.summarize_scores(np.array([[0.0, 1.0], [1.0, 1.0], [2.0, 1.0], [10.0, 1.0]]))
+    assert stats["mean"].tolist() == [3.25, 1.0]
+    assert stats["median"].tolist() == [1.5, 1.0]
+    assert stats["p90"][0] == pytest.approx(7.6)
+
+
+@pytest.mark.asyncio
+async def test_dashboard_export_streams_csv_and_ndjson(app_client, monkeypatch):
+    client, SessionLocal = app_client
+    headers = await _create_user_with_token(SessionLocal, user_id=1, role=RoleEnum.teacher)
+    student_ids = await _seed_cohort(SessionLocal, student_count=5)
+    await _seed_ability_points(SessionLocal, student_ids)
+    # 複数のバッチに分かれても全件を出力する
+    monkeypatch.setattr(dashboard_service, "EXPORT_BATCH_SIZE", 2)
+
+    expected = client.get("/dashboard/learning-progress", headers=headers, params={"grade": 1}).json()
+    resp = client.get("/dashboard/learning-progress", headers=headers, params={"grade": 1, "format": "ndjson"})
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("application/x-ndjson")
+    assert [json.loads(line) for line in resp.text.splitlines()] == expected
+
+    expected = client.get("/dashboard/non-cognitive-abilities", headers=headers).json()
+    resp = client.get("/dashboard/non-cognitive-abilities", headers=headers, params={"format": "csv"})
+    assert resp.status_code == 200
+    assert 'filename="non-cognitive-abilities.csv"' in resp.headers["content-disposition"]
+    rows = list(csv.DictReader(io.StringIO(resp.content.decode("utf-8-sig"))))
+    assert [int(row["user_id"]) for row in rows] == [row["user_id"] for row in expected]
+    assert float(rows[0]["problem_setting"]) == expected[0]["abilities"]["problem_setting"]
+    assert rows[0]["problem_setting_signal"] == ""
+
+    # 不正な条件はストリーミング開始前に400を返す
+    resp = client.get("/dashboard/learning-progress", headers=headers, params={"format": "csv", "sort": "unknown"})
+    assert resp.status_code == 400
+    assert client.get("/dashboard/learning-progress", headers=headers, params={"format": "xml"}).status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_overview_matches_individual_endpoints_with_shared_queries(app_client, db_engine):
+    client, SessionLocal = app_client
+    headers = await _create_user_with_token(SessionLocal, user_id=1, role=RoleEnum.teacher)
+    student_ids = await _seed_cohort(SessionLocal, student_count=4)
+    await _seed_ability_points(SessionLocal, student_ids)
+    async with SessionLocal() as db:
+        await ability_registry.load(db)
+
+    count, resp = _count_statements(db_engine, client, "/dashboard/overview?limit=3&sort=post_count&order=desc", headers)
+    assert resp.status_code == 200
+    # 生徒一覧・全生徒の能力スコア（信号）・ページ内の能力スコアの3文（個別に呼ぶと1 + 3 = 4文）
+    assert count == 3
+    overview = resp.json()
+
+    params = {"limit": 3, "sort": "post_count", "order": "desc"}
+    progress = client.get("/dashboard/learning-progress", headers=headers, params=params)
+    abilities = client.get("/dashboard/non-cognitive-abilities", headers=headers, params=params)
+    assert overview == {"learning_progress": progress.json(), "non_cognitive_abilities": abilities.json()}
+    assert resp.headers["X-Next-Cursor"] == progress.headers["X-Next-Cursor"]
+
+
+@pytest.mark.asyncio
+async def test_student_detail_combines_posts_letters_and_abilities(app_client, db_engine):
+    client, SessionLocal = app_client
+    headers = await _create_user_with_token(SessionLocal, user_id=1, role=RoleEnum.teacher)
+    student_ids = await _seed_cohort(SessionLocal, student_count=2)
+    await _seed_ability_points(SessionLocal, student_ids)
+    async with SessionLocal() as db:
+        await ability_registry.load(db)
+
+    count, resp = _count_statements(db_engine, client, f"/dashboard/students/{student_ids[0]}", headers)
+    assert resp.status_code == 200
+    # バージョン確認・生徒・投稿・投稿の能力・手紙・手紙の能力・フェーズ集計・能力スコアの8文
+    assert count == 8
+    detail = resp.json()
+
+    assert detail["full_name"] == "Student 000"
+    assert detail["summary"]["post_count"] == 4
+    assert detail["summary"]["received_letters_count"] == 1
+    # 削除済みの投稿は含めない（新しい順）
+    assert len(detail["recent_posts"]) == 4
+    assert detail["recent_posts"][0]["ability_codes"] == ["problem_setting"]
+    assert all(post["ability_codes"] == [] for post in detail["recent_posts"][1:])
+    assert [letter["sender_name"] for letter in detail["received_letters"]] == ["Student 001"]
+    assert detail["received_letters"][0]["abilities"] == {"problem_setting": 1.0, "information_gathering": 1.5}
+    # 表記ゆれ（information_gathering / 情報収集）は表示名ごとにまとめる
+    assert [(phase["phase"], phase["post_count"]) for phase in detail["phase_timeline"]] == [
+        ("課題設定", 1), ("情報収集", 2), ("整理・分析", 1),
+    ]
+    assert detail["abilities"] == {"problem_setting": 3.0, "information_gathering": 1.5}
+
+    # 生徒でない・存在しないユーザーは404
+    assert client.get("/dashboard/students/1", headers=headers).status_code == 404
+    assert client.get("/dashboard/students/999999", headers=headers).status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_student_detail_cache_follows_data_version(app_client, db_engine):
+    client, SessionLocal = app_client
+    headers = await _create_user_with_token(SessionLocal, user_id=1, role=RoleEnum.teacher)
+    student_ids = await _seed_cohort(SessionLocal, student_count=2)
+    path = f"/dashboard/students/{student_ids[0]}"
+    first = client.get(path, headers=headers).json()
+
+    # キャッシュ済みの場合はバージョン確認の1文のみ
+    count, resp = _count_statements(db_engine, client, path, headers)
+    assert count == 1
+    assert resp.json() == first
+
+    # 他のワーカーでの書き込み（このプロセスのキャッシュは破棄されない）も活動サマリーの更新日時で反映される
+    now = datetime.utcnow()
+    async with SessionLocal() as db:
+        db.add(Post(user_id=student_ids[0], problem="新しい問い", content_1="内容", phase_label="発表準備", created_at=now, updated_at=now))
+        await student_summary_repository.record_post_created(
+            db, user_id=student_ids[0], phase_label="発表準備", phase_code=PhaseCode.presentation, question_changed=False, created_at=now, ability_ids=[],
+        )
+        await db.commit()
+    updated = client.get(path, headers=headers).json()
+    assert updated["summary"]["post_count"] == 4
+    assert updated["recent_posts"][0]["problem"] == "新しい問い"
+
+    # 本文のみの編集・いいね・判定による能力ポイントの増減も反映される
+    post_id = updated["recent_posts"][0]["id"]
+    async with SessionLocal() as db:
+        post = await db.get(Post, post_id)
+        post.content_1 = "書き直した内容"
+        post.updated_at = now + timedelta(seconds=1)
+        await db.commit()
+    assert client.get(path, headers=headers).json()["recent_posts"][0]["content_1"] == "書き直した内容"
+
+    async with SessionLocal() as db:
+        await post_repository.add_like(db, post_id, student_ids[1])
+        await db.commit()
+    assert client.get(path, headers=headers).json()["recent_posts"][0]["like_count"] == 1
+
+    async with SessionLocal() as db:
+        db.add(NonCogAbility(id=1, code="problem_setting", name="課題設定力"))
+        await db.flush()
+        await ability_registry.load(db)
+        await student_summary_repository.record_post_points_changed(db, user_id=student_ids[0], changes={1: 5.0})
+        await db.commit()
+    assert client.get(path, headers=headers).json()["abilities"] == {"problem_setting": 5.0}
@@ -0,0 +1,49 @@
+import pytest
+from sqlalchemy.dialects import mysql
+
+from app.core.database import update_returning
+from app.models.post import Post
+
+
+class _FakeResult:
+    def __init__(self, rowcount: int, lastrowid: int):
+        self.rowcount = rowcount
+        self.lastrowid = lastrowid
+
+
+class _MySQLSession:
+    """MySQLに接続したセッションの代わりに、実行した文を記録して固定の結果を返す"""
+
+    def __init__(self, result: _FakeResult):
+        self.result = result
+        self.statements = []
+
+    def get_bind(self):
+        return self
+
+    @property
+    def dialect(self):
+        return mysql.dialect()
+
+    async def execute(self, stmt):
+        self.statements.append(stmt)
+        return self.result
+
+
+@pytest.mark.asyncio
+async def test_update_returning_reads_mysql_value_from_last_insert_id():
+    db = _MySQLSession(_FakeResult(rowcount=1, lastrowid=8))
+    like_count = await update_returning(
+        db, Post, where=(Post.id == 3,), column=Post.like_count, value=Post.like_count + 1
+    )
+    assert like_count == 8
+
+    [stmt] = db.statements
+    sql = str(stmt.compile(dialect=mysql.dialect()))
+    assert sql == "UPDATE posts SET like_count=last_insert_id(posts.like_count + %s) WHERE posts.id = %s"
+
+    # 行が一致しない場合は lastrowid（前回の値）を返さない
+    db = _MySQLSession(_FakeResult(rowcount=0, lastrowid=8))
+    assert await update_returning(
+        db, Post, where=(Post.id == 3,), column=Post.like_count, value=Post.like_count + 1
+    ) is None
@@ -0,0 +1,181 @@
+import asyncio
+import pytest
+from datetime import datetime
+
+from sqlalchemy import event, func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.core.config import settings
+from app.core.security import hash_password
+from app.models.base import Base
+from app.models.post import Post
+from app.models.post_like import PostLike
+from app.models.user import RoleEnum, User, UserLocalAccount
+from app.services import auth_service
+from app.services.like_buffer_service import LikeWriteBuffer, like_write_buffer
+
+
+async def _seed_post_and_users(SessionLocal, user_count: int) -> int:
+    async with SessionLocal() as db:
+        for user_id in range(1, user_count + 1):
+            db.add(User(
+                id=user_id,
+                role=RoleEnum.student,
+                full_name=f"Student {user_id}",
+                email=f"student{user_id}@example.com",
+            ))
+        now = datetime.utcnow()
+        post = Post(
+            user_id=1,
+            problem="人気の投稿",
+            content_1="集会で共有された投稿",
+            phase_label="まとめ・表現",
+            created_at=now,
+            updated_at=now,
+        )
+        db.add(post)
+        await db.commit()
+        return post.id
+
+
+async def _like_state(SessionLocal, post_id: int) -> tuple[int, int]:
+    async with SessionLocal() as db:
+        rows = (await db.execute(
+            select(func.count(PostLike.id)).where(PostLike.post_id == post_id)
+        )).scalar_one()
+        counter = (await db.execute(select(Post.like_count).where(Post.id == post_id))).scalar_one()
+        return rows, counter
+
+
+@pytest.mark.asyncio
+async def test_buffer_loses_no_likes_across_flushes_and_shutdown(app_client, monkeypatch):
+    _, SessionLocal = app_client
+    monkeypatch.setattr(settings, "like_flush_max_batch", 7)
+    monkeypatch.setattr(settings, "like_flush_interval_ms", 10)
+    post_id = await _seed_post_and_users(SessionLocal, user_count=50)
+
+    buffer = LikeWriteBuffer()
+    buffer.start(SessionLocal)
+
+    async def like(user_id: int):
+        buffer.record(post_id, user_id, liked=True, db_liked=False)
+        await asyncio.sleep(0)
+
+    await asyncio.gather(*(like(user_id) for user_id in range(1, 51)))
+    # 取り消し→再いいねは1件の意図にまとめられる
+    buffer.record(post_id, 3, liked=False, db_liked=True)
+    buffer.record(post_id, 3, liked=True, db_liked=True)
+    await buffer.stop()
+
+    assert buffer.pending_count == 0
+    assert await _like_state(SessionLocal, post_id) == (50, 50)
+
+
+@pytest.mark.asyncio
+async def test_buffer_requeues_intents_when_flush_fails(app_client):
+    _, SessionLocal = app_client
+    post_id = await _seed_post_and_users(SessionLocal, user_count=3)
+
+    def failing_factory():
+        raise RuntimeError("database unavailable")
+
+    buffer = LikeWriteBuffer()
+    buffer._session_factory = failing_factory
+    buffer.record(post_id, 1, liked=True, db_liked=False)
+    buffer.record(post_id, 2, liked=True, db_liked=False)
+    await buffer.flush()
+
+    assert buffer.pending_count == 2
+    assert buffer.pending_delta(post_id) == 2
+
+    # 失敗中に届いた取り消しは再投入された意図より優先される
+    buffer.record(post_id, 2, liked=False, db_liked=False)
+    buffer._session_factory = SessionLocal
+    await buffer.stop()
+
+    assert await _like_state(SessionLocal, post_id) == (1, 1)
+
+
+@pytest.mark.asyncio
+async def test_like_endpoint_returns_optimistic_count_in_write_behind_mode(app_client, monkeypatch):
+    client, SessionLocal = app_client
+    post_id = await _seed_post_and_users(SessionLocal, user_count=1)
+    async with SessionLocal() as db:
+        db.add(UserLocalAccount(user_id=1, login_id="student1", password_hash=hash_password("pass123")))
+        await db.commit()
+        login = await auth_service.login_with_local(
+            db=db, login_id="student1", password="pass123", ip_address=None, user_agent=None
+        )
+    headers = {"Authorization": f"Bearer {login.token.access_token}"}
+
+    monkeypatch.setattr(settings, "like_write_behind_enabled", True)
+    like_write_buffer._session_factory = SessionLocal
+    try:
+        resp = client.post(f"/posts/{post_id}/like", headers=headers)
+        assert resp.status_code == 201
+        assert resp.json() == {"post_id": post_id, "like_count": 1, "liked_by_me": True}
+        # まだDBには書き込まれていない
+        assert await _like_state(SessionLocal, post_id) == (0, 0)
+    finally:
+        await like_write_buffer.stop()
+
+    assert await _like_state(SessionLocal, post_id) == (1, 1)
+
+
+@pytest.mark.asyncio
+async def test_read_endpoints_reflect_buffered_likes(app_client, monkeypatch):
+    client, SessionLocal = app_client
+    post_id = await _seed_post_and_users(SessionLocal, user_count=1)
+    async with SessionLocal() as db:
+        db.add(UserLocalAccount(user_id=1, login_id="student1", password_hash=hash_password("pass123")))
+        await db.commit()
+        login = await auth_service.login_with_local(
+            db=db, login_id="student1", password="pass123", ip_address=None, user_agent=None
+        )
+    headers = {"Authorization": f"Bearer {login.token.access_token}"}
+
+    monkeypatch.setattr(settings, "like_write_behind_enabled", True)
+    like_write_buffer._session_factory = SessionLocal
+    try:
+        client.post(f"/posts/{post_id}/like", headers=headers)
+        assert await _like_state(SessionLocal, post_id) == (0, 0)
+
+        # まだ書き込まれていない自分のいいねが一覧・詳細・一括取得に反映される
+        feed_post = client.get("/posts", headers=headers).json()["posts"][0]
+        detail = client.get(f"/posts/{post_id}", headers=headers).json()
+        batch_post = client.get("/posts/batch", params={"ids": str(post_id)}, headers=headers).json()["posts"][0]
+        for post in (feed_post, detail, batch_post):
+            assert (post["like_count"], post["liked_by_me"]) == (1, True)
+
+        # 未ログインの閲覧者にもいいね数は反映される
+        assert client.get("/posts").json()["posts"][0]["like_count"] == 1
+    finally:
+        await like_write_buffer.stop()
+
+
+@pytest.mark.asyncio
+async def test_flush_drops_likes_for_deleted_posts(tmp_path):
+    # 外部キー違反を再現するため、外部キー制約を有効にしたファイルのDBを使う
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'likes.db'}")
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def _enable_foreign_keys(dbapi_connection, connection_record):
+        dbapi_connection.execute("PRAGMA foreign_keys=ON")
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    SessionLocal = async_sessionmaker(engine, expire_on_commit=False)
+    try:
+        post_id = await _seed_post_and_users(SessionLocal, user_count=2)
+        buffer = LikeWriteBuffer()
+        buffer._session_factory = SessionLocal
+        buffer.record(post_id + 1, 1, liked=True, db_liked=False)
+        buffer.record(post_id, 1, liked=True, db_liked=False)
+        buffer.record(post_id, 2, liked=True, db_liked=False)
+        await buffer.flush()
+
+        # 削除された投稿へのいいねだけを破棄し、他のいいねは書き込む
+        assert buffer.pending_count == 0
+        assert await _like_state(SessionLocal, post_id) == (2, 2)
+    finally:
+        await engine.dispose()
@@ -0,0 +1,369 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.models.base import Base
+from app.models.non_cog_ability import NonCogAbility
+from app.models.post import AbilityRubric, Post
+from app.models.post_ability_point import PostAbilityPoint, PostAbilityPointSource
+from app.models.post_analysis_job import PostAnalysisJob, PostAnalysisJobStatus
+from app.models.student_activity_summary import StudentAbilitySummary
+from app.models.user import RoleEnum, User
+from app.repositories import post_analysis_job_repository, student_summary_repository
+from app.services import analysis_cache_service, post_analysis_service
+from app.services.ability_analyzer_service import ability_analyzer_service
+from app.services.ability_registry_service import ability_registry
+from app.services.post_analysis_service import PostAnalysisWorker, claim_jobs, run_job
+from tests.test_posts_api import _create_user_with_token
+
+
+class _FakeAnalyzer:
+    """OpenAI APIの代わりに判定結果を返す（error を渡すと失敗した結果を返す）"""
+
+    def __init__(self):
+        self.calls = 0
+        self.error: str | None = None
+
+    async def __call__(self, content, problem):
+        self.calls += 1
+        if self.error:
+            return {"matched_abilities": [], "analysis_summary": "", "error": self.error}
+        return {
+            "matched_abilities": [
+                {"code": "information_gathering", "name": "情報収集力", "level": 3, "level_reason": "", "reason": ""},
+                {"code": "unknown", "name": "不明", "level": 2, "level_reason": "", "reason": ""},
+            ],
+            "analysis_summary": f"{content}の判定",
+        }
+
+
+@pytest.fixture
+def analyzer(monkeypatch):
+    fake = _FakeAnalyzer()
+    monkeypatch.setattr(ability_analyzer_service, "_request_analysis", fake)
+    analysis_cache_service.analysis_cache.clear()
+    yield fake
+    analysis_cache_service.analysis_cache.clear()
+
+
+async def _seed_abilities(SessionLocal) -> None:
+    now = datetime.utcnow()
+    async with SessionLocal() as db:
+        db.add_all([
+            NonCogAbility(id=1, code="problem_setting", name="課題設定力"),
+            NonCogAbility(id=2, code="information_gathering", name="情報収集力"),
+            AbilityRubric(ability_id=2, level=3, title="標準的", description="", coefficient=1.5, created_at=now, updated_at=now),
+        ])
+        await db.commit()
+        await ability_registry.load(db)
+
+
+def _create_post(client, headers, **overrides) -> dict:
+    payload = {"problem": "問い", "content_1": "図書館で調べた", "phase_label": "情報収集", "ability_codes": ["problem_setting"]}
+    resp = client.post("/posts", headers=headers, json={**payload, **overrides})
+    assert resp.status_code == 201
+    return resp.json()
+
+
+async def _get_job(SessionLocal, post_id: int) -> PostAnalysisJob:
+    async with SessionLocal() as db:
+        return await db.get(PostAnalysisJob, post_id)
+
+
+@pytest.mark.asyncio
+async def test_post_creation_enqueues_job_and_worker_stores_analysis(app_client, analyzer):
+    client, SessionLocal = app_client
+    headers = await _create_user_with_token(SessionLocal, user_id=100, role=RoleEnum.student)
+    await _seed_abilities(SessionLocal)
+    post = _create_post(client, headers)
+
+    # 投稿時には判定しない
+    assert analyzer.calls == 0
+    assert (await _get_job(SessionLocal, post["id"])).status == PostAnalysisJobStatus.pending
+
+    jobs = await claim_jobs(SessionLocal, limit=4)
+    assert [job.post_id for job in jobs] == [post["id"]]
+    assert await run_job(SessionLocal, jobs[0]) is True
+
+    job = await _get_job(SessionLocal, post["id"])
+    assert (job.status, job.attempts, job.locked_at) == (PostAnalysisJobStatus.done, 1, None)
+    async with SessionLocal() as db:
+        saved = await db.get(Post, post["id"])
+        assert saved.ai_raw_label["analysis_summary"] == "図書館で調べたの判定"
+        points = (await db.execute(
+            select(PostAbilityPoint.source, PostAbilityPoint.ability_id, PostAbilityPoint.quality_level, PostAbilityPoint.point)
+            .where(PostAbilityPoint.post_id == post["id"])
+            .order_by(PostAbilityPoint.ability_id)
+        )).all()
+        # 生徒が選んだ能力は残し、判定した能力はルーブリックの係数のポイントで追加する
+        assert [tuple(row[:3]) + (float(row[3]),) for row in points] == [
+            (PostAbilityPointSource.selected, 1, 1, 1.0),
+            (PostAbilityPointSource.analysis, 2, 3, 1.5),
+        ]
+        summary = await db.get(StudentAbilitySummary, (100, 2))
+        assert float(summary.post_points) == 1.5
+
+    # 投稿の能力コードは生徒が選んだもののまま
+    assert client.get(f"/posts/batch?ids={post['id']}", headers=headers).json()["posts"][0]["ability_codes"] == ["problem_setting"]
+    assert await claim_jobs(SessionLocal, limit=4) == []
+
+
+@pytest.mark.asyncio
+async def test_failed_analysis_retries_with_backoff_then_fails(app_client, analyzer, monkeypatch):
+    client, SessionLocal = app_client
+    headers = await _create_user_with_token(SessionLocal, user_id=101, role=RoleEnum.student)
+    await _seed_abilities(SessionLocal)
+    post = _create_post(client, headers)
+    monkeypatch.setattr(post_analysis_service.settings, "post_analysis_max_attempts", 2)
+    analyzer.error = "rate limited"
+
+    [job] = await claim_jobs(SessionLocal, limit=4)
+    assert await run_job(SessionLocal, job) is False
+    saved = await _get_job(SessionLocal, post["id"])
+    assert saved.status == PostAnalysisJobStatus.pending
+    assert saved.last_error == "rate limited"
+    assert saved.run_after > datetime.utcnow() + timedelta(seconds=20)
+    # 待ち時間の間は取り出さない
+    assert await claim_jobs(SessionLocal, limit=4) == []
+
+    async with SessionLocal() as db:
+        await db.execute(update(PostAnalysisJob).values(run_after=datetime.utcnow() - timedelta(seconds=1)))
+        await db.commit()
+    [job] = await claim_jobs(SessionLocal, limit=4)
+    assert job.attempts == 2
+    await run_job(SessionLocal, job)
+    assert (await _get_job(SessionLocal, post["id"])).status == PostAnalysisJobStatus.failed
+
+    # 管理者は失敗したジョブを再実行できる
+    admin = await _create_user_with_token(SessionLocal, user_id=1, role=RoleEnum.admin)
+    assert client.post("/admin/database/post-analysis-jobs/retry-failed", headers=admin).json() == {"retried": 1}
+    stats = client.get("/admin/database/post-analysis-jobs/stats", headers=admin).json()
+    assert stats["jobs"]["pending"] == 1
+    assert post_analysis_service.retry_delay(1) < post_analysis_service.retry_delay(2) <= timedelta(hours=1)
+
+
+@pytest.mark.asyncio
+async def test_update_while_running_reruns_and_stale_locks_are_released(app_client, analyzer):
+    client, SessionLocal = app_client
+    headers = await _create_user_with_token(SessionLocal, user_id=102, role=RoleEnum.student)
+    await _seed_abilities(SessionLocal)
+    post = _create_post(client, headers)
+    [job] = await claim_jobs(SessionLocal, limit=4)
+
+    # 判定中に本文が更新された場合は、完了後にもう一度判定する（フェーズのみの変更では登録しない）
+    update_payload = {"problem": "問い", "content_1": "インタビューした", "phase_label": "情報収集", "ability_codes": []}
+    assert client.put(f"/posts/{post['id']}", headers=headers, json=update_payload).status_code == 200
+    await run_job(SessionLocal, job)
+    assert (await _get_job(SessionLocal, post["id"])).status == PostAnalysisJobStatus.pending
+
+    [job] = await claim_jobs(SessionLocal, limit=4)
+    assert job.attempts == 1
+    # 停止したワーカーのジョブ（ロックの期限切れ）は取り出し直す
+    async with SessionLocal() as db:
+        await db.execute(update(PostAnalysisJob).values(locked_at=datetime.utcnow() - timedelta(hours=1)))
+        await db.commit()
+    [reclaimed] = await claim_jobs(SessionLocal, limit=4)
+    assert reclaimed.post_id == post["id"]
+    # 期限切れ後の元のワーカーの結果は記録しない
+    await run_job(SessionLocal, job)
+    assert (await _get_job(SessionLocal, post["id"])).status == PostAnalysisJobStatus.running
+    await run_job(SessionLocal, reclaimed)
+    assert (await _get_job(SessionLocal, post["id"])).status == PostAnalysisJobStatus.done
+
+    update_payload["phase_label"] = "整理・分析"
+    assert client.put(f"/posts/{post['id']}", headers=headers, json=update_payload).status_code == 200
+    assert (await _get_job(SessionLocal, post["id"])).status == PostAnalysisJobStatus.done
+
+
+@pytest.mark.asyncio
+async def test_worker_runs_jobs_with_bounded_concurrency(tmp_path, analyzer, monkeypatch):
+    # インメモリDBは接続を共有し、同時に実行するセッションのトランザクションが混ざるため、ファイルのDBを使う
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'jobs.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    SessionLocal = async_sessionmaker(engine, expire_on_commit=False)
+    await _seed_abilities(SessionLocal)
+    now = datetime.utcnow()
+    async with SessionLocal() as db:
+        db.add(User(id=103, role=RoleEnum.student, full_name="Student", email="student@example.com"))
+        posts = [
+            Post(user_id=103, problem="問い", content_1=f"活動{i}", phase_label="情報収集", created_at=now, updated_at=now)
+            for i in range(5)
+        ]
+        db.add_all(posts)
+        await db.flush()
+        await post_analysis_job_repository.enqueue(db, [post.id for post in posts], now=now)
+        await db.commit()
+    monkeypatch.setattr(post_analysis_service.settings, "post_analysis_concurrency", 2)
+
+    active, peak = 0, 0
+    gate = asyncio.Event()
+
+    async def _slow_analysis(content, problem):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await gate.wait()
+        active -= 1
+        return {"matched_abilities": [{"code": "information_gathering", "level": 3}], "analysis_summary": content}
+
+    monkeypatch.setattr(ability_analyzer_service, "_request_analysis", _slow_analysis)
+    worker = PostAnalysisWorker()
+    worker.start(SessionLocal)
+    try:
+        # 負荷の高い環境でも判定の開始を待てるよう、固定の待ち時間ではなく同時実行数を確認する
+        for _ in range(100):
+            if active == 2:
+                break
+            await asyncio.sleep(0.02)
+        assert worker.running_count == 2
+        gate.set()
+        for _ in range(200):
+            async with SessionLocal() as db:
+                counts = await post_analysis_job_repository.count_jobs_by_status(db)
+            if counts["done"] == len(posts):
+                break
+            await asyncio.sleep(0.05)
+        async with SessionLocal() as db:
+            summary = await db.get(StudentAbilitySummary, (103, 2))
+    finally:
+        await worker.stop()
+        await engine.dispose()
+
+    assert counts["done"] == len(posts)
+    assert peak == 2
+    # 同じ生徒の投稿を同時に判定しても、サマリーのポイントは失われない
+    assert float(summary.post_points) == 1.5 * len(posts)
+
+
+async def _ability_points(SessionLocal, post_id: int) -> list[tuple]:
+    async with SessionLocal() as db:
+        rows = (await db.execute(
+            select(PostAbilityPoint.source, PostAbilityPoint.action_index, PostAbilityPoint.ability_id, PostAbilityPoint.point)
+            .where(PostAbilityPoint.post_id == post_id)
+            .order_by(PostAbilityPoint.source, PostAbilityPoint.action_index, PostAbilityPoint.ability_id)
+        )).all()
+    return [tuple(row[:3]) + (float(row[3]),) for row in rows]
+
+
+async def _assert_summary_matches_rebuild(SessionLocal, user_id: int) -> dict[int, float]:
+    """差分で更新したサマリーのポイントが、元データからの再計算と一致することを確認する"""
+    async def _post_points() -> dict[int, float]:
+        async with SessionLocal() as db:
+            rows = (await db.execute(
+                select(StudentAbilitySummary.ability_id, StudentAbilitySummary.post_points)
+                .where(StudentAbilitySummary.user_id == user_id)
+            )).all()
+        return {ability_id: float(points) for ability_id, points in rows if points}
+
+    incremental = await _post_points()
+    async with SessionLocal() as db:
+        await student_summary_repository.refresh_student_summaries(db, [user_id])
+        await db.commit()
+    assert incremental == await _post_points()
+    return incremental
+
+
+@pytest.mark.asyncio
+async def test_analysis_keeps_legacy_points_with_any_action_index(app_client, analyzer):
+    client, SessionLocal = app_client
+    headers = await _create_user_with_token(SessionLocal, user_id=104, role=RoleEnum.student)
+    await _seed_abilities(SessionLocal)
+    now = datetime.utcnow()
+    async with SessionLocal() as db:
+        post = Post(user_id=104, problem="問い", content_1="図書館で調べた", phase_label="情報収集", created_at=now, updated_at=now)
+        db.add(post)
+        await db.flush()
+        # シードデータ・以前の行は action_index 1〜3 を使う（判定する能力と同じ能力も含む）
+        db.add_all([
+            PostAbilityPoint(post_id=post.id, ability_id=1, action_index=1, quality_level=3, point=3.0),
+            PostAbilityPoint(post_id=post.id, ability_id=2, action_index=1, quality_level=2, point=2.5),
+            PostAbilityPoint(post_id=post.id, ability_id=2, action_index=3, quality_level=4, point=4.0),
+        ])
+        await post_analysis_job_repository.enqueue(db, [post.id], now=now)
+        await student_summary_repository.refresh_student_summaries(db, [104])
+        await db.commit()
+        post_id = post.id
+    selected = PostAbilityPointSource.selected
+    legacy = [(selected, 1, 1, 3.0), (selected, 1, 2, 2.5), (selected, 3, 2, 4.0)]
+
+    [job] = await claim_jobs(SessionLocal, limit=4)
+    assert await run_job(SessionLocal, job) is True
+    analyzed = [(PostAbilityPointSource.analysis, 0, 2, 1.5)]
+    assert await _ability_points(SessionLocal, post_id) == analyzed + legacy
+    assert await _assert_summary_matches_rebuild(SessionLocal, 104) == {1: 3.0, 2: 8.0}
+    # 投稿の能力コードは以前の行から求める
+    batch = client.get(f"/posts/batch?ids={post_id}", headers=headers).json()["posts"][0]
+    assert batch["ability_codes"] == ["problem_setting", "information_gathering"]
+
+    # 判定後に本文を編集しても、以前の行は重複・削除されず、判定の行だけが置き換わる
+    update_payload = {
+        "problem": "問い",
+        "content_1": "インタビューした",
+        "phase_label": "情報収集",
+        "ability_codes": ["problem_setting", "information_gathering"],
+    }
+    assert client.put(f"/posts/{post_id}", headers=headers, json=update_payload).status_code == 200
+    assert await _ability_points(SessionLocal, post_id) == analyzed + legacy
+    [job] = await claim_jobs(SessionLocal, limit=4)
+    assert await run_job(SessionLocal, job) is True
+    assert await _ability_points(SessionLocal, post_id) == analyzed + legacy
+    assert await _assert_summary_matches_rebuild(SessionLocal, 104) == {1: 3.0, 2: 8.0}
+
+
+@pytest.mark.asyncio
+async def test_stale_job_writes_nothing(app_client, analyzer, monkeypatch):
+    client, SessionLocal = app_client
+    headers = await _create_user_with_token(SessionLocal, user_id=105, role=RoleEnum.student)
+    await _seed_abilities(SessionLocal)
+    post = _create_post(client, headers)
+    [job] = await claim_jobs(SessionLocal, limit=4)
+
+    # 判定中（OpenAI APIの呼び出し中）に本文が更新され、version が進んだ
+    async def _analysis_then_edit(content, problem):
+        async with SessionLocal() as db:
+            await post_analysis_job_repository.enqueue(db, [post["id"]], now=datetime.utcnow())
+            await db.commit()
+        return {"matched_abilities": [{"code": "information_gathering", "level": 3}], "analysis_summary": content}
+
+    monkeypatch.setattr(ability_analyzer_service, "_request_analysis", _analysis_then_edit)
+    assert await run_job(SessionLocal, job) is True
+    monkeypatch.setattr(ability_analyzer_service, "_request_analysis", analyzer)
+
+    # 古い本文の判定結果は投稿・能力ポイント・サマリーのいずれにも書き込まない
+    async with SessionLocal() as db:
+        assert (await db.get(Post, post["id"])).ai_raw_label is None
+        assert await db.get(StudentAbilitySummary, (105, 2)) is None
+    assert [row[0] for row in await _ability_points(SessionLocal, post["id"])] == [PostAbilityPointSource.selected]
+    assert (await _get_job(SessionLocal, post["id"])).status == PostAnalysisJobStatus.pending
+
+    # 再実行で最新の本文の結果を書き込む
+    [job] = await claim_jobs(SessionLocal, limit=4)
+    assert await run_job(SessionLocal, job) is True
+    async with SessionLocal() as db:
+        assert (await db.get(Post, post["id"])).ai_raw_label is not None
+    assert await _assert_summary_matches_rebuild(SessionLocal, 105) == {1: 1.0, 2: 1.5}
+
+
+@pytest.mark.asyncio
+async def test_job_completes_when_locked_at_is_stored_in_whole_seconds(app_client, analyzer):
+    client, SessionLocal = app_client
+    headers = await _create_user_with_token(SessionLocal, user_id=106, role=RoleEnum.student)
+    await _seed_abilities(SessionLocal)
+    post = _create_post(client, headers)
+    [job] = await claim_jobs(SessionLocal, limit=4)
+
+    # MySQLの TIMESTAMP 列は秒未満を保存しない
+    async with SessionLocal() as db:
+        saved = await db.get(PostAnalysisJob, post["id"])
+        saved.locked_at = saved.locked_at.replace(microsecond=0) - timedelta(seconds=1)
+        await db.commit()
+
+    assert await run_job(SessionLocal, job) is True
+    saved = await _get_job(SessionLocal, post["id"])
+    assert (saved.status, saved.locked_at, saved.claim_token) == (PostAnalysisJobStatus.done, None, None)
+    async with SessionLocal() as db:
+        assert (await db.get(Post, post["id"])).ai_raw_label is not None
@@ -0,0 +1,582 @@
+import pytest
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, select
+
+from app.core.security import hash_password
+from app.models.non_cog_ability import NonCogAbility
+from app.models.post import PhaseCode, Post
+from app.models.post_ability_point import PostAbilityPoint
+from app.models.post_like import PostLike
+from app.models.student_activity_summary import StudentActivitySummary
+from app.models.user import RoleEnum, User, UserLocalAccount
+from app.repositories import post_repository, student_summary_repository
+from app.services import admin_user_service, auth_service
+from app.services.ability_registry_service import ability_registry
+
+
+async def _create_user_with_token(SessionLocal, *, user_id: int, role: RoleEnum) -> dict:
+    """ユーザーを作成してAuthorizationヘッダーを返す"""
+    login_id = f"user{user_id}"
+    async with SessionLocal() as db:
+        user = User(
+            id=user_id,
+            role=role,
+            full_name=f"User {user_id}",
+            email=f"user{user_id}@example.com",
+        )
+        db.add(user)
+        await db.flush()
+        db.add(
+            UserLocalAccount(
+                user_id=user.id,
+                login_id=login_id,
+                password_hash=hash_password("pass123"),
+            )
+        )
+        await db.commit()
+
+        result = await auth_service.login_with_local(
+            db=db,
+            login_id=login_id,
+            password="pass123",
+            ip_address=None,
+            user_agent=None,
+        )
+    return {"Authorization": f"Bearer {result.token.access_token}"}
+
+
+async def _seed_posts(SessionLocal, *, user_id: int, count: int, base: datetime | None = None) -> list[int]:
+    """1分間隔で投稿を作成し、作成したIDを返す"""
+    base = base or datetime(2025, 1, 1, 9, 0, 0)
+    async with SessionLocal() as db:
+        posts = []
+        for i in range(count):
+            created_at = base + timedelta(minutes=i)
+            post = Post(
+                user_id=user_id,
+                problem=f"問い{i}",
+                content_1=f"やってみたこと{i}",
+                phase_label="情報収集",
+                created_at=created_at,
+                updated_at=created_at,
+            )
+            db.add(post)
+            posts.append(post)
+        await db.commit()
+        return [post.id for post in posts]
+
+
+@pytest.mark.asyncio
+async def test_get_posts_cursor_pagination(app_client):
+    client, SessionLocal = app_client
+    await _create_user_with_token(SessionLocal, user_id=100, role=RoleEnum.student)
+    post_ids = await _seed_posts(SessionLocal, user_id=100, count=5)
+
+    first = client.get("/posts", params={"limit": 2})
+    assert first.status_code == 200
+    data = first.json()
+    assert data["total"] == 5
+    assert [p["id"] for p in data["posts"]] == [post_ids[4], post_ids[3]]
+    assert data["next_cursor"]
+
+    second = client.get("/posts", params={"limit": 2, "cursor": data["next_cursor"]})
+    data = second.json()
+    assert data["total"] == 5
+    assert [p["id"] for p in data["posts"]] == [post_ids[2], post_ids[1]]
+
+    last = client.get("/posts", params={"limit": 2, "cursor": data["next_cursor"]})
+    data = last.json()
+    assert [p["id"] for p in data["posts"]] == [post_ids[0]]
+    assert data["next_cursor"] is None
+
+
+@pytest.mark.asyncio
+async def test_get_posts_cursor_breaks_created_at_ties_by_id(app_client):
+    client, SessionLocal = app_client
+    await _create_user_with_token(SessionLocal, user_id=101, role=RoleEnum.student)
+
+    same_time = datetime(2025, 1, 1, 9, 0, 0)
+    async with SessionLocal() as db:
+        for i in range(3):
+            db.add(Post(
+                user_id=101,
+                problem="同時刻",
+                content_1="同時刻の投稿",
+                phase_label="課題設定",
+                created_at=same_time,
+                updated_at=same_time,
+            ))
+        await db.commit()
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 1}
+        if cursor:
+            params["cursor"] = cursor
+        data = client.get("/posts", params=params).json()
+        seen.extend(p["id"] for p in data["posts"])
+        cursor = data["next_cursor"]
+        if not cursor:
+            break
+
+    assert len(seen) == 3
+    assert seen == sorted(seen, reverse=True)
+
+
+def test_get_posts_invalid_cursor(app_client):
+    client, _ = app_client
+    resp = client.get("/posts", params={"cursor": "not-a-cursor"})
+    assert resp.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_like_and_unlike_maintain_like_count(app_client):
+    client, SessionLocal = app_client
+    author_headers = await _create_user_with_token(SessionLocal, user_id=110, role=RoleEnum.student)
+    liker_headers = await _create_user_with_token(SessionLocal, user_id=111, role=RoleEnum.student)
+    [post_id] = await _seed_posts(SessionLocal, user_id=110, count=1)
+
+    resp = client.post(f"/posts/{post_id}/like", headers=author_headers)
+    assert resp.status_code == 201
+    assert resp.json()["like_count"] == 1
+
+    resp = client.post(f"/posts/{post_id}/like", headers=liker_headers)
+    assert resp.json()["like_count"] == 2
+
+    detail = client.get(f"/posts/{post_id}", headers=liker_headers).json()
+    assert detail["like_count"] == 2
+    assert detail["liked_by_me"] is True
+
+    resp = client.delete(f"/posts/{post_id}/like", headers=author_headers)
+    assert resp.status_code == 200
+    assert resp.json() == {"post_id": post_id, "like_count": 1, "liked_by_me": False}
+
+    feed = client.get("/posts", headers=author_headers).json()
+    assert feed["posts"][0]["like_count"] == 1
+    assert feed["posts"][0]["liked_by_me"] is False
+
+
+@pytest.mark.asyncio
+async def test_rebuild_like_counts(app_client):
+    _, SessionLocal = app_client
+    await _create_user_with_token(SessionLocal, user_id=120, role=RoleEnum.student)
+    post_ids = await _seed_posts(SessionLocal, user_id=120, count=2)
+
+    async with SessionLocal() as db:
+        for user_id in (120, 121, 122):
+            db.add(PostLike(post_id=post_ids[0], user_id=user_id, created_at=datetime.utcnow()))
+        db.add(PostLike(post_id=post_ids[1], user_id=120, created_at=datetime.utcnow()))
+        await db.commit()
+
+        await post_repository.rebuild_like_counts(db)
+        await db.commit()
+
+        result = await db.execute(select(Post.id, Post.like_count).order_by(Post.id))
+        assert dict(result.all()) == {post_ids[0]: 3, post_ids[1]: 1}
+
+
+@pytest.mark.asyncio
+async def test_hard_delete_user_recounts_their_likes(app_client):
+    client, SessionLocal = app_client
+    await _create_user_with_token(SessionLocal, user_id=123, role=RoleEnum.student)
+    liker_headers = await _create_user_with_token(SessionLocal, user_id=124, role=RoleEnum.student)
+    other_headers = await _create_user_with_token(SessionLocal, user_id=125, role=RoleEnum.student)
+    [post_id] = await _seed_posts(SessionLocal, user_id=123, count=1)
+    client.post(f"/posts/{post_id}/like", headers=liker_headers)
+    client.post(f"/posts/{post_id}/like", headers=other_headers)
+
+    async with SessionLocal() as db:
+        await admin_user_service.hard_delete_user(db, 124)
+
+    async with SessionLocal() as db:
+        assert await post_repository.get_like_count(db, post_id) == 1
+        likers = await db.execute(select(PostLike.user_id).where(PostLike.post_id == post_id))
+        assert likers.scalars().all() == [125]
+
+
+@pytest.mark.asyncio
+async def test_get_posts_runs_single_statement(app_client, db_engine):
+    client, SessionLocal = app_client
+    headers = await _create_user_with_token(SessionLocal, user_id=130, role=RoleEnum.student)
+    post_ids = await _seed_posts(SessionLocal, user_id=130, count=3)
+    async with SessionLocal() as db:
+        db.add(PostLike(post_id=post_ids[1], user_id=130, created_at=datetime.utcnow()))
+        await db.commit()
+
+    statements = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db_engine.sync_engine, "before_cursor_execute", _record)
+    try:
+        anonymous = client.get("/posts").json()
+        assert len(statements) == 1
+
+        statements.clear()
+        data = client.get("/posts", headers=headers).json()
+        # 認証（セッション・ユーザー取得）以外はフィード1ステートメントのみ
+        assert len([s for s in statements if "FROM posts" in s]) == 1
+    finally:
+        event.remove(db_engine.sync_engine, "before_cursor_execute", _record)
+
+    assert anonymous["total"] == 3
+    assert [p["liked_by_me"] for p in anonymous["posts"]] == [False, False, False]
+    assert data["total"] == 3
+    assert [p["liked_by_me"] for p in data["posts"]] == [False, True, False]
+    assert data["posts"][0]["user_name"] == "User 130"
+
+
+@pytest.mark.asyncio
+async def test_get_posts_total_on_page_past_end(app_client):
+    client, SessionLocal = app_client
+    await _create_user_with_token(SessionLocal, user_id=131, role=RoleEnum.student)
+    await _seed_posts(SessionLocal, user_id=131, count=2)
+
+    data = client.get("/posts", params={"skip": 10}).json()
+    assert data["posts"] == []
+    assert data["total"] == 2
+
+
+@pytest.mark.asyncio
+async def test_like_and_unlike_are_idempotent(app_client, db_engine):
+    client, SessionLocal = app_client
+    headers = await _create_user_with_token(SessionLocal, user_id=140, role=RoleEnum.student)
+    [post_id] = await _seed_posts(SessionLocal, user_id=140, count=1)
+
+    statements = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db_engine.sync_engine, "before_cursor_execute", _record)
+    try:
+        first = client.post(f"/posts/{post_id}/like", headers=headers)
+        # カウンタの条件付き更新（更新後の値を返す）とINSERTのみ
+        assert len([s for s in statements if "post" in s]) == 2
+    finally:
+        event.remove(db_engine.sync_engine, "before_cursor_execute", _record)
+
+    second = client.post(f"/posts/{post_id}/like", headers=headers)
+    assert first.status_code == second.status_code == 201
+    assert first.json() == second.json() == {"post_id": post_id, "like_count": 1, "liked_by_me": True}
+
+    first = client.delete(f"/posts/{post_id}/like", headers=headers)
+    second = client.delete(f"/posts/{post_id}/like", headers=headers)
+    assert first.status_code == second.status_code == 200
+    assert first.json() == second.json() == {"post_id": post_id, "like_count": 0, "liked_by_me": False}
+
+    async with SessionLocal() as db:
+        assert await post_repository.get_like_count(db, post_id) == 0
+
+
+@pytest.mark.asyncio
+async def test_like_missing_or_deleted_post_returns_404(app_client):
+    client, SessionLocal = app_client
+    headers = await _create_user_with_token(SessionLocal, user_id=141, role=RoleEnum.student)
+    [post_id] = await _seed_posts(SessionLocal, user_id=141, count=1)
+
+    async with SessionLocal() as db:
+        post = await db.get(Post, post_id)
+        post.deleted_at = datetime.utcnow()
+        await db.commit()
+
+    assert client.post(f"/posts/{post_id}/like", headers=headers).status_code == 404
+    assert client.delete(f"/posts/{post_id}/like", headers=headers).status_code == 404
+    assert client.post("/posts/9999/like", headers=headers).status_code == 404
+
+    async with SessionLocal() as db:
+        result = await db.execute(select(PostLike).where(PostLike.post_id == post_id))
+        assert result.first() is None
+
+
+@pytest.mark.asyncio
+async def test_search_posts_uses_fulltext_index(app_client):
+    client, SessionLocal = app_client
+    await _create_user_with_token(SessionLocal, user_id=150, role=RoleEnum.student)
+    now = datetime(2025, 1, 1, 9, 0, 0)
+    async with SessionLocal() as db:
+        interview = Post(
+            user_id=150,
+            problem="地域のインタビュー調査",
+            content_1="商店街でインタビューを実施し、インタビュー結果をまとめた",
+            phase_label="情報収集",
+            created_at=now,
+            updated_at=now,
+        )
+        mention = Post(
+            user_id=150,
+            problem="環境問題",
+            content_1="来週インタビューの予定を立てた",
+            phase_label="課題設定",
+            created_at=now,
+            updated_at=now,
+        )
+        unrelated = Post(
+            user_id=150,
+            problem="プログラミング",
+            content_1="アプリの画面を作成した",
+            phase_label="整理・分析",
+            created_at=now,
+            updated_at=now,
+        )
+        deleted = Post(
+            user_id=150,
+            problem="インタビューの練習",
+            content_1="削除された投稿",
+            phase_label="情報収集",
+            created_at=now,
+            updated_at=now,
+            deleted_at=now,
+        )
+        db.add_all([interview, mention, unrelated, deleted])
+        await db.commit()
+        interview_id, mention_id, unrelated_id = interview.id, mention.id, unrelated.id
+
+    data = client.get("/posts/search", params={"q": "インタビュー"}).json()
+    assert data["total"] == 2
+    # 一致の多い投稿が先頭
+    assert [p["id"] for p in data["posts"]] == [interview_id, mention_id]
+    assert data["posts"][0]["user_name"] == "User 150"
+
+    # 空白区切りの語はすべて含む投稿のみ
+    data = client.get("/posts/search", params={"q": "インタビュー 商店街"}).json()
+    assert [p["id"] for p in data["posts"]] == [interview_id]
+
+    # 更新後の本文でインデックスが同期される
+    async with SessionLocal() as db:
+        post = await db.get(Post, unrelated_id)
+        post.content_1 = "アプリについて先生にインタビューした"
+        await db.commit()
+
+    data = client.get("/posts/search", params={"q": "インタビュー"}).json()
+    assert data["total"] == 3
+    assert client.get("/posts/search", params={"q": "アプリの画面"}).json()["total"] == 0
+
+    page = client.get("/posts/search", params={"q": "インタビュー", "skip": 5}).json()
+    assert page == {"posts": [], "total": 3, "next_cursor": None}
+
+
+@pytest.mark.asyncio
+async def test_create_post_writes_post_and_abilities_in_one_transaction(app_client, db_engine):
+    client, SessionLocal = app_client
+    headers = await _create_user_with_token(SessionLocal, user_id=160, role=RoleEnum.student)
+    async with SessionLocal() as db:
+        db.add_all([
+            NonCogAbility(id=1, code="problem_setting", name="課題設定力"),
+            NonCogAbility(id=2, code="information_gathering", name="情報収集力"),
+        ])
+        await db.commit()
+        await ability_registry.load(db)
+
+    statements = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db_engine.sync_engine, "before_cursor_execute", _record)
+    try:
+        resp = client.post("/posts", headers=headers, json={
+            "problem": "問い",
+            "content_1": "やってみたこと",
+            "phase_label": "情報収集",
+            "ability_codes": ["problem_setting", "information_gathering", "unknown"],
+        })
+    finally:
+        event.remove(db_engine.sync_engine, "before_cursor_execute", _record)
+
+    assert resp.status_code == 201
+    data = resp.json()
+    assert data["user_name"] == "User 160"
+    assert data["like_count"] == 0
+
+    # 投稿INSERT・能力ポイントの複数行INSERT・サマリーのupsert・判定ジョブの登録のみ（再読み込み・AI判定なし）
+    write_statements = [s for s in statements if "users" not in s and "user_sessions" not in s]
+    assert [s.split()[2] for s in write_statements] == [
+        "posts", "post_ability_points", "student_activity_summary", "student_ability_summary", "post_analysis_jobs",
+    ]
+
+    async with SessionLocal() as db:
+        result = await db.execute(
+            select(PostAbilityPoint.ability_id).where(PostAbilityPoint.post_id == data["id"])
+        )
+        assert sorted(result.scalars().all()) == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_update_post_syncs_ability_points(app_client):
+    client, SessionLocal = app_client
+    headers = await _create_user_with_token(SessionLocal, user_id=161, role=RoleEnum.student)
+    async with SessionLocal() as db:
+        db.add_all([
+            NonCogAbility(id=1, code="problem_setting", name="課題設定力"),
+            NonCogAbility(id=2, code="information_gathering", name="情報収集力"),
+        ])
+        await db.commit()
+
+    payload = {
+        "problem": "問い",
+        "content_1": "やってみたこと",
+        "phase_label": "情報収集",
+        "ability_codes": ["problem_setting"],
+    }
+    post_id = client.post("/posts", headers=headers, json=payload).json()["id"]
+
+    resp = client.put(
+        f"/posts/{post_id}",
+        headers=headers,
+        json={**payload, "content_1": "更新した内容", "ability_codes": ["information_gathering"]},
+    )
+    assert resp.status_code == 200
+    assert resp.json()["content_1"] == "更新した内容"
+    assert resp.json()["user_name"] == "User 161"
+
+    async with SessionLocal() as db:
+        result = await db.execute(
+            select(PostAbilityPoint.ability_id).where(PostAbilityPoint.post_id == post_id)
+        )
+        assert result.scalars().all() == [2]
+
+
+@pytest.mark.asyncio
+async def test_update_post_keeps_like_state_and_locks_only_on_ability_change(app_client, monkeypatch):
+    client, SessionLocal = app_client
+    headers = await _create_user_with_token(SessionLocal, user_id=162, role=RoleEnum.student)
+    async with SessionLocal() as db:
+        db.add(NonCogAbility(id=1, code="problem_setting", name="課題設定力"))
+        await db.commit()
+    payload = {"problem": "問い", "content_1": "やってみたこと", "phase_label": "情報収集", "ability_codes": ["problem_setting"]}
+    post_id = client.post("/posts", headers=headers, json=payload).json()["id"]
+    assert client.post(f"/posts/{post_id}/like", headers=headers).status_code == 201
+
+    locked = []
+    original_lock = student_summary_repository.lock_students
+
+    async def _lock_students(db, user_ids):
+        locked.append(user_ids)
+        await original_lock(db, user_ids)
+
+    monkeypatch.setattr(student_summary_repository, "lock_students", _lock_students)
+
+    # 本文のみの変更では生徒をロックしない
+    resp = client.put(f"/posts/{post_id}", headers=headers, json={**payload, "content_1": "更新した内容"})
+    assert resp.status_code == 200
+    assert (resp.json()["like_count"], resp.json()["liked_by_me"]) == (1, True)
+    assert locked == []
+
+    resp = client.put(f"/posts/{post_id}", headers=headers, json={**payload, "ability_codes": []})
+    assert resp.json()["liked_by_me"] is True
+    assert locked
+
+
+@pytest.mark.asyncio
+async def test_get_posts_batch_keeps_order_and_reports_missing(app_client, db_engine):
+    client, SessionLocal = app_client
+    headers = await _create_user_with_token(SessionLocal, user_id=170, role=RoleEnum.student)
+    post_ids = await _seed_posts(SessionLocal, user_id=170, count=3)
+    async with SessionLocal() as db:
+        db.add_all([
+            NonCogAbility(id=1, code="problem_setting", name="課題設定力"),
+            NonCogAbility(id=2, code="information_gathering", name="情報収集力"),
+        ])
+        await db.flush()
+        db.add_all([
+            PostAbilityPoint(post_id=post_ids[0], ability_id=2),
+            PostAbilityPoint(post_id=post_ids[0], ability_id=1),
+            PostAbilityPoint(post_id=post_ids[2], ability_id=2),
+        ])
+        db.add(PostLike(post_id=post_ids[2], user_id=170, created_at=datetime.utcnow()))
+        deleted = await db.get(Post, post_ids[1])
+        deleted.deleted_at = datetime.utcnow()
+        await db.commit()
+        await post_repository.rebuild_like_counts(db)
+        await db.commit()
+        await ability_registry.load(db)
+
+    statements = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    requested = [post_ids[2], 9999, post_ids[0], post_ids[1], post_ids[2]]
+    event.listen(db_engine.sync_engine, "before_cursor_execute", _record)
+    try:
+        resp = client.get(
+            "/posts/batch",
+            params={"ids": ",".join(str(i) for i in requested)},
+            headers=headers,
+        )
+    finally:
+        event.remove(db_engine.sync_engine, "before_cursor_execute", _record)
+
+    assert resp.status_code == 200
+    data = resp.json()
+    assert [p["id"] for p in data["posts"]] == [post_ids[2], post_ids[0]]
+    assert data["missing_ids"] == [9999, post_ids[1]]
+    assert data["posts"][0]["like_count"] == 1
+    assert data["posts"][0]["liked_by_me"] is True
+    assert data["posts"][0]["ability_codes"] == ["information_gathering"]
+    assert data["posts"][1]["ability_codes"] == ["problem_setting", "information_gathering"]
+    # 投稿と能力の2文のみ（認証を除く）
+    assert len([s for s in statements if "FROM post" in s]) == 2
+
+
+def test_get_posts_batch_rejects_invalid_ids(app_client):
+    client, _ = app_client
+    assert client.get("/posts/batch", params={"ids": "1,abc"}).status_code == 400
+    too_many = ",".join(str(i) for i in range(1, 202))
+    assert client.get("/posts/batch", params={"ids": too_many}).status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_create_and_update_post_store_phase_code(app_client):
+    client, SessionLocal = app_client
+    headers = await _create_user_with_token(SessionLocal, user_id=100, role=RoleEnum.student)
+
+    created = client.post(
+        "/posts", headers=headers, json={"problem": "問い", "content_1": "内容", "phase_label": "planning"}
+    ).json()
+    assert created["phase_label"] == "planning"
+    assert created["phase_code"] == "problem_setting"
+    async with SessionLocal() as db:
+        summary = await db.get(StudentActivitySummary, 100)
+        assert (summary.latest_phase, summary.latest_phase_code) == ("課題設定", PhaseCode.problem_setting)
+
+    updated = client.put(
+        f"/posts/{created['id']}", headers=headers, json={"problem": "問い", "content_1": "内容", "phase_label": "自由記述"}
+    ).json()
+    assert updated["phase_code"] is None
+
+    async with SessionLocal() as db:
+        summary = await db.get(StudentActivitySummary, 100)
+        assert (summary.latest_phase, summary.latest_phase_code) == ("自由記述", None)
+
+
+@pytest.mark.asyncio
+async def test_backfill_phase_codes_in_batches(app_client):
+    _, SessionLocal = app_client
+    await _create_user_with_token(SessionLocal, user_id=100, role=RoleEnum.student)
+    labels = ["planning", "情報収集", "自由記述", "verification", " 発表準備 "]
+    now = datetime(2025, 1, 1)
+    async with SessionLocal() as db:
+        posts = [
+            Post(user_id=100, problem="問い", content_1="内容", phase_label=label, created_at=now, updated_at=now)
+            for label in labels
+        ]
+        db.add_all(posts)
+        await db.commit()
+        post_ids = [post.id for post in posts]
+
+    async with SessionLocal() as db:
+        # 2件ずつ処理し、途中から再開できる
+        last_id, updated = await post_repository.backfill_phase_codes(db, batch_size=2)
+        await db.commit()
+        assert (last_id, updated) == (post_ids[1], 2)
+        assert await post_repository.backfill_all_phase_codes(db, after_id=last_id, batch_size=2) == 2
+
+        codes = (await db.execute(select(Post.phase_code).order_by(Post.id))).scalars().all()
+    assert [code.value if code else None for code in codes] == [
+        "problem_setting", "information_gathering", None, "analysis", "presentation",
+    ]
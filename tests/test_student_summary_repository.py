@@ -0,0 +1,146 @@
+from datetime import datetime
+
+import pytest
+
+from sqlalchemy import delete, select
+
+from app.models.non_cog_ability import NonCogAbility
+from app.models.post import Post, QuestionStateChangeType
+from app.models.student_activity_summary import StudentAbilitySummary, StudentActivitySummary
+from app.models.user import RoleEnum
+from app.repositories import student_summary_repository
+from app.services import admin_user_service
+from tests.test_posts_api import _create_user_with_token
+
+
+async def _snapshot(db) -> tuple[list, list]:
+    """サマリー2テーブルの内容（updated_atを除く）"""
+    activity = await db.execute(
+        select(
+            StudentActivitySummary.user_id,
+            StudentActivitySummary.post_count,
+            StudentActivitySummary.last_posted_at,
+            StudentActivitySummary.latest_phase,
+            StudentActivitySummary.question_change_count,
+            StudentActivitySummary.letters_sent_count,
+            StudentActivitySummary.letters_received_count,
+        ).order_by(StudentActivitySummary.user_id)
+    )
+    abilities = await db.execute(
+        select(
+            StudentAbilitySummary.user_id,
+            StudentAbilitySummary.ability_id,
+            StudentAbilitySummary.post_points,
+            StudentAbilitySummary.letter_points,
+        )
+        .where((StudentAbilitySummary.post_points != 0) | (StudentAbilitySummary.letter_points != 0))
+        .order_by(StudentAbilitySummary.user_id, StudentAbilitySummary.ability_id)
+    )
+    return activity.all(), abilities.all()
+
+
+async def _assert_matches_rebuild(SessionLocal) -> tuple[list, list]:
+    """書き込み経路で維持したサマリーが、元データからの再計算と一致することを確認"""
+    async with SessionLocal() as db:
+        maintained = await _snapshot(db)
+        await student_summary_repository.refresh_student_summaries(db)
+        rebuilt = await _snapshot(db)
+        await db.rollback()
+    assert maintained == rebuilt
+    return maintained
+
+
+@pytest.mark.asyncio
+async def test_write_paths_keep_summary_in_sync(app_client):
+    client, SessionLocal = app_client
+    alice = await _create_user_with_token(SessionLocal, user_id=300, role=RoleEnum.student)
+    bob = await _create_user_with_token(SessionLocal, user_id=301, role=RoleEnum.student)
+    async with SessionLocal() as db:
+        db.add_all([
+            NonCogAbility(id=1, code="problem_setting", name="課題設定力"),
+            NonCogAbility(id=2, code="information_gathering", name="情報収集力"),
+        ])
+        await db.commit()
+
+    post = {
+        "problem": "問い",
+        "content_1": "やってみたこと",
+        "phase_label": "課題設定",
+        "ability_codes": ["problem_setting"],
+    }
+    first_id = client.post("/posts", headers=alice, json=post).json()["id"]
+    second_id = client.post("/posts", headers=alice, json={
+        **post,
+        "phase_label": "情報収集",
+        "question_state_change_type": QuestionStateChangeType.deepened.value,
+        "ability_codes": ["problem_setting", "information_gathering"],
+    }).json()["id"]
+    client.post("/posts", headers=bob, json=post)
+
+    letter_id = client.post("/thanks-letters", headers=bob, json={
+        "receiver_user_id": 300,
+        "content_1": "ありがとう",
+        "ability_codes": ["information_gathering"],
+    }).json()["id"]
+
+    activity, abilities = await _assert_matches_rebuild(SessionLocal)
+    alice_row = activity[0]
+    assert alice_row.post_count == 2
+    assert alice_row.latest_phase == "情報収集"
+    assert alice_row.question_change_count == 1
+    assert alice_row.letters_received_count == 1
+    assert [(row.ability_id, float(row.post_points), float(row.letter_points)) for row in abilities if row.user_id == 300] == [
+        (1, 2.0, 0.0),
+        (2, 1.0, 1.0),
+    ]
+
+    # 更新・削除は対象ユーザーを再計算する
+    assert client.put(f"/posts/{second_id}", headers=alice, json={**post, "phase_label": "整理・分析"}).status_code == 200
+    assert client.put(
+        f"/thanks-letters/{letter_id}", headers=bob, json={"content_1": "ありがとう", "ability_codes": []}
+    ).status_code == 200
+    assert client.delete(f"/posts/{first_id}", headers=alice).status_code == 204
+
+    activity, _ = await _assert_matches_rebuild(SessionLocal)
+    assert activity[0].post_count == 1
+    assert activity[0].latest_phase == "整理・分析"
+    assert activity[0].question_change_count == 0
+
+    # 物理削除では本人の行が消え、手紙の相手の集計も更新される
+    async with SessionLocal() as db:
+        await admin_user_service.hard_delete_user(db, 301)
+
+    activity, abilities = await _assert_matches_rebuild(SessionLocal)
+    assert [row.user_id for row in activity] == [300]
+    assert activity[0].letters_received_count == 0
+
+
+async def test_rebuild_all_in_batches_matches_full_refresh(app_client):
+    _, SessionLocal = app_client
+    for user_id in (310, 311, 312):
+        await _create_user_with_token(SessionLocal, user_id=user_id, role=RoleEnum.student)
+    async with SessionLocal() as db:
+        db.add_all([
+            Post(
+                user_id=user_id,
+                problem="問い",
+                content_1="活動",
+                phase_label="課題設定",
+                created_at=datetime(2024, 1, 1),
+                updated_at=datetime(2024, 1, 1),
+            )
+            for user_id in (310, 312)
+        ])
+        await db.commit()
+        await student_summary_repository.refresh_student_summaries(db)
+        await db.commit()
+        expected = await _snapshot(db)
+
+    async with SessionLocal() as db:
+        await db.execute(delete(StudentActivitySummary))
+        await db.commit()
+        # 1人ずつのバッチでも、存在する全ユーザーを再計算する
+        assert await student_summary_repository.rebuild_all_student_summaries(db, batch_size=1) == 3
+
+    async with SessionLocal() as db:
+        assert await _snapshot(db) == expected